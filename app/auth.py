@@ -1,22 +1,56 @@
+"""Authentication for the API: OAuth2 password logins and static API keys.
+
+Users are provisioned from the command line, optionally with an API key:
+
+    python -m app.auth create-user alice --api-key
+"""
+
+import argparse
+import asyncio
+import getpass
+import hashlib
+import logging
+import os
+import secrets
+import sys
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Mapping, Optional
 
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
 
+from app.cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
 # Security configuration
-SECRET_KEY = "your-secret-key"  # TODO: Move to environment variable
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# Verified tokens are cached by digest so repeat requests skip jwt.decode;
+# an entry never outlives the token's own `exp`
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))  # seconds
+# Short so that disabling a user takes effect quickly
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))  # seconds
+
+# Static API keys for service-to-service callers, as "name:key,name:key"
+API_KEYS = os.getenv("API_KEYS", "")
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# OAuth2 scheme; missing credentials are reported by get_current_user so
+# that an API key alone is enough
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 
 class Token(BaseModel):
@@ -56,23 +90,157 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+def _digest(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode()).digest()
+
+
+class UserStore:
+    """Async user lookup backed by a MongoDB collection, with a small cache."""
+
+    def __init__(
+        self,
+        collection,
+        cache_size: int = USER_CACHE_SIZE,
+        cache_ttl: float = USER_CACHE_TTL,
+    ):
+        self.collection = collection
+        self.cache = LocalCache(cache_size, cache_ttl)
+
+    async def get_user(self, username: str) -> Optional[UserInDB]:
+        user = self.cache.get(username)
+        if user is None:
+            document = await self.collection.find_one(
+                {"username": username}, {"_id": 0}
+            )
+            if document is None:
+                return None
+            user = UserInDB(**document)
+            self.cache.set(username, user)
+        return user
+
+    async def create_user(
+        self, username: str, password: str, disabled: bool = False
+    ) -> UserInDB:
+        hashed_password = await run_in_threadpool(get_password_hash, password)
+        user = UserInDB(
+            username=username, hashed_password=hashed_password, disabled=disabled
+        )
+        await self.collection.update_one(
+            {"username": username}, {"$set": user.dict()}, upsert=True
+        )
+        self.cache.delete(username)
+        return user
+
+
+# Shared user store
+user_store: Optional[UserStore] = None
+
+# Verified token digest -> username
+token_cache = LocalCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+
+async def init_user_store(database) -> UserStore:
+    global user_store
+    user_store = UserStore(database["users"])
+    await user_store.collection.create_index("username", unique=True)
+    return user_store
+
+
+def get_user_store() -> UserStore:
+    if user_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service unavailable",
+        )
+    return user_store
+
+
+def load_api_keys(spec: str) -> dict[bytes, User]:
+    keys = {}
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, key = entry.partition(":")
+        if not name or not key:
+            raise ValueError("API_KEYS entries must look like name:key")
+        keys[_digest(key)] = User(username=name)
+    return keys
+
+
+# API key digest -> service user
+api_keys = load_api_keys(API_KEYS)
+
+
+def verify_api_key(key: str) -> Optional[User]:
+    # Looked up by digest, so neither the cost nor the timing depends on the
+    # key's bytes or on how many keys exist
+    return api_keys.get(_digest(key))
+
+
+def decode_access_token(token: str) -> tuple[str, float]:
+    """Verify `token` and return its subject and expiry (unix time)."""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username: str = payload.get("sub")
+    expires_at = payload.get("exp")
+    if username is None or expires_at is None:
+        raise JWTError("Token is missing sub or exp")
+    return username, float(expires_at)
+
+
+# Verified against for unknown usernames, so that they take as long to
+# reject as a wrong password; hashed on first use to keep imports fast
+dummy_password_hash: Optional[str] = None
+
+
+async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
+    global dummy_password_hash
+    user = await get_user_store().get_user(username)
+    if user is None:
+        if dummy_password_hash is None:
+            dummy_password_hash = await run_in_threadpool(
+                get_password_hash, "dummy-password"
+            )
+        hashed_password = dummy_password_hash
+    else:
+        hashed_password = user.hashed_password
+    # bcrypt is deliberately slow, keep it off the event loop
+    if not await run_in_threadpool(verify_password, password, hashed_password):
+        return None
+    return user
+
+
+async def get_current_user(
+    token: Optional[str] = Depends(oauth2_scheme),
+    api_key: Optional[str] = Depends(api_key_header),
+) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    if api_key:
+        user = verify_api_key(api_key)
+        if user is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
+        return user
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    token_digest = _digest(token)
+    username = token_cache.get(token_digest)
+    if username is None:
+        try:
+            username, expires_at = decode_access_token(token)
+        except JWTError:
+            raise credentials_exception
+        token_cache.set(token_digest, username, ttl=expires_at - time.time())
 
-    # TODO: Implement user database lookup
-    user = User(username=token_data.username)
+    user = await get_user_store().get_user(username)
     if user is None:
         raise credentials_exception
     return user
@@ -84,3 +252,101 @@ async def get_current_active_user(
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+async def user_from_headers(headers: Mapping[str, str]) -> Optional[User]:
+    """The active user for raw request headers, outside of dependency injection.
+
+    For code that sees a connection before routing (middleware) or that
+    FastAPI's security dependencies do not cover (websockets).
+    """
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    try:
+        return await get_current_active_user(
+            await get_current_user(
+                token=token if scheme.lower() == "bearer" and token else None,
+                api_key=headers.get("x-api-key"),
+            )
+        )
+    except HTTPException:
+        return None
+
+
+def generate_api_key(name: str) -> str:
+    """A new random API key, as the `name:key` entry to add to API_KEYS."""
+    if not name or ":" in name or "," in name:
+        raise ValueError("API key names must be non-empty, without ':' or ','")
+    return f"{name}:{secrets.token_urlsafe(32)}"
+
+
+async def provision_user(
+    store: UserStore,
+    username: str,
+    password: str,
+    disabled: bool = False,
+    api_key: bool = False,
+) -> Optional[str]:
+    """Create or update a user; returns its API_KEYS entry if one was asked for."""
+    entry = generate_api_key(username) if api_key else None
+    await store.create_user(username, password, disabled=disabled)
+    return entry
+
+
+async def _create_user(args, password: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from app.database import DATABASE_NAME
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        store = await init_user_store(client[DATABASE_NAME])
+        entry = await provision_user(
+            store, args.username, password, args.disabled, args.api_key
+        )
+    finally:
+        client.close()
+    print(f"Created user {args.username}")
+    if entry is not None:
+        # The key is not stored anywhere else, so this is the only copy
+        print(f"Add this entry to API_KEYS: {entry}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="User and API key provisioning")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create_user = commands.add_parser("create-user", help="create or update a user")
+    create_user.add_argument("username")
+    create_user.add_argument(
+        "--password-stdin",
+        action="store_true",
+        help="read the password from stdin instead of prompting for it",
+    )
+    create_user.add_argument("--disabled", action="store_true")
+    create_user.add_argument(
+        "--api-key", action="store_true", help="also generate an API key"
+    )
+    create_user.add_argument(
+        "--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017")
+    )
+    create_api_key = commands.add_parser(
+        "create-api-key", help="generate an API key for a service"
+    )
+    create_api_key.add_argument("name")
+    args = parser.parse_args()
+
+    if args.command == "create-api-key":
+        print(f"Add this entry to API_KEYS: {generate_api_key(args.name)}")
+        return
+    if args.password_stdin:
+        password = sys.stdin.readline().rstrip("\n")
+    else:
+        password = getpass.getpass()
+        if password != getpass.getpass("Repeat password: "):
+            parser.error("passwords do not match")
+    if not password:
+        parser.error("the password must not be empty")
+    asyncio.run(_create_user(args, password))
+
+
+if __name__ == "__main__":
+    main()
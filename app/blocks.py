@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from app.metrics import set_known_netuids
+from app.pool import SUBTENSOR_NETWORK, SubtensorPool, connect_subtensor
+
+if TYPE_CHECKING:
+    from bittensor import AsyncSubtensor
+
+logger = logging.getLogger(__name__)
+
+# Block-aware cache configuration: "off" keeps the wall-clock TTL only,
+# "block" invalidates on every new block and "tempo" only once the subnet's
+# epoch has run, since that is when dividends actually change
+BLOCK_CACHE_MODE = os.getenv("BLOCK_CACHE_MODE", "block").lower()
+BLOCK_SUBSCRIPTION_RETRY = float(os.getenv("BLOCK_SUBSCRIPTION_RETRY", "5"))
+# Subnet tempos (and the set of subnets) are re-read this many blocks apart
+TEMPO_REFRESH_BLOCKS = int(os.getenv("TEMPO_REFRESH_BLOCKS", "100"))
+# Stop trusting block stamps if no header arrived for this long (seconds)
+BLOCK_STALL_TIMEOUT = float(os.getenv("BLOCK_STALL_TIMEOUT", "60"))
+
+BlockListener = Callable[[int], Awaitable[None]]
+# Runs a named round; prepares one ahead, returning what finishes it, if any
+RoundRunner = Callable[[str], Awaitable[object]]
+RoundPreparer = Callable[[str], Awaitable[Optional[Callable[[], Awaitable[object]]]]]
+BLOCK_TIME_WEIGHT = 0.2  # EWMA weight of the newest interval between blocks
+
+
+def last_epoch_block(netuid: int, block: int, tempo: int) -> int:
+    """Most recent block at or before `block` where `netuid` ran its epoch.
+
+    Mirrors subtensor's `should_run_epoch`, which runs the epoch for a subnet
+    when (block + netuid + 1) % (tempo + 1) == tempo, that is when
+    (block + netuid + 2) is a multiple of (tempo + 1).
+    """
+    return block - (block + netuid + 2) % (tempo + 1)
+
+
+class BlockTracker:
+    """Follow new block headers and answer cache freshness questions."""
+
+    def __init__(
+        self,
+        pool: Optional[SubtensorPool] = None,
+        mode: str = BLOCK_CACHE_MODE,
+        network: str = SUBTENSOR_NETWORK,
+        factory: Optional[Callable[[], "AsyncSubtensor"]] = None,
+    ):
+        self.mode = mode
+        self.current_block: Optional[int] = None
+        self.last_block_at: Optional[float] = None
+        self._pool = pool
+        self._factory = factory or (lambda: connect_subtensor(network))
+        self._tempos: dict[int, int] = {}
+        self._tempos_block: Optional[int] = None
+        self._listeners: list[BlockListener] = []
+        self._task: Optional[asyncio.Task] = None
+        self._subtensor: Optional["AsyncSubtensor"] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("block", "tempo")
+
+    @property
+    def tracking(self) -> bool:
+        """Whether block stamps can currently be trusted for freshness."""
+        return (
+            self.enabled
+            and self.last_block_at is not None
+            and time.monotonic() - self.last_block_at < BLOCK_STALL_TIMEOUT
+        )
+
+    def add_listener(self, listener: BlockListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: BlockListener):
+        self._listeners.remove(listener)
+
+    async def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._disconnect()
+
+    async def _disconnect(self):
+        if self._subtensor is not None:
+            try:
+                await self._subtensor.close()
+            except Exception as e:
+                logger.debug("Error closing block subscription connection: %s", e)
+            self._subtensor = None
+
+    async def _run(self):
+        # The subscription blocks its websocket for as long as it lives, so
+        # it gets a dedicated connection rather than a pool slot
+        while True:
+            try:
+                self._subtensor = self._factory()
+                await self._subtensor.initialize()
+                await self._subtensor.substrate.subscribe_block_headers(
+                    self._handle_header
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    "Block header subscription failed, retrying in %ss: %s",
+                    BLOCK_SUBSCRIPTION_RETRY,
+                    e,
+                )
+            await self._disconnect()
+            await asyncio.sleep(BLOCK_SUBSCRIPTION_RETRY)
+
+    async def _handle_header(self, obj, update_nr, subscription_id):
+        await self.on_block(int(obj["header"]["number"]))
+        # Returning None keeps the subscription open
+
+    async def on_block(self, block: int):
+        self.last_block_at = time.monotonic()
+        if self.current_block is not None and block <= self.current_block:
+            return
+        self.current_block = block
+        logger.debug("New block %s", block)
+        # Tempos are read in block mode too, to keep the subnet set current
+        if (
+            self._tempos_block is None
+            or block - self._tempos_block >= TEMPO_REFRESH_BLOCKS
+        ):
+            await self.refresh_tempos(block)
+        for listener in list(self._listeners):
+            try:
+                await listener(block)
+            except Exception as e:
+                logger.error("Block listener failed at block %s: %s", block, e)
+
+    async def refresh_tempos(self, block: int):
+        if self._pool is None:
+            return
+        try:
+            async with self._pool.acquire(timed=False) as subtensor:
+                result = await subtensor.substrate.query_map("SubtensorModule", "Tempo")
+                tempos = {}
+                async for netuid, tempo in result:
+                    tempos[int(getattr(netuid, "value", netuid))] = int(
+                        getattr(tempo, "value", tempo)
+                    )
+            self._tempos = tempos
+            self._tempos_block = block
+            set_known_netuids(tempos)
+        except Exception as e:
+            logger.warning("Failed to refresh subnet tempos: %s", e)
+
+    def set_tempo(self, netuid: int, tempo: int):
+        self._tempos[netuid] = tempo
+
+    def refresh_boundary(self, netuid: int, at_block: Optional[int] = None) -> int:
+        """Oldest read block whose data is current for `netuid` at `at_block`
+        (by default the current block)."""
+        at_block = self.current_block if at_block is None else at_block
+        tempo = self._tempos.get(netuid)
+        if self.mode == "tempo" and tempo:
+            return last_epoch_block(netuid, at_block, tempo)
+        return at_block
+
+    def is_fresh(
+        self, netuid: int, block: Optional[int], at_block: Optional[int] = None
+    ) -> Optional[bool]:
+        """Block-based freshness, or None when it cannot be decided."""
+        if block is None or not self.tracking:
+            return None
+        return block >= self.refresh_boundary(netuid, at_block)
+
+
+class RoundScheduler:
+    """Run a background job in rounds, once per block or per time slot.
+
+    `on_block` is a block tracker listener. Each new block starts round
+    `block:{n}`; blocks arriving while a round runs are coalesced into one.
+    When no header has come for `interval` seconds, rounds `time:{slot}`
+    run every `interval` seconds instead. Round ids are the same on every
+    worker, so one of them can claim each round in Redis.
+
+    With `prepare`, a block round is also started ahead of its block: once
+    the next block is `lead` seconds from due (from the average time between
+    recent blocks, and at most half of it), `prepare("block:{n + 1}")` runs
+    and what it returns is awaited as soon as that block arrives, in place
+    of `run`.
+    """
+
+    def __init__(
+        self,
+        run: RoundRunner,
+        interval: float,
+        name: str,
+        prepare: Optional[RoundPreparer] = None,
+        lead: float = 0.0,
+    ):
+        self.interval = interval
+        self.lead = lead
+        self.block: Optional[int] = None
+        self.last_block_at: Optional[float] = None
+        self.block_time: Optional[float] = None  # seconds between blocks
+        self._run = run
+        self._prepare = prepare
+        self._name = name
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def on_block(self, block: int):
+        now = time.monotonic()
+        if self.block is not None and block > self.block:
+            elapsed = (now - self.last_block_at) / (block - self.block)
+            if self.block_time is None:
+                self.block_time = elapsed
+            else:
+                self.block_time += BLOCK_TIME_WEIGHT * (elapsed - self.block_time)
+        self.block = block
+        self.last_block_at = now
+        self._wakeup.set()
+
+    def prepare_in(self) -> Optional[float]:
+        """Seconds until the next block round should be prepared, if it can be."""
+        if self._prepare is None or self.block_time is None:
+            return None
+        lead = min(self.lead, self.block_time / 2)
+        return self.last_block_at + self.block_time - lead - time.monotonic()
+
+    async def _loop(self):
+        prepared: Optional[tuple[str, Optional[Callable[[], Awaitable]]]] = None
+        while True:
+            timeout = self.interval
+            prepare_in = None
+            if prepared is None or prepared[0] != f"block:{self.block + 1}":
+                prepare_in = self.prepare_in()
+            if prepare_in is not None and prepare_in < self.interval:
+                timeout = max(prepare_in, 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                round_id = f"block:{self.block}"
+            except asyncio.TimeoutError:
+                if prepare_in is not None and prepare_in < self.interval:
+                    round_id = f"block:{self.block + 1}"
+                    prepared = (round_id, await self._attempt(self._prepare, round_id))
+                    continue
+                if (
+                    self.last_block_at is not None
+                    and time.monotonic() - self.last_block_at < self.interval
+                ):
+                    continue
+                # No block headers: rounds in time slots all workers agree on
+                round_id = f"time:{int(time.time() // self.interval)}"
+            self._wakeup.clear()
+            if prepared is not None and prepared[0] == round_id:
+                if prepared[1] is not None:
+                    await self._attempt(lambda _: prepared[1](), round_id)
+            else:
+                await self._attempt(self._run, round_id)
+            prepared = None
+
+    async def _attempt(self, step: Callable[[str], Awaitable], round_id: str):
+        try:
+            return await step(round_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("%s round %s failed: %s", self._name, round_id, e)
+            return None
+
+
+# Shared block tracker
+block_tracker: Optional[BlockTracker] = None
+
+
+async def init_block_tracker(pool: Optional[SubtensorPool] = None) -> BlockTracker:
+    global block_tracker
+    block_tracker = BlockTracker(pool)
+    await block_tracker.start()
+    return block_tracker
+
+
+async def close_block_tracker():
+    global block_tracker
+    if block_tracker is not None:
+        await block_tracker.close()
+        block_tracker = None
+
+
+def get_block_tracker() -> Optional[BlockTracker]:
+    return block_tracker
+
+
+def current_block() -> Optional[int]:
+    if block_tracker is None or not block_tracker.tracking:
+        return None
+    return block_tracker.current_block
+
+
+def is_block_fresh(
+    netuid: int, block: Optional[int], at_block: Optional[int] = None
+) -> Optional[bool]:
+    return block_tracker.is_fresh(netuid, block, at_block) if block_tracker else None
+
+
+def block_cache_enabled() -> bool:
+    return block_tracker is not None and block_tracker.enabled
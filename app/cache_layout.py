@@ -0,0 +1,155 @@
+"""Compact per-subnet layout for the dividends cache.
+
+With CACHE_LAYOUT=hash every subnet is a single Redis hash,
+`dividends:h:{netuid}`, whose fields are hotkeys and whose values are
+fixed-size binary records instead of one JSON string key per hotkey. Each
+record carries its own read time, which the cache checks instead of a
+per-key TTL, while the hash as a whole expires once nothing writes to it.
+
+Existing `dividends:{netuid}:{hotkey}` keys can be moved over in bulk with:
+
+    python -m app.cache_layout migrate
+
+or, with CACHE_LAYOUT_MIGRATE on while switching, read on a miss until they
+expire; that costs an extra MGET on every read, so turn it off afterwards.
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.models import TaoDividends
+
+# Cache layout configuration: "keys" keeps one JSON key per hotkey
+CACHE_LAYOUT = os.getenv("CACHE_LAYOUT", "keys").lower()
+# Also read keys left over from the per-hotkey layout on a miss; only needed
+# while switching layouts without running the migrate command
+CACHE_LAYOUT_MIGRATE = os.getenv("CACHE_LAYOUT_MIGRATE", "false").lower() in (
+    "true",
+    "1",
+    "t",
+)
+MIGRATE_BATCH = 500  # legacy keys moved per round trip
+
+RAO_PER_TAO = 10**9
+# rao (u64), block (u32, NO_BLOCK when unknown), read time in ms (u64)
+RECORD = struct.Struct("<QIQ")
+NO_BLOCK = 0xFFFFFFFF
+LEGACY_KEY = re.compile(r"^dividends:(\d+):(5[A-Za-z0-9]+)$")
+EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def hash_key(netuid: int) -> str:
+    return f"dividends:h:{netuid}"
+
+
+def encode_record(dividends: TaoDividends) -> bytes:
+    timestamp = dividends.timestamp
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return RECORD.pack(
+        round(dividends.dividends * RAO_PER_TAO),
+        NO_BLOCK if dividends.block is None else dividends.block,
+        (timestamp - EPOCH) // _MILLISECOND,
+    )
+
+
+def decode_record(netuid: int, hotkey: str, data: bytes) -> TaoDividends:
+    rao, block, millis = RECORD.unpack(data)
+    return TaoDividends(
+        netuid=netuid,
+        hotkey=hotkey,
+        dividends=rao / RAO_PER_TAO,
+        timestamp=EPOCH + millis * _MILLISECOND,
+        block=None if block == NO_BLOCK else block,
+        cached=True,
+    )
+
+
+def record_timestamp(data: bytes) -> datetime:
+    return EPOCH + RECORD.unpack(data)[2] * _MILLISECOND
+
+
+async def migrate_legacy_keys(
+    redis, raw_redis, ttl: Optional[int] = None, batch_size: int = MIGRATE_BATCH
+) -> int:
+    """Move `dividends:{netuid}:{hotkey}` keys into per-subnet hashes.
+
+    `redis` decodes responses and `raw_redis` does not. Each hash keeps the
+    longest remaining TTL of the keys moved into it in that batch unless
+    `ttl` is given.
+    Returns the number of keys moved.
+    """
+    moved = 0
+    keys = []
+
+    async def flush():
+        nonlocal moved
+        pipe = redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+            pipe.ttl(key)
+        results = await pipe.execute()
+
+        hashes: dict[str, dict[str, bytes]] = {}
+        ttls: dict[str, int] = {}
+        for key, value, remaining in zip(keys, results[::2], results[1::2]):
+            if not value:
+                continue
+            netuid, hotkey = LEGACY_KEY.match(key).groups()
+            key = hash_key(int(netuid))
+            hashes.setdefault(key, {})[hotkey] = encode_record(
+                TaoDividends.parse_raw(value)
+            )
+            ttls[key] = max(ttls.get(key, 0), ttl or remaining)
+
+        pipe = raw_redis.pipeline(transaction=False)
+        for key, mapping in hashes.items():
+            pipe.hset(key, mapping=mapping)
+            if ttls[key] > 0:
+                pipe.expire(key, ttls[key])
+        pipe.delete(*keys)
+        await pipe.execute()
+        moved += sum(len(mapping) for mapping in hashes.values())
+        keys.clear()
+
+    async for key in redis.scan_iter(match="dividends:*", count=batch_size):
+        if LEGACY_KEY.match(key):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                await flush()
+    if keys:
+        await flush()
+    return moved
+
+
+async def _migrate(redis_url: str):
+    from redis import asyncio as aioredis
+
+    redis = aioredis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+    raw_redis = aioredis.from_url(redis_url)
+    try:
+        moved = await migrate_legacy_keys(redis, raw_redis)
+    finally:
+        await redis.aclose()
+        await raw_redis.aclose()
+    print(f"Moved {moved} dividend entries into per-subnet hashes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dividends cache layout tools")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument(
+        "--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379")
+    )
+    args = parser.parse_args()
+    asyncio.run(_migrate(args.redis_url))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,108 @@
+import asyncio
+import json
+import logging
 import os
-from typing import Optional
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterable, AsyncIterator, Optional
 
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import CollectionInvalid
 from redis import asyncio as aioredis
 
-from app.models import SentimentAnalysis, TaoDividends
+from app.blocks import block_cache_enabled, is_block_fresh
+from app.cache import LocalCache
+from app.cache_layout import (
+    CACHE_LAYOUT,
+    CACHE_LAYOUT_MIGRATE,
+    decode_record,
+    encode_record,
+    hash_key,
+    record_timestamp,
+)
+from app.history import HistoryWriter
+from app.metrics import MONGO_WRITE_LATENCY, REDIS_LATENCY, count_cache_lookup, timed
+from app.models import (
+    DividendHistoryEntry,
+    SentimentAnalysis,
+    SubnetSentiment,
+    TaoDividends,
+)
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # MongoDB configuration
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "tao_dividends")
+# Where `python -m app.history migrate` moves history in the old layout
+LEGACY_HISTORY_COLLECTION = "dividends_legacy"
 
 # Redis configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 CACHE_TTL = int(os.getenv("CACHE_TTL", "120"))  # 2 minutes in seconds
+# Upper bound on entry lifetime when freshness is decided by block number
+BLOCK_CACHE_MAX_TTL = int(os.getenv("BLOCK_CACHE_MAX_TTL", "3600"))
+# How long past its wall-clock soft expiry (CACHE_TTL) an entry may still be
+# served as stale while it is refreshed in the background, whatever the
+# block cache mode; with it off this also sets the hard (Redis) expiry
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "600"))
+
+# In-process (L1) cache configuration, consulted before Redis
+L1_CACHE_SIZE = int(os.getenv("L1_CACHE_SIZE", "1000"))
+L1_CACHE_TTL = float(os.getenv("L1_CACHE_TTL", "5"))  # seconds
+CACHE_INVALIDATION_CHANNEL = "dividends:invalidate"
+CACHE_INSTANCE_ID = uuid.uuid4().hex  # skip our own invalidation messages
+
+# Whole-subnet cache configuration
+SUBNET_CACHE_TTL = int(os.getenv("SUBNET_CACHE_TTL", str(CACHE_TTL)))
+SUBNET_CACHE_BATCH = 500  # hash fields written per HSET while scanning
+
+# Cross-worker refresh lock configuration
+CACHE_LOCK_ENABLED = os.getenv("CACHE_LOCK_ENABLED", "false").lower() in (
+    "true",
+    "1",
+    "t",
+)
+CACHE_LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", "10"))  # seconds
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "5"))  # seconds
+CACHE_LOCK_POLL_INTERVAL = 0.05  # seconds
+
+# Trade triggers for the same netuid/hotkey within this window reuse the
+# analysis already enqueued, and subnet sentiment scores are reused this long
+TRADE_TRIGGER_WINDOW = int(os.getenv("TRADE_TRIGGER_WINDOW", "60"))  # seconds
+SENTIMENT_CACHE_TTL = int(os.getenv("SENTIMENT_CACHE_TTL", "900"))  # seconds
+# Per-tweet LLM scores are kept this long, so a tweet is scored only once
+TWEET_SCORE_TTL = int(os.getenv("TWEET_SCORE_TTL", str(7 * 24 * 3600)))  # seconds
+
+# Delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
 # MongoDB client
 mongo_client: Optional[AsyncIOMotorClient] = None
 
 # Redis client
 redis_client: Optional[aioredis.Redis] = None
+# Client returning bytes, for the binary records of the hash cache layout
+raw_redis_client: Optional[aioredis.Redis] = None
+
+# In-process cache, in front of Redis
+local_cache = LocalCache(L1_CACHE_SIZE, L1_CACHE_TTL)
+invalidation_task: Optional[asyncio.Task] = None
+
+# Buffered history writer, only running inside the API process
+history_writer: Optional[HistoryWriter] = None
 
 
 async def init_db():
@@ -31,47 +111,851 @@ async def init_db():
     return mongo_client[DATABASE_NAME]
 
 
+async def history_layout(database) -> Optional[str]:
+    """How `dividends` is stored: "timeseries", "legacy", "mixed" or None.
+
+    "legacy" is a regular collection of top-level netuid/hotkey documents,
+    as written before history moved to a time-series collection; "mixed" is
+    a time-series collection that still holds such documents, which have no
+    meta and are invisible to history queries.
+    """
+    cursor = await database.list_collections(filter={"name": "dividends"})
+    infos = [info async for info in cursor]
+    if not infos:
+        return None
+    if infos[0].get("type") != "timeseries":
+        return "legacy"
+    # A query on the metaField only reads bucket metadata, so this is cheap
+    if await database["dividends"].find_one({"meta": None}) is not None:
+        return "mixed"
+    return "timeseries"
+
+
+async def create_history_collection(database):
+    try:
+        await database.create_collection(
+            "dividends",
+            timeseries={
+                "timeField": "timestamp",
+                "metaField": "meta",
+                "granularity": "seconds",
+            },
+        )
+    except CollectionInvalid:
+        pass  # created concurrently by another worker
+
+
+async def init_history_collections():
+    """Create the dividends time-series collection and its indexes.
+
+    Refuses to start on history in the old layout, which queries would
+    silently miss; `python -m app.history migrate` converts it.
+    """
+    database = mongo_client[DATABASE_NAME]
+    layout = await history_layout(database)
+    if layout in ("legacy", "mixed"):
+        raise RuntimeError(
+            "The dividends collection holds history in the old layout "
+            f"({layout}); run `python -m app.history migrate` to convert it"
+        )
+    if layout is None:
+        await create_history_collection(database)
+    await database["dividends"].create_index(
+        [("meta.netuid", 1), ("meta.hotkey", 1), ("timestamp", 1)]
+    )
+    await database["sentiment"].create_index(
+        [("netuid", 1), ("hotkey", 1), ("timestamp", -1)]
+    )
+    await database["subnet_sentiment"].create_index("netuid", unique=True)
+    await database["sentiment"].create_index("decision_id", sparse=True)
+
+
 async def init_redis():
-    global redis_client
+    global redis_client, raw_redis_client
     redis_client = await aioredis.from_url(
         REDIS_URL, encoding="utf-8", decode_responses=True
     )
+    if CACHE_LAYOUT == "hash":
+        raw_redis_client = await aioredis.from_url(REDIS_URL)
     return redis_client
 
 
-async def get_cached_dividends(netuid: int, hotkey: str) -> Optional[TaoDividends]:
+async def warm_up_redis():
+    """Open a connection in each Redis client's pool before the first request."""
+    for client in (redis_client, raw_redis_client):
+        if client is not None:
+            await client.ping()
+
+
+async def close_db():
+    global mongo_client
+    if mongo_client is not None:
+        mongo_client.close()
+        mongo_client = None
+
+
+async def close_redis():
+    global redis_client, raw_redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+        redis_client = None
+    if raw_redis_client is not None:
+        await raw_redis_client.aclose()
+        raw_redis_client = None
+
+
+def cache_ttl(ttl: int = CACHE_TTL) -> int:
+    return BLOCK_CACHE_MAX_TTL if block_cache_enabled() else ttl
+
+
+def is_cache_fresh(
+    netuid: int, block: Optional[int], timestamp: datetime, ttl: int = CACHE_TTL
+) -> bool:
+    fresh = is_block_fresh(netuid, block)
+    if fresh is None:
+        # No trustworthy block information, fall back to the wall-clock TTL
+        fresh = datetime.utcnow() - timestamp < timedelta(seconds=ttl)
+    return fresh
+
+
+class CachedDividends:
+    """A cached dividends entry kept as JSON, parsed into a model on demand.
+
+    `raw` is the response body with `cached` already set but without the
+    per-request `stale` and `trade_status` fields, which `body` appends, so
+    a cache hit can be answered without building or validating a model.
+    """
+
+    __slots__ = ("netuid", "timestamp", "block", "raw", "_dividends")
+
+    def __init__(
+        self,
+        netuid: int,
+        timestamp: datetime,
+        block: Optional[int],
+        raw: bytes,
+        dividends: Optional[TaoDividends] = None,
+    ):
+        self.netuid = netuid
+        self.timestamp = timestamp
+        self.block = block
+        self.raw = raw
+        self._dividends = dividends
+
+    @classmethod
+    def from_dividends(cls, dividends: TaoDividends) -> "CachedDividends":
+        data = dividends.dict(exclude={"stale", "trade_status"})
+        data["cached"] = True
+        return cls(
+            dividends.netuid,
+            dividends.timestamp,
+            dividends.block,
+            orjson.dumps(data),
+            dividends.copy(
+                update={"cached": True, "stale": False, "trade_status": None}
+            ),
+        )
+
+    @classmethod
+    def from_record(cls, netuid: int, hotkey: str, record: bytes) -> "CachedDividends":
+        return cls.from_dividends(decode_record(netuid, hotkey, record))
+
+    @classmethod
+    def from_raw(cls, raw) -> "CachedDividends":
+        data = orjson.loads(raw)
+        if "stale" in data:
+            # Written before entries dropped the per-request fields
+            return cls.from_dividends(TaoDividends(**data))
+        return cls(
+            data["netuid"],
+            datetime.fromisoformat(data["timestamp"]),
+            data.get("block"),
+            raw.encode() if isinstance(raw, str) else raw,
+        )
+
+    def fresh(self) -> bool:
+        return is_cache_fresh(self.netuid, self.block, self.timestamp)
+
+    def servable_stale(self) -> bool:
+        # Block freshness keeps entries in Redis for up to BLOCK_CACHE_MAX_TTL,
+        # which must not stretch how long stale data is served when blocks stall
+        age = datetime.utcnow() - self.timestamp
+        return age < timedelta(seconds=CACHE_TTL + CACHE_STALE_TTL)
+
+    def body(self, stale: bool = False, trade_status: Optional[str] = None) -> bytes:
+        return b"".join(
+            (
+                self.raw[:-1],
+                b',"stale":true' if stale else b',"stale":false',
+                b',"trade_status":',
+                orjson.dumps(trade_status),
+                b"}",
+            )
+        )
+
+    def dividends(self, stale: bool = False) -> TaoDividends:
+        if self._dividends is None:
+            self._dividends = TaoDividends.parse_raw(self.raw)
+        if stale:
+            return self._dividends.copy(update={"stale": True})
+        return self._dividends
+
+
+async def get_cached_entry(
+    netuid: int, hotkey: str, allow_stale: bool = False
+) -> Optional[tuple[CachedDividends, bool]]:
+    """Return the cached entry for a key and whether it is stale.
+
+    Without `allow_stale` only fresh entries are returned. With it, entries
+    up to CACHE_STALE_TTL past their wall-clock soft expiry are returned too.
+    """
+    cache_key = f"dividends:{netuid}:{hotkey}"
+    entry = local_cache.get(cache_key, valid=CachedDividends.fresh)
+    if entry is not None:
+        count_cache_lookup("local", "hit", netuid)
+        return entry, False
+    count_cache_lookup("local", "miss", netuid)
+
     if not redis_client:
         return None
 
-    cache_key = f"dividends:{netuid}:{hotkey}"
-    cached_data = await redis_client.get(cache_key)
+    if CACHE_LAYOUT == "hash":
+        with timed(REDIS_LATENCY, operation="hmget"):
+            entry = (await read_hash_entries([(netuid, hotkey)]))[0]
+    else:
+        with timed(REDIS_LATENCY, operation="get"):
+            cached_data = await redis_client.get(cache_key)
+        entry = CachedDividends.from_raw(cached_data) if cached_data else None
 
-    if cached_data:
-        dividends = TaoDividends.parse_raw(cached_data)
-        dividends.cached = True
-        return dividends
+    if entry is not None:
+        if entry.fresh():
+            count_cache_lookup("redis", "hit", netuid)
+            local_cache.set(cache_key, entry)
+            return entry, False
+        if allow_stale and entry.servable_stale():
+            count_cache_lookup("redis", "stale", netuid)
+            return entry, True
+    count_cache_lookup("redis", "miss", netuid)
     return None
 
 
+async def get_cached_dividends(
+    netuid: int, hotkey: str, allow_stale: bool = False
+) -> Optional[TaoDividends]:
+    """Return the cached entry for a key if it is still fresh.
+
+    With `allow_stale`, entries past their soft expiry but not yet evicted
+    by Redis are returned too, flagged with `stale=True`.
+    """
+    cached = await get_cached_entry(netuid, hotkey, allow_stale)
+    if cached is None:
+        return None
+    entry, stale = cached
+    return entry.dividends(stale)
+
+
+async def get_cached_dividends_many(
+    pairs: list[tuple[int, str]],
+) -> list[Optional[TaoDividends]]:
+    """Fresh cached entries for many keys, with a single MGET for all misses."""
+    cache_keys = [f"dividends:{netuid}:{hotkey}" for netuid, hotkey in pairs]
+    entries = [local_cache.get(key, valid=CachedDividends.fresh) for key in cache_keys]
+    missing = [index for index, entry in enumerate(entries) if entry is None]
+    for (netuid, _), entry in zip(pairs, entries):
+        count_cache_lookup("local", "miss" if entry is None else "hit", netuid)
+    if missing and redis_client:
+        values = await read_cached_entries([pairs[index] for index in missing])
+        for index, entry in zip(missing, values):
+            netuid = pairs[index][0]
+            if entry is not None:
+                if entry.fresh():
+                    count_cache_lookup("redis", "hit", netuid)
+                    local_cache.set(cache_keys[index], entry)
+                    entries[index] = entry
+                    continue
+            count_cache_lookup("redis", "miss", netuid)
+    return [entry.dividends() if entry else None for entry in entries]
+
+
+async def read_cached_entries(
+    pairs: list[tuple[int, str]],
+) -> list[Optional[CachedDividends]]:
+    """Entries held in Redis for many keys, fresh or not, in one round trip.
+
+    Unlike the lookups serving requests, this neither counts as a cache hit
+    or miss nor fills the local cache.
+    """
+    if not redis_client or not pairs:
+        return [None] * len(pairs)
+    if CACHE_LAYOUT == "hash":
+        with timed(REDIS_LATENCY, operation="hmget"):
+            return await read_hash_entries(pairs)
+    with timed(REDIS_LATENCY, operation="mget"):
+        values = await redis_client.mget(
+            [f"dividends:{netuid}:{hotkey}" for netuid, hotkey in pairs]
+        )
+    return [
+        CachedDividends.from_raw(cached_data) if cached_data else None
+        for cached_data in values
+    ]
+
+
+async def read_hash_entries(
+    pairs: list[tuple[int, str]],
+) -> list[Optional[CachedDividends]]:
+    """Unexpired entries from the per-subnet hashes, one HMGET per netuid.
+
+    While CACHE_LAYOUT_MIGRATE is on, keys left over from the per-hotkey
+    layout are fetched in the same round trip and used for any misses.
+    """
+    groups: dict[int, list[int]] = {}
+    for index, (netuid, _) in enumerate(pairs):
+        groups.setdefault(netuid, []).append(index)
+
+    pipe = raw_redis_client.pipeline(transaction=False)
+    for netuid, indexes in groups.items():
+        pipe.hmget(hash_key(netuid), [pairs[index][1] for index in indexes])
+    if CACHE_LAYOUT_MIGRATE:
+        pipe.mget([f"dividends:{netuid}:{hotkey}" for netuid, hotkey in pairs])
+    results = await pipe.execute()
+    legacy = results.pop() if CACHE_LAYOUT_MIGRATE else [None] * len(pairs)
+
+    # Records carry their own read time in place of a per-key expiry
+    oldest = datetime.utcnow() - timedelta(seconds=cache_ttl() + CACHE_STALE_TTL)
+    entries: list[Optional[CachedDividends]] = [None] * len(pairs)
+    for indexes, records in zip(groups.values(), results):
+        for index, record in zip(indexes, records):
+            if record and record_timestamp(record) > oldest:
+                entries[index] = CachedDividends.from_record(*pairs[index], record)
+    for index, cached_data in enumerate(legacy):
+        if entries[index] is None and cached_data:
+            entries[index] = CachedDividends.from_raw(cached_data)
+    return entries
+
+
 async def cache_dividends(dividends: TaoDividends):
+    await cache_dividends_many([dividends])
+
+
+async def cache_dividends_many(dividends_list: list[TaoDividends]):
+    if not redis_client or not dividends_list:
+        return
+
+    ttl = cache_ttl() + CACHE_STALE_TTL
+    cache_keys = []
+    entries = []
+    records: dict[str, dict[str, bytes]] = {}
+    pipe = redis_client.pipeline(transaction=False)
+    for dividends in dividends_list:
+        cache_key = f"dividends:{dividends.netuid}:{dividends.hotkey}"
+        entry = CachedDividends.from_dividends(dividends)
+        cache_keys.append(cache_key)
+        entries.append(entry)
+        if CACHE_LAYOUT == "hash":
+            records.setdefault(hash_key(dividends.netuid), {})[dividends.hotkey] = (
+                encode_record(dividends)
+            )
+        else:
+            pipe.set(cache_key, entry.raw, ex=ttl)
+    for key, mapping in records.items():
+        # The subnet's hash lives as long as any of its records is written
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, ttl)
+    # Other workers drop their local copy of these keys
+    pipe.publish(CACHE_INVALIDATION_CHANNEL, " ".join([CACHE_INSTANCE_ID, *cache_keys]))
+    with timed(REDIS_LATENCY, operation="set"):
+        await pipe.execute()
+    for cache_key, entry in zip(cache_keys, entries):
+        local_cache.set(cache_key, entry)
+
+
+async def listen_for_invalidations():
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                sender, *cache_keys = message["data"].split(" ")
+                if sender != CACHE_INSTANCE_ID:
+                    for cache_key in cache_keys:
+                        local_cache.delete(cache_key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Cache invalidation listener failed: %s", e)
+        finally:
+            await pubsub.aclose()
+        # Invalidations may have been missed while disconnected
+        local_cache.clear()
+        await asyncio.sleep(1)
+
+
+async def start_cache_invalidation():
+    global invalidation_task
+    if redis_client and local_cache.enabled and invalidation_task is None:
+        invalidation_task = asyncio.create_task(listen_for_invalidations())
+
+
+async def stop_cache_invalidation():
+    global invalidation_task
+    if invalidation_task is not None:
+        invalidation_task.cancel()
+        try:
+            await invalidation_task
+        except asyncio.CancelledError:
+            pass
+        invalidation_task = None
+
+
+def subnet_cache_key(netuid: int) -> str:
+    if CACHE_LAYOUT == "hash":
+        # Full scans refresh the same hash single lookups read from
+        return hash_key(netuid)
+    return f"dividends:subnet:{netuid}"
+
+
+async def has_cached_subnet_dividends(netuid: int) -> bool:
+    if not redis_client:
+        return False
+
+    cache_key = subnet_cache_key(netuid)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.exists(cache_key)
+    pipe.get(f"{cache_key}:meta")
+    exists, meta = await pipe.execute()
+    if not exists or not meta:
+        return False
+    meta = json.loads(meta)
+    return is_cache_fresh(
+        netuid,
+        meta["block"],
+        datetime.fromisoformat(meta["timestamp"]),
+        SUBNET_CACHE_TTL,
+    )
+
+
+async def scan_cached_subnet_dividends(netuid: int) -> AsyncIterator[TaoDividends]:
     if not redis_client:
         return
 
-    cache_key = f"dividends:{dividends.netuid}:{dividends.hotkey}"
-    await redis_client.set(cache_key, dividends.json(), ex=CACHE_TTL)
+    cache_key = subnet_cache_key(netuid)
+    if CACHE_LAYOUT == "hash":
+        async for hotkey, record in raw_redis_client.hscan_iter(
+            cache_key, count=SUBNET_CACHE_BATCH
+        ):
+            yield decode_record(netuid, hotkey.decode(), record)
+        return
+
+    async for _, cached_data in redis_client.hscan_iter(
+        cache_key, count=SUBNET_CACHE_BATCH
+    ):
+        dividends = TaoDividends.parse_raw(cached_data)
+        dividends.cached = True
+        yield dividends
+
+
+async def cache_subnet_dividends(
+    netuid: int, dividends: AsyncIterable[TaoDividends], block: Optional[int] = None
+) -> AsyncIterator[TaoDividends]:
+    """Pass dividends through while writing them to the subnet cache.
+
+    Entries go to a private staging hash that only replaces the live one
+    once the scan completes, so readers never see a partial subnet.
+    """
+    if not redis_client:
+        async for item in dividends:
+            yield item
+        return
+
+    cache_key = subnet_cache_key(netuid)
+    staging_key = f"{cache_key}:staging:{uuid.uuid4().hex}"
+    ttl = meta_ttl = cache_ttl(SUBNET_CACHE_TTL)
+    if CACHE_LAYOUT == "hash":
+        # Records stay usable by single lookups for their usual lifetime
+        ttl = max(ttl, cache_ttl() + CACHE_STALE_TTL)
+    meta = json.dumps({"block": block, "timestamp": datetime.utcnow().isoformat()})
+    batch = {}
+    written = 0
+
+    async def flush():
+        nonlocal written
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hset(staging_key, mapping=batch)
+        pipe.expire(staging_key, ttl)
+        await pipe.execute()
+        written += len(batch)
+        batch.clear()
+
+    try:
+        async for item in dividends:
+            batch[item.hotkey] = (
+                encode_record(item) if CACHE_LAYOUT == "hash" else item.json()
+            )
+            if len(batch) >= SUBNET_CACHE_BATCH:
+                await flush()
+            yield item
+        if batch:
+            await flush()
+        if written:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.rename(staging_key, cache_key)
+            pipe.expire(cache_key, ttl)
+            pipe.set(f"{cache_key}:meta", meta, ex=meta_ttl)
+            await pipe.execute()
+    except BaseException:
+        await redis_client.delete(staging_key)
+        raise
+
+
+async def get_historical_dividends(
+    netuid: int, hotkey: str, blocks: list[int]
+) -> dict[int, int]:
+    """Permanently cached rao values for finalized blocks, keyed by block."""
+    if not redis_client or not blocks:
+        return {}
+
+    cache_key = f"dividends:history:{netuid}:{hotkey}"
+    values = await redis_client.hmget(cache_key, blocks)
+    return {block: int(rao) for block, rao in zip(blocks, values) if rao is not None}
+
+
+async def cache_historical_dividends(netuid: int, hotkey: str, values: dict[int, int]):
+    # Finalized state never changes, so these entries carry no TTL
+    if not redis_client or not values:
+        return
+
+    cache_key = f"dividends:history:{netuid}:{hotkey}"
+    await redis_client.hset(cache_key, mapping=values)
+
+
+async def acquire_refresh_lock(netuid: int, hotkey: str) -> Optional[str]:
+    if not redis_client:
+        return None
+
+    lock_key = f"lock:dividends:{netuid}:{hotkey}"
+    token = uuid.uuid4().hex
+    acquired = await redis_client.set(
+        lock_key, token, nx=True, px=int(CACHE_LOCK_TTL * 1000)
+    )
+    return token if acquired else None
+
+
+async def release_refresh_lock(netuid: int, hotkey: str, token: str):
+    if not redis_client:
+        return
+
+    lock_key = f"lock:dividends:{netuid}:{hotkey}"
+    await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+
+async def wait_for_cached_dividends(
+    netuid: int, hotkey: str, timeout: float = CACHE_LOCK_WAIT
+) -> Optional[TaoDividends]:
+    """Wait for another worker holding the refresh lock to fill the cache."""
+    if not redis_client:
+        return None
+
+    lock_key = f"lock:dividends:{netuid}:{hotkey}"
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        dividends = await get_cached_dividends(netuid, hotkey)
+        if dividends:
+            return dividends
+        if not await redis_client.exists(lock_key):
+            # The holder finished or gave up; one last look at the cache
+            return await get_cached_dividends(netuid, hotkey)
+        await asyncio.sleep(CACHE_LOCK_POLL_INTERVAL)
+    return None
+
+
+async def claim_trade_trigger(
+    netuid: int, hotkey: str, task_id: str, window: int = TRADE_TRIGGER_WINDOW
+) -> str:
+    """Claim the trade trigger for `window` seconds and return its holder.
+
+    The holder is `task_id` when the claim succeeded, otherwise the id of the
+    task that already claimed it. SET NX GET needs Redis 7.
+    """
+    trigger_key = f"trade:trigger:{netuid}:{hotkey}"
+    holder = await redis_client.set(trigger_key, task_id, nx=True, ex=window, get=True)
+    return holder or task_id
+
+
+async def release_trade_trigger(netuid: int, hotkey: str, task_id: str):
+    trigger_key = f"trade:trigger:{netuid}:{hotkey}"
+    await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, trigger_key, task_id)
+
+
+async def get_cached_sentiment(
+    netuid: int, ttl: int = SENTIMENT_CACHE_TTL
+) -> Optional[SubnetSentiment]:
+    cache_key = f"sentiment:{netuid}"
+    if redis_client:
+        cached = await redis_client.get(cache_key)
+        if cached:
+            return SubnetSentiment.parse_raw(cached)
+
+    # Redis may have been flushed; the last analysis is also kept in MongoDB
+    if not mongo_client:
+        return None
+    document = await mongo_client[DATABASE_NAME]["subnet_sentiment"].find_one(
+        {
+            "netuid": netuid,
+            "timestamp": {"$gte": datetime.utcnow() - timedelta(seconds=ttl)},
+        },
+        {"_id": 0},
+    )
+    if document is None:
+        return None
+    sentiment = SubnetSentiment(**document)
+    if redis_client:
+        remaining = ttl - (datetime.utcnow() - sentiment.timestamp).total_seconds()
+        if remaining >= 1:
+            await redis_client.set(cache_key, sentiment.json(), ex=int(remaining))
+    return sentiment
+
+
+async def cache_sentiment(sentiment: SubnetSentiment, ttl: int = SENTIMENT_CACHE_TTL):
+    if redis_client:
+        await redis_client.set(
+            f"sentiment:{sentiment.netuid}", sentiment.json(), ex=ttl
+        )
+    if mongo_client:
+        with timed(
+            MONGO_WRITE_LATENCY, collection="subnet_sentiment", operation="update_one"
+        ):
+            await mongo_client[DATABASE_NAME]["subnet_sentiment"].update_one(
+                {"netuid": sentiment.netuid}, {"$set": sentiment.dict()}, upsert=True
+            )
+
+
+async def get_tweet_scores(netuid: int, tweet_ids: list[str]) -> list[Optional[float]]:
+    if not redis_client or not tweet_ids:
+        return [None] * len(tweet_ids)
+    with timed(REDIS_LATENCY, operation="mget"):
+        values = await redis_client.mget(
+            [f"sentiment:tweet:{netuid}:{tweet_id}" for tweet_id in tweet_ids]
+        )
+    return [float(value) if value is not None else None for value in values]
+
+
+async def cache_tweet_scores(
+    netuid: int, scores: dict[str, float], ttl: int = TWEET_SCORE_TTL
+):
+    if not redis_client or not scores:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for tweet_id, score in scores.items():
+        pipe.set(f"sentiment:tweet:{netuid}:{tweet_id}", score, ex=ttl)
+    with timed(REDIS_LATENCY, operation="set"):
+        await pipe.execute()
+
+
+async def start_history_writer() -> Optional[HistoryWriter]:
+    global history_writer
+    if mongo_client and history_writer is None:
+        history_writer = HistoryWriter(mongo_client[DATABASE_NAME])
+        await history_writer.start()
+    return history_writer
+
+
+async def stop_history_writer():
+    global history_writer
+    if history_writer is not None:
+        # Flushes everything still buffered before returning
+        await history_writer.close()
+        history_writer = None
+
+
+async def _store(collection: str, document: dict):
+    if history_writer is not None:
+        await history_writer.put(collection, document)
+    else:
+        with timed(MONGO_WRITE_LATENCY, collection=collection, operation="insert_one"):
+            await mongo_client[DATABASE_NAME][collection].insert_one(document)
+
+
+def dividends_document(dividends: TaoDividends) -> dict:
+    # Time-series layout: the series key lives under the metaField
+    return {
+        "timestamp": dividends.timestamp,
+        "meta": {"netuid": dividends.netuid, "hotkey": dividends.hotkey},
+        "dividends": dividends.dividends,
+        "block": dividends.block,
+    }
+
+
+def legacy_dividends_document(document: dict) -> dict:
+    """The time-series document for one written in the old top-level layout."""
+    return {
+        "timestamp": document["timestamp"],
+        "meta": {"netuid": document["netuid"], "hotkey": document["hotkey"]},
+        "dividends": document["dividends"],
+        "block": document.get("block"),
+    }
+
+
+async def migrate_dividend_history(database, batch_size: int = 1000) -> int:
+    """Convert history in the old layout; returns the documents moved.
+
+    A regular `dividends` collection is renamed to LEGACY_HISTORY_COLLECTION
+    and copied into a new time-series one, and is left in place to be
+    dropped once checked. Old documents inside a time-series collection
+    are rewritten with a meta and the originals deleted.
+    """
+    layout = await history_layout(database)
+    if layout == "legacy":
+        await database["dividends"].rename(LEGACY_HISTORY_COLLECTION)
+        await create_history_collection(database)
+        source, query = database[LEGACY_HISTORY_COLLECTION], {}
+    elif layout == "mixed":
+        source, query = database["dividends"], {"meta": None}
+    else:
+        return 0
+
+    target = database["dividends"]
+    moved = 0
+    batch = []
+    async for document in source.find(query, {"_id": 0}):
+        batch.append(legacy_dividends_document(document))
+        if len(batch) >= batch_size:
+            await target.insert_many(batch, ordered=False)
+            moved += len(batch)
+            batch = []
+    if batch:
+        await target.insert_many(batch, ordered=False)
+        moved += len(batch)
+    if layout == "mixed":
+        await target.delete_many({"meta": None})
+    return moved
 
 
 async def store_dividends(dividends: TaoDividends):
     if not mongo_client:
         return
 
+    await _store("dividends", dividends_document(dividends))
+
+
+def dividend_history_pipeline(
+    netuid: int,
+    hotkey: str,
+    start: datetime,
+    end: datetime,
+    bucket: Optional[int],
+    limit: int,
+    after_id: Optional[ObjectId] = None,
+) -> list[dict]:
+    match = {
+        "meta.netuid": netuid,
+        "meta.hotkey": hotkey,
+        "timestamp": {"$gte": start, "$lt": end},
+    }
+    if after_id is not None:
+        # Resume after (start, after_id): samples sharing the timestamp of
+        # the previous page's last one are ordered by _id
+        match["$or"] = [{"timestamp": {"$gt": start}}, {"_id": {"$gt": after_id}}]
+    pipeline = [{"$match": match}]
+    if bucket:
+        pipeline.append({"$sort": {"timestamp": 1}})
+        pipeline += [
+            {
+                "$group": {
+                    "_id": {
+                        "$dateTrunc": {
+                            "date": "$timestamp",
+                            "unit": "second",
+                            "binSize": bucket,
+                        }
+                    },
+                    "dividends": {"$last": "$dividends"},
+                    "block": {"$last": "$block"},
+                    "min": {"$min": "$dividends"},
+                    "max": {"$max": "$dividends"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$sort": {"_id": 1}},
+            {"$set": {"timestamp": "$_id"}},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "meta": 0}},
+        ]
+    else:
+        # _id is kept for the cursor
+        pipeline += [
+            {"$sort": {"timestamp": 1, "_id": 1}},
+            {"$limit": limit},
+            {"$project": {"meta": 0}},
+        ]
+    return pipeline
+
+
+def encode_history_cursor(timestamp: datetime, after_id: Optional[ObjectId]) -> str:
+    return timestamp.isoformat() + (f"_{after_id}" if after_id else "")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, Optional[ObjectId]]:
+    """The timestamp and _id a page resumes after; raises ValueError if invalid."""
+    timestamp, _, after_id = cursor.partition("_")
+    try:
+        return datetime.fromisoformat(timestamp), ObjectId(
+            after_id
+        ) if after_id else None
+    except InvalidId as e:
+        raise ValueError(str(e))
+
+
+async def query_dividend_history(
+    netuid: int,
+    hotkey: str,
+    start: datetime,
+    end: datetime,
+    bucket: Optional[int] = None,
+    limit: int = 500,
+    after_id: Optional[ObjectId] = None,
+) -> tuple[list[DividendHistoryEntry], Optional[str]]:
+    """Read one page of history, returning it with the cursor for the next.
+
+    The cursor says where the next page starts, so every page is an
+    independent bounded query rather than a long-lived server cursor.
+    """
+    if not mongo_client:
+        return [], None
+
     collection = mongo_client[DATABASE_NAME]["dividends"]
-    await collection.insert_one(dividends.dict())
+    pipeline = dividend_history_pipeline(
+        netuid, hotkey, start, end, bucket, limit, after_id
+    )
+    documents = [document async for document in collection.aggregate(pipeline)]
+    items = [DividendHistoryEntry(**document) for document in documents]
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1].timestamp
+        if bucket:
+            # Buckets are aligned, so the next page starts at the next one
+            next_cursor = encode_history_cursor(last + timedelta(seconds=bucket), None)
+        else:
+            # Several samples can share a timestamp, so resume after the
+            # last one's (timestamp, _id)
+            next_cursor = encode_history_cursor(last, documents[-1]["_id"])
+    return items, next_cursor
 
 
 async def store_sentiment(sentiment: SentimentAnalysis):
     if not mongo_client:
         return
 
-    collection = mongo_client[DATABASE_NAME]["sentiment"]
-    await collection.insert_one(sentiment.dict())
+    await _store("sentiment", sentiment.dict())
+
+
+async def update_sentiment_results(decision_ids: list[str], fields: dict):
+    if not mongo_client:
+        return
+
+    with timed(MONGO_WRITE_LATENCY, collection="sentiment", operation="update_many"):
+        await mongo_client[DATABASE_NAME]["sentiment"].update_many(
+            {"decision_id": {"$in": decision_ids}}, {"$set": fields}
+        )
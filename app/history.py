@@ -0,0 +1,169 @@
+"""Write-behind buffer for dividend and sentiment history.
+
+History written before it moved to a time-series collection is converted
+with:
+
+    python -m app.history migrate
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Optional
+
+from pymongo.errors import BulkWriteError
+
+from app.metrics import (
+    HISTORY_FLUSH_LATENCY,
+    HISTORY_QUEUE_DEPTH,
+    HISTORY_RECORDS,
+    MONGO_WRITE_LATENCY,
+    timed,
+)
+
+logger = logging.getLogger(__name__)
+
+# History writer configuration
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1"))  # seconds
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """Write-behind buffer that batches history inserts into MongoDB.
+
+    Callers enqueue documents and return immediately unless the queue is
+    full, in which case `put` waits for room (backpressure). A background
+    task flushes with unordered `insert_many` whenever a batch fills up or
+    the flush interval elapses, and `close` drains whatever is left.
+    """
+
+    def __init__(
+        self,
+        database,
+        queue_size: int = HISTORY_QUEUE_SIZE,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+    ):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def put(self, collection: str, document: dict):
+        await self._queue.put((collection, document))
+        HISTORY_QUEUE_DEPTH.inc()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            HISTORY_QUEUE_DEPTH.dec(len(batch))
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list[tuple[str, dict]]):
+        documents = defaultdict(list)
+        for collection, document in batch:
+            documents[collection].append(document)
+
+        started = time.perf_counter()
+        for collection, docs in documents.items():
+            try:
+                with timed(
+                    MONGO_WRITE_LATENCY, collection=collection, operation="insert_many"
+                ):
+                    await self.database[collection].insert_many(docs, ordered=False)
+                written = len(docs)
+            except BulkWriteError as e:
+                written = e.details.get("nInserted", 0)
+                logger.error(
+                    "Failed to write %s of %s %s history records",
+                    len(docs) - written,
+                    len(docs),
+                    collection,
+                )
+            except Exception as e:
+                written = 0
+                logger.error(
+                    "Failed to write %s %s history records: %s",
+                    len(docs),
+                    collection,
+                    e,
+                )
+            HISTORY_RECORDS.labels(collection=collection, outcome="written").inc(
+                written
+            )
+            HISTORY_RECORDS.labels(collection=collection, outcome="dropped").inc(
+                len(docs) - written
+            )
+        HISTORY_FLUSH_LATENCY.observe(time.perf_counter() - started)
+
+
+async def _migrate(mongo_url: str, database_name: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from app.database import LEGACY_HISTORY_COLLECTION, migrate_dividend_history
+
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        moved = await migrate_dividend_history(client[database_name])
+    finally:
+        client.close()
+    print(f"Moved {moved} dividend history records into the time-series layout")
+    if moved:
+        print(f"Drop {LEGACY_HISTORY_COLLECTION}, if it exists, once checked")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dividend history tools")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument(
+        "--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017")
+    )
+    parser.add_argument(
+        "--database", default=os.getenv("DATABASE_NAME", "tao_dividends")
+    )
+    args = parser.parse_args()
+    asyncio.run(_migrate(args.mongo_url, args.database))
+
+
+if __name__ == "__main__":
+    main()
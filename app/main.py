@@ -1,22 +1,113 @@
+import asyncio
+import importlib
 import logging
 import os
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, AsyncIterator, Optional
 
 from celery import Celery
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException, Query, status
+from fastapi import Depends, FastAPI, HTTPException, Query, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.responses import (
+    ORJSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from fastapi.security import OAuth2PasswordRequestForm
 
+from app.auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    Token,
+    User,
+    authenticate_user,
+    create_access_token,
+    get_current_active_user,
+    init_user_store,
+    user_from_headers,
+)
+from app.blocks import (
+    close_block_tracker,
+    current_block,
+    get_block_tracker,
+    init_block_tracker,
+)
 from app.database import (
+    CACHE_LOCK_ENABLED,
+    acquire_refresh_lock,
     cache_dividends,
-    get_cached_dividends,
+    cache_dividends_many,
+    cache_historical_dividends,
+    cache_subnet_dividends,
+    claim_trade_trigger,
+    decode_history_cursor,
+    get_cached_dividends_many,
+    get_cached_entry,
+    get_historical_dividends,
+    has_cached_subnet_dividends,
     init_db,
+    init_history_collections,
     init_redis,
+    query_dividend_history,
+    release_refresh_lock,
+    release_trade_trigger,
+    scan_cached_subnet_dividends,
+    start_cache_invalidation,
+    start_history_writer,
+    stop_cache_invalidation,
+    stop_history_writer,
     store_dividends,
+    wait_for_cached_dividends,
+    warm_up_redis,
+)
+from app.metrics import (
+    METRICS_ENABLED,
+    METRICS_PATH,
+    MetricsMiddleware,
+    close_metrics,
+    init_metrics,
+    render_metrics,
+)
+from app.models import (
+    BatchDividendsRequest,
+    BatchDividendsResponse,
+    BatchDividendsResult,
+    DividendHistory,
+    DividendRange,
+    DividendsAtBlock,
+    TaoDividends,
+)
+from app.pool import close_subtensor_pool, create_subtensor_pool, get_subtensor_pool
+from app.prewarm import close_prewarmer, get_prewarmer, init_prewarmer, record_request
+from app.ratelimit import RateLimitMiddleware, close_rate_limiter, init_rate_limiter
+from app.readiness import get_warm_up, start_warm_up, stop_warm_up
+from app.singleflight import SingleFlight
+from app.streaming import (
+    close_dividend_stream,
+    get_dividend_stream,
+    init_dividend_stream,
+    parse_pairs,
+    serve_websocket,
+    sse_events,
 )
-from app.models import TaoDividends
 from app.taodiv import TaoDividendQuerier
+from app.tracing import (
+    PROFILE_MAX_SECONDS,
+    TimingMiddleware,
+    can_profile,
+    current_request_id,
+    detached_context,
+    install_log_request_ids,
+    phase,
+    profile_window,
+    request_profiles,
+)
+
+if TYPE_CHECKING:
+    from bittensor.utils.balance import Balance
 
 # Load environment variables
 load_dotenv()
@@ -24,14 +115,16 @@ load_dotenv()
 # Configure logging based on DEBUG environment variable
 debug_mode = os.getenv("DEBUG", "false").lower() in ("true", "1", "t")
 log_level = logging.DEBUG if debug_mode else logging.INFO
+install_log_request_ids()
 logging.basicConfig(
     level=log_level,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    format="%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s",
 )
 logger = logging.getLogger(__name__)
 
 # Initialize Celery
-celery_app = Celery("app", broker="redis://localhost:6379/0")
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+celery_app = Celery("app", broker=CELERY_BROKER_URL)
 
 app = FastAPI(
     title="Tao Dividends API",
@@ -40,6 +133,9 @@ app = FastAPI(
     debug=debug_mode,
 )
 
+# Rate limit API routes; added first so CORS headers wrap 429 responses too
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -49,8 +145,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure authentication
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Request IDs and Server-Timing, outside the rate limiter so 429s carry them
+app.add_middleware(TimingMiddleware)
+
+# Request metrics; added last so it times everything the other layers do
+app.add_middleware(MetricsMiddleware)
+
+# Largest number of blocks a single range query may read
+MAX_BLOCK_RANGE_POINTS = int(os.getenv("MAX_BLOCK_RANGE_POINTS", "1000"))
 
 
 @app.on_event("startup")
@@ -59,8 +161,68 @@ async def startup_event():
         "Starting Tao Dividends API in %s mode",
         "debug" if debug_mode else "production",
     )
-    await init_db()
-    await init_redis()
+    # Creating the clients does no I/O. Connecting them is left to the
+    # warm-up, which runs in the background so /healthz answers at once;
+    # /readyz reports ready once every step has succeeded.
+    database = await init_db()
+    await start_history_writer()
+    redis = await init_redis()
+    init_rate_limiter(redis)
+    create_subtensor_pool()
+    await init_dividend_stream(read_dividends_many, redis)
+    await init_prewarmer(redis, read_dividends_many)
+    init_metrics(CELERY_BROKER_URL)
+    start_warm_up(
+        {
+            "mongo": lambda: warm_up_mongo(database),
+            "redis": warm_up_cache,
+            "chain": warm_up_chain,
+        }
+    )
+
+
+async def warm_up_mongo(database):
+    # The user store is set before its index is created, so logins work
+    # even if MongoDB is slow to answer
+    await asyncio.gather(init_user_store(database), init_history_collections())
+
+
+async def warm_up_cache():
+    await warm_up_redis()
+    await start_cache_invalidation()
+
+
+async def warm_up_chain():
+    # Import bittensor (about a second) on a thread rather than the loop
+    await asyncio.to_thread(importlib.import_module, "bittensor")
+    pool = get_subtensor_pool()
+    await pool.start()
+    # Retries of this step reconnect the pool but keep the first tracker
+    if get_block_tracker() is None:
+        tracker = await init_block_tracker(pool)
+        stream = get_dividend_stream()
+        if stream is not None:
+            tracker.add_listener(stream.on_block)
+        prewarmer = get_prewarmer()
+        if prewarmer is not None:
+            tracker.add_listener(prewarmer.on_block)
+    if not pool.stats()["healthy"]:
+        raise ConnectionError("No subtensor connection could be opened")
+    await TaoDividendQuerier(pool).warm_up()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Shutting down Tao Dividends API")
+    await stop_warm_up()
+    await close_dividend_stream()
+    await close_prewarmer()
+    await close_block_tracker()
+    close_rate_limiter()
+    await close_subtensor_pool()
+    await stop_cache_invalidation()
+    await stop_history_writer()
+    await close_metrics()
 
 
 @app.get("/")
@@ -69,69 +231,109 @@ async def root():
     return {"message": "Welcome to Tao Dividends API"}
 
 
-@app.get("/api/v1/tao_dividends", response_model=TaoDividends)
-async def get_tao_dividends(
-    netuid: int = Query(
-        ...,
-        description="Subnet ID to query dividends for",
-        ge=0,
-        example=4,
-    ),
-    hotkey: str = Query(
-        ...,
-        description="Hotkey (account ID or public key) to query dividends for",
-        min_length=48,
-        max_length=64,
-        regex="^5[A-Za-z0-9]+$",
-        example="5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx",
-    ),
-    trade: bool = Query(
-        False,
-        description="Whether to trigger sentiment analysis and trading based on results",
-    ),
-    token: str = Depends(oauth2_scheme),
-):
-    # TODO: IMPLEMENT AUTHENTICATION AND AUTHORIZATION
-    logger.debug(
-        "Tao dividends requested for netuid=%s, hotkey=%s, trade=%s",
-        netuid,
-        hotkey,
-        trade,
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and its event loop answers."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: 503, listing the failing steps, until the warm-up succeeds."""
+    warm_up = get_warm_up()
+    report = warm_up.report() if warm_up is not None else {"ready": False}
+    pool = get_subtensor_pool()
+    if pool is not None:
+        report["chain"] = pool.stats()
+    return ORJSONResponse(
+        report,
+        status_code=status.HTTP_200_OK
+        if report["ready"]
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
     )
 
-    # First check cache
-    cached_result = await get_cached_dividends(netuid, hotkey)
-    if cached_result:
-        logger.debug("Cache hit for netuid=%s, hotkey=%s", netuid, hotkey)
-        return cached_result
 
-    logger.debug(
-        "Cache miss for netuid=%s, hotkey=%s, querying blockchain",
-        netuid,
-        hotkey,
+@app.get(METRICS_PATH, include_in_schema=False)
+async def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    body, media_type = await render_metrics()
+    return Response(body, media_type=media_type)
+
+
+@app.get("/debug/profile", include_in_schema=False)
+async def profile_process(
+    seconds: float = Query(5, gt=0, le=PROFILE_MAX_SECONDS),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Sample the whole event loop for a while, as folded flame graph stacks."""
+    if not can_profile(current_user.username):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return PlainTextResponse(await profile_window(seconds))
+
+
+@app.get("/debug/profile/{request_id}", include_in_schema=False)
+async def get_request_profile(
+    request_id: str, current_user: User = Depends(get_current_active_user)
+):
+    """Folded stacks of a request sent with `X-Profile: true`."""
+    if not can_profile(current_user.username):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    stored = request_profiles.get(request_id)
+    if stored is None or stored[0] != current_user.username:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return PlainTextResponse(stored[1])
+
+
+@app.post("/token", response_model=Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await authenticate_user(form_data.username, form_data.password)
+    if user is None or user.disabled:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token = create_access_token(
+        {"sub": user.username},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
     )
+    return Token(access_token=access_token, token_type="bearer")
+
+
+# In-flight blockchain refreshes keyed by (netuid, hotkey)
+dividend_flights = SingleFlight()
+background_refreshes: set[asyncio.Task] = set()
+
+
+async def refresh_dividends(netuid: int, hotkey: str) -> TaoDividends:
+    lock_token = None
+    if CACHE_LOCK_ENABLED:
+        lock_token = await acquire_refresh_lock(netuid, hotkey)
+        if lock_token is None:
+            # Another worker is refreshing this key; serve what it writes
+            cached_result = await wait_for_cached_dividends(netuid, hotkey)
+            if cached_result:
+                logger.debug(
+                    "Served refresh from another worker for netuid=%s, hotkey=%s",
+                    netuid,
+                    hotkey,
+                )
+                return cached_result
 
-    # Query blockchain
-    querier = TaoDividendQuerier()
+    querier = TaoDividendQuerier(get_subtensor_pool())
     try:
         logger.debug(
             "Querying blockchain for dividends: netuid=%s, hotkey=%s",
             netuid,
             hotkey,
         )
+        # Stamp with the last seen block; the read itself is at head or later
+        block = current_block()
         try:
-            dividend_balance = await querier.get_tao_dividends_per_subnet(
-                netuid, hotkey
-            )
-            if dividend_balance is None:
-                logger.debug(
-                    "No dividend data found for netuid=%s, hotkey=%s",
-                    netuid,
-                    hotkey,
-                )
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"No dividend data found for netuid={netuid}, hotkey={hotkey}",
+            with phase("chain"):
+                dividend_balance = await querier.get_tao_dividends_per_subnet(
+                    netuid, hotkey
                 )
         except Exception as e:
             logger.error(
@@ -145,6 +347,17 @@ async def get_tao_dividends(
                 detail="Error connecting to blockchain service",
             ) from e
 
+        if dividend_balance is None:
+            logger.debug(
+                "No dividend data found for netuid=%s, hotkey=%s",
+                netuid,
+                hotkey,
+            )
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No dividend data found for netuid={netuid}, hotkey={hotkey}",
+            )
+
         logger.debug(
             "Dividend balance retrieved: %s for netuid=%s, hotkey=%s",
             dividend_balance,
@@ -153,12 +366,7 @@ async def get_tao_dividends(
         )
 
         # Create response model
-        dividends = TaoDividends(
-            netuid=netuid,
-            hotkey=hotkey,
-            dividends=float(dividend_balance),
-            timestamp=datetime.utcnow(),
-        )
+        dividends = dividends_from_balance(netuid, hotkey, dividend_balance, block)
 
         # Cache and store results
         logger.debug(
@@ -166,21 +374,670 @@ async def get_tao_dividends(
             netuid,
             hotkey,
         )
-        await cache_dividends(dividends)
-        await store_dividends(dividends)
+        with phase("cache_write"):
+            await cache_dividends(dividends)
+        with phase("history"):
+            await store_dividends(dividends)
+        return dividends
+    finally:
+        await querier.close()
+        if lock_token:
+            await release_refresh_lock(netuid, hotkey, lock_token)
+
+
+def dividends_from_balance(
+    netuid: int, hotkey: str, dividend_balance: "Balance", block: Optional[int]
+) -> TaoDividends:
+    return TaoDividends(
+        netuid=netuid,
+        hotkey=hotkey,
+        dividends=float(dividend_balance),
+        timestamp=datetime.utcnow(),
+        block=block,
+    )
+
+
+async def iter_subnet_dividends(
+    querier: TaoDividendQuerier, netuid: int
+) -> AsyncIterator[TaoDividends]:
+    if await has_cached_subnet_dividends(netuid):
+        logger.debug("Subnet cache hit for netuid=%s", netuid)
+        async for dividends in scan_cached_subnet_dividends(netuid):
+            yield dividends
+        return
+
+    logger.debug("Subnet cache miss for netuid=%s, scanning blockchain", netuid)
+    # Reads happen at or after the last block we saw, so stamping with it
+    # can only make an entry look older than it is, never fresher
+    block = current_block()
+
+    async def scan():
+        async for key_netuid, hotkey, balance in querier.iter_tao_dividends(netuid):
+            yield dividends_from_balance(key_netuid, hotkey, balance, block)
 
-        # If trade flag is set, trigger sentiment analysis
-        if trade:
+    async for dividends in cache_subnet_dividends(netuid, scan(), block):
+        yield dividends
+
+
+async def iter_wildcard_dividends(
+    querier: TaoDividendQuerier, netuid: Optional[int], hotkey: Optional[str]
+) -> AsyncIterator[TaoDividends]:
+    if netuid is None and hotkey is not None:
+        # One hotkey on every subnet: a single multi-key read of those
+        # entries rather than a scan of every subnet's whole map
+        block = current_block()
+        pairs = [(subnet, hotkey) for subnet in await querier.get_subnets()]
+        balances = await querier.get_tao_dividends_multi(pairs)
+        results = [
+            dividends_from_balance(subnet, hotkey, balance, block)
+            for (subnet, _), balance in zip(pairs, balances)
+            if balance is not None
+        ]
+        await cache_dividends_many(results)
+        for dividends in results:
+            yield dividends
+        return
+
+    netuids = [netuid] if netuid is not None else await querier.get_subnets()
+    for subnet in netuids:
+        async for dividends in iter_subnet_dividends(querier, subnet):
+            yield dividends
+
+
+async def stream_wildcard_dividends(
+    netuid: Optional[int], hotkey: Optional[str], output_format: str
+) -> StreamingResponse:
+    querier = TaoDividendQuerier(get_subtensor_pool())
+    items = iter_wildcard_dividends(querier, netuid, hotkey)
+
+    # Pull the first item before answering so chain errors still become a
+    # proper status code instead of a truncated 200 stream
+    try:
+        first = await anext(items, None)
+    except Exception as e:
+        await querier.close()
+        logger.error(
+            "Error scanning blockchain: %s for netuid=%s, hotkey=%s",
+            str(e),
+            netuid,
+            hotkey,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Error connecting to blockchain service",
+        ) from e
+
+    async def body():
+        try:
+            if output_format == "json":
+                yield "["
+            separator = ""
+            item = first
+            while item is not None:
+                if output_format == "json":
+                    yield separator + item.json()
+                    separator = ","
+                else:
+                    yield item.json() + "\n"
+                item = await anext(items, None)
+            if output_format == "json":
+                yield "]"
+        finally:
+            await items.aclose()
+            await querier.close()
+
+    media_type = (
+        "application/json" if output_format == "json" else "application/x-ndjson"
+    )
+    return StreamingResponse(body(), media_type=media_type)
+
+
+async def check_block_produced(block: int):
+    """Reject a block ahead of the chain head with 400."""
+    head = current_block()
+    if head is None or block > head:
+        # The tracker can be a block behind, so ask the chain before refusing
+        querier = TaoDividendQuerier(get_subtensor_pool())
+        try:
+            head = await querier.get_current_block()
+        except Exception as e:
+            logger.error("Error querying chain head: %s", str(e))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Error connecting to blockchain service",
+            ) from e
+        finally:
+            await querier.close()
+    if block > head:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Block {block} is ahead of the chain head ({head})",
+        )
+
+
+async def read_dividends_at_hash(
+    netuid: int, hotkey: str, block_hash: str
+) -> Optional[float]:
+    # Read at the hash itself; history is cached by block number only
+    querier = TaoDividendQuerier(get_subtensor_pool())
+    try:
+        balance = await querier.get_tao_dividends_per_subnet(
+            netuid, hotkey, block_hash=block_hash
+        )
+    except Exception as e:
+        logger.error(
+            "Error querying blockchain at %s: %s for netuid=%s, hotkey=%s",
+            block_hash,
+            str(e),
+            netuid,
+            hotkey,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Error connecting to blockchain service",
+        ) from e
+    finally:
+        await querier.close()
+    return float(balance) if balance is not None else None
+
+
+async def read_dividends_at_blocks(
+    netuid: int, hotkey: str, blocks: list[int]
+) -> list[DividendsAtBlock]:
+    cached = await get_historical_dividends(netuid, hotkey, blocks)
+    missing = [block for block in blocks if block not in cached]
+    fetched = {}
+    if missing:
+        logger.debug(
+            "Querying blockchain at %s blocks for netuid=%s, hotkey=%s",
+            len(missing),
+            netuid,
+            hotkey,
+        )
+        querier = TaoDividendQuerier(get_subtensor_pool())
+        try:
+            balances = await querier.get_tao_dividends_at_blocks(
+                netuid, hotkey, missing
+            )
+            finalized = await querier.get_finalized_block()
+        except Exception as e:
+            logger.error(
+                "Error querying blockchain history: %s for netuid=%s, hotkey=%s",
+                str(e),
+                netuid,
+                hotkey,
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Error connecting to blockchain service",
+            ) from e
+        finally:
+            await querier.close()
+
+        fetched = {
+            block: balance.rao
+            for block, balance in zip(missing, balances)
+            if balance is not None
+        }
+        # Only finalized blocks are immutable; anything newer could be reorged
+        await cache_historical_dividends(
+            netuid,
+            hotkey,
+            {block: rao for block, rao in fetched.items() if block <= finalized},
+        )
+
+    from bittensor.utils.balance import Balance
+
+    items = []
+    for block in blocks:
+        rao = cached.get(block, fetched.get(block))
+        items.append(
+            DividendsAtBlock(
+                block=block,
+                dividends=float(Balance.from_rao(rao)) if rao is not None else None,
+                cached=block in cached,
+            )
+        )
+    return items
+
+
+def schedule_refresh(netuid: int, hotkey: str):
+    key = (netuid, hotkey)
+    if dividend_flights.in_flight(key):
+        return
+    # Detached so the refresh does not count towards this request's timings
+    task = asyncio.create_task(
+        dividend_flights.do(key, lambda: refresh_dividends(netuid, hotkey)),
+        context=detached_context(),
+    )
+    background_refreshes.add(task)
+    task.add_done_callback(_refresh_done)
+
+
+def _refresh_done(task: asyncio.Task):
+    background_refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        # Keep serving the stale entry; the next request schedules a retry
+        logger.warning("Background dividend refresh failed: %s", task.exception())
+
+
+async def trigger_trade(netuid: int, hotkey: str) -> Optional[str]:
+    """Enqueue sentiment analysis unless one was triggered recently.
+
+    Returns 'enqueued' or 'reused', or None when the trigger failed.
+    """
+    with phase("enqueue"):
+        return await _trigger_trade(netuid, hotkey)
+
+
+async def _trigger_trade(netuid: int, hotkey: str) -> Optional[str]:
+    task_id = uuid.uuid4().hex
+    try:
+        holder = await claim_trade_trigger(netuid, hotkey, task_id)
+    except Exception as e:
+        logger.error("Error claiming trade trigger: %s", str(e))
+        return None
+    if holder != task_id:
+        logger.debug(
+            "Reusing sentiment analysis %s for netuid=%s, hotkey=%s",
+            holder,
+            netuid,
+            hotkey,
+        )
+        return "reused"
+
+    logger.debug(
+        "Trade flag set, triggering sentiment analysis for netuid=%s, hotkey=%s",
+        netuid,
+        hotkey,
+    )
+    try:
+        # Publishing to the broker is blocking I/O
+        await run_in_threadpool(
+            celery_app.send_task,
+            "app.worker.analyze_sentiment",
+            args=[netuid, hotkey],
+            task_id=task_id,
+            headers={"request_id": current_request_id()},
+        )
+    except Exception as e:
+        logger.error("Error enqueueing sentiment analysis: %s", str(e))
+        try:
+            await release_trade_trigger(netuid, hotkey, task_id)
+        except Exception:
+            pass  # the claim expires with the window anyway
+        return None
+    return "enqueued"
+
+
+@app.get("/api/v1/tao_dividends", response_model=TaoDividends)
+async def get_tao_dividends(
+    netuid: Optional[int] = Query(
+        None,
+        description="Subnet ID to query dividends for; omit to query every subnet",
+        ge=0,
+        le=65535,
+        example=4,
+    ),
+    hotkey: Optional[str] = Query(
+        None,
+        description=(
+            "Hotkey (account ID or public key) to query dividends for; "
+            "omit to query every hotkey"
+        ),
+        min_length=48,
+        max_length=64,
+        regex="^5[A-Za-z0-9]+$",
+        example="5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx",
+    ),
+    trade: bool = Query(
+        False,
+        description="Whether to trigger sentiment analysis and trading based on results",
+    ),
+    block: Optional[int] = Query(
+        None,
+        description="Read dividends as of this block number instead of the head",
+        ge=0,
+    ),
+    block_hash: Optional[str] = Query(
+        None,
+        description="Read dividends as of this block hash instead of the head",
+        regex="^0x[0-9a-fA-F]{64}$",
+    ),
+    output_format: str = Query(
+        "ndjson",
+        alias="format",
+        description="Stream format used when netuid or hotkey is omitted",
+        regex="^(ndjson|json)$",
+    ),
+    current_user: User = Depends(get_current_active_user),
+):
+    logger.debug(
+        "Tao dividends requested for netuid=%s, hotkey=%s, trade=%s",
+        netuid,
+        hotkey,
+        trade,
+    )
+
+    # Point-in-time queries are served from the permanent history cache
+    if block is not None or block_hash is not None:
+        if netuid is None or hotkey is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="netuid and hotkey are required for historical queries",
+            )
+        if block is not None:
+            await check_block_produced(block)
+            item = (await read_dividends_at_blocks(netuid, hotkey, [block]))[0]
+            dividends, cached, at = item.dividends, item.cached, f"block={block}"
+        else:
+            dividends = await read_dividends_at_hash(netuid, hotkey, block_hash)
+            cached, at = False, f"block_hash={block_hash}"
+        if dividends is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=(
+                    f"No dividend data found for netuid={netuid}, "
+                    f"hotkey={hotkey} at {at}"
+                ),
+            )
+        return TaoDividends(
+            netuid=netuid,
+            hotkey=hotkey,
+            dividends=dividends,
+            timestamp=datetime.utcnow(),
+            block=block,
+            cached=cached,
+        )
+
+    # Wildcard queries scan the storage map and stream the results
+    if netuid is None or hotkey is None:
+        return await stream_wildcard_dividends(netuid, hotkey, output_format)
+
+    # Popular keys are refreshed ahead of expiry by the cache pre-warmer
+    record_request(netuid, hotkey)
+
+    # First check cache
+    with phase("cache"):
+        cached = await get_cached_entry(netuid, hotkey, allow_stale=True)
+    if cached:
+        entry, stale = cached
+        if stale:
+            # Answer now and refresh in the background; if the chain is down
+            # the refresh fails quietly and the stale value keeps being served
             logger.debug(
-                "Trade flag set, triggering sentiment analysis for netuid=%s, hotkey=%s",
+                "Stale cache hit for netuid=%s, hotkey=%s, refreshing",
                 netuid,
                 hotkey,
             )
-            await celery_app.send_task(
-                "app.worker.analyze_sentiment",
-                args=[netuid, hotkey],
+            schedule_refresh(netuid, hotkey)
+        else:
+            logger.debug("Cache hit for netuid=%s, hotkey=%s", netuid, hotkey)
+        trade_status = await trigger_trade(netuid, hotkey) if trade else None
+        # The stored JSON goes out as is, without building a model
+        return Response(
+            entry.body(stale, trade_status),
+            media_type="application/json",
+            headers={"X-Cache": "stale" if stale else "hit"},
+        )
+
+    logger.debug(
+        "Cache miss for netuid=%s, hotkey=%s, querying blockchain",
+        netuid,
+        hotkey,
+    )
+
+    # Concurrent misses for the same key share a single blockchain query
+    dividends = await dividend_flights.do(
+        (netuid, hotkey), lambda: refresh_dividends(netuid, hotkey)
+    )
+
+    # If trade flag is set, trigger sentiment analysis
+    if trade:
+        trade_status = await trigger_trade(netuid, hotkey)
+        # The result object may be shared with other requests
+        dividends = dividends.copy(update={"trade_status": trade_status})
+
+    with phase("render"):
+        return ORJSONResponse(dividends.dict(), headers={"X-Cache": "miss"})
+
+
+@app.post("/api/v1/tao_dividends/batch", response_model=BatchDividendsResponse)
+async def get_tao_dividends_batch(
+    request: BatchDividendsRequest,
+    current_user: User = Depends(get_current_active_user),
+):
+    pairs = list(dict.fromkeys((pair.netuid, pair.hotkey) for pair in request.pairs))
+    logger.debug("Batch of %s dividend pairs requested", len(pairs))
+
+    # One round trip resolves every cache hit
+    cached_results = await get_cached_dividends_many(pairs)
+    found = {
+        pair: dividends
+        for pair, dividends in zip(pairs, cached_results)
+        if dividends is not None
+    }
+    errors = {}
+
+    # All misses are read from the chain in one multi-key storage query
+    misses = [pair for pair in pairs if pair not in found]
+    if misses:
+        logger.debug("Batch cache misses: %s, querying blockchain", len(misses))
+        querier = TaoDividendQuerier(get_subtensor_pool())
+        block = current_block()
+        try:
+            balances = await querier.get_tao_dividends_multi(misses)
+        except Exception as e:
+            logger.error("Error querying blockchain for batch: %s", str(e))
+            errors.update(
+                (pair, "Error connecting to blockchain service") for pair in misses
+            )
+        else:
+            fetched = []
+            for (netuid, hotkey), balance in zip(misses, balances):
+                if balance is None:
+                    errors[(netuid, hotkey)] = "No dividend data found"
+                    continue
+                dividends = dividends_from_balance(netuid, hotkey, balance, block)
+                found[(netuid, hotkey)] = dividends
+                fetched.append(dividends)
+            await cache_dividends_many(fetched)
+            for dividends in fetched:
+                await store_dividends(dividends)
+        finally:
+            await querier.close()
+
+    return BatchDividendsResponse(
+        results=[
+            BatchDividendsResult(
+                netuid=netuid,
+                hotkey=hotkey,
+                dividends=found.get((netuid, hotkey)),
+                error=errors.get((netuid, hotkey)),
             )
+            for netuid, hotkey in pairs
+        ]
+    )
 
-        return dividends
+
+async def read_dividends_many(
+    pairs: list[tuple[int, str]],
+) -> list[Optional[TaoDividends]]:
+    """Chain read of many pairs in one multi-key query, cached as it goes.
+
+    Used by the dividend stream each block and by the cache pre-warmer.
+    """
+    querier = TaoDividendQuerier(get_subtensor_pool())
+    block = current_block()
+    try:
+        balances = await querier.get_tao_dividends_multi(pairs)
     finally:
         await querier.close()
+    results = [
+        dividends_from_balance(netuid, hotkey, balance, block)
+        if balance is not None
+        else None
+        for (netuid, hotkey), balance in zip(pairs, balances)
+    ]
+    await cache_dividends_many([item for item in results if item is not None])
+    return results
+
+
+@app.get("/api/v1/tao_dividends/stream")
+async def stream_tao_dividends(
+    pairs: list[str] = Query(
+        ...,
+        alias="pair",
+        description="netuid:hotkey pair to watch; repeat for several",
+        example=["4:5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx"],
+    ),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Server-sent events with the current values, then every change."""
+    try:
+        watched = parse_pairs(pairs)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    stream = get_dividend_stream()
+    if stream is None or stream.full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open streams",
+        )
+    subscription = await stream.subscribe(watched)
+    return StreamingResponse(
+        sse_events(stream, subscription),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/api/v1/tao_dividends/ws")
+async def websocket_tao_dividends(websocket: WebSocket):
+    # Security dependencies only cover HTTP requests, so check headers here
+    if await user_from_headers(websocket.headers) is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    stream = get_dividend_stream()
+    if stream is None or stream.full:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    await websocket.accept()
+    await serve_websocket(stream, websocket)
+
+
+@app.get("/api/v1/tao_dividends/range", response_model=DividendRange)
+async def get_tao_dividends_range(
+    netuid: int = Query(..., description="Subnet ID", ge=0, le=65535, example=4),
+    hotkey: str = Query(
+        ...,
+        description="Hotkey (account ID or public key)",
+        min_length=48,
+        max_length=64,
+        regex="^5[A-Za-z0-9]+$",
+        example="5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx",
+    ),
+    start_block: int = Query(..., description="First block of the range", ge=0),
+    end_block: int = Query(
+        ..., description="Last block of the range (inclusive)", ge=0
+    ),
+    step: int = Query(1, description="Read every step-th block", ge=1),
+    current_user: User = Depends(get_current_active_user),
+):
+    if end_block < start_block:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_block must not be before start_block",
+        )
+    # Sized before any list is built, so a huge range costs nothing
+    block_range = range(start_block, end_block + 1, step)
+    if len(block_range) > MAX_BLOCK_RANGE_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Block range must cover 1 to {MAX_BLOCK_RANGE_POINTS} points",
+        )
+    blocks = list(block_range)
+    await check_block_produced(blocks[-1])
+
+    logger.debug(
+        "Dividend range requested for netuid=%s, hotkey=%s, blocks %s..%s step %s",
+        netuid,
+        hotkey,
+        start_block,
+        end_block,
+        step,
+    )
+    items = await read_dividends_at_blocks(netuid, hotkey, blocks)
+    return DividendRange(netuid=netuid, hotkey=hotkey, items=items)
+
+
+@app.get("/api/v1/tao_dividends/history", response_model=DividendHistory)
+async def get_tao_dividends_history(
+    netuid: int = Query(..., description="Subnet ID", ge=0, le=65535, example=4),
+    hotkey: str = Query(
+        ...,
+        description="Hotkey (account ID or public key)",
+        min_length=48,
+        max_length=64,
+        regex="^5[A-Za-z0-9]+$",
+        example="5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx",
+    ),
+    start: Optional[datetime] = Query(
+        None, description="Start of the range (UTC), defaults to 24 hours ago"
+    ),
+    end: Optional[datetime] = Query(
+        None, description="End of the range (UTC, exclusive), defaults to now"
+    ),
+    bucket: Optional[int] = Query(
+        None,
+        description="Downsample into buckets of this many seconds (min/max/last)",
+        ge=1,
+    ),
+    limit: int = Query(500, description="Maximum items per page", ge=1, le=5000),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor from the previous page"
+    ),
+    current_user: User = Depends(get_current_active_user),
+):
+    after = after_id = None
+    if cursor is not None:
+        try:
+            after, after_id = decode_history_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+    # Stored timestamps are naive UTC, so normalise any offsets we were given
+    start, end, after = (
+        value.astimezone(timezone.utc).replace(tzinfo=None)
+        if value is not None and value.tzinfo
+        else value
+        for value in (start, end, after)
+    )
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    if after is not None and after >= start:
+        start = after
+    else:
+        after_id = None
+    if start >= end:
+        return DividendHistory(netuid=netuid, hotkey=hotkey, bucket=bucket, items=[])
+
+    logger.debug(
+        "Dividend history requested for netuid=%s, hotkey=%s, start=%s, end=%s",
+        netuid,
+        hotkey,
+        start,
+        end,
+    )
+    items, next_cursor = await query_dividend_history(
+        netuid, hotkey, start, end, bucket, limit, after_id
+    )
+    return DividendHistory(
+        netuid=netuid,
+        hotkey=hotkey,
+        bucket=bucket,
+        items=items,
+        next_cursor=next_cursor,
+    )
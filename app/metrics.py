@@ -0,0 +1,267 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from redis import asyncio as aioredis
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Metrics configuration. With several uvicorn workers, point
+# PROMETHEUS_MULTIPROC_DIR at an empty directory shared by all of them (and
+# wipe it on startup) so /metrics reports every worker, not just one.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("true", "1", "t")
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# Celery queues whose backlog is reported
+METRICS_CELERY_QUEUES = os.getenv("METRICS_CELERY_QUEUES", "celery").split(",")
+METRICS_PATH = "/metrics"
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+CHAIN_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Label values are bounded: routes are path templates and netuids are only
+# used as labels for subnets known to exist. Hotkeys are never used as labels.
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer an HTTP request",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+    multiprocess_mode="livesum",
+)
+CHAIN_QUERY_LATENCY = Histogram(
+    "chain_query_duration_seconds",
+    "Time spent on subtensor queries",
+    ["method", "netuid", "outcome"],
+    buckets=CHAIN_BUCKETS,
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Time spent on dividends cache round trips to Redis",
+    ["operation", "outcome"],
+    buckets=FAST_BUCKETS,
+)
+MONGO_WRITE_LATENCY = Histogram(
+    "mongo_write_duration_seconds",
+    "Time spent writing to MongoDB",
+    ["collection", "operation", "outcome"],
+    buckets=FAST_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "dividends_cache_lookups_total",
+    "Dividends cache lookups by tier and result",
+    ["tier", "result", "netuid"],
+)
+POOL_CONNECTIONS = Gauge(
+    "subtensor_pool_connections",
+    "Subtensor pool connections by health",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+POOL_IN_FLIGHT = Gauge(
+    "subtensor_pool_in_flight",
+    "Queries currently holding a subtensor pool connection",
+    multiprocess_mode="livesum",
+)
+# Labelled by the node's position in SUBTENSOR_ENDPOINTS, since endpoint
+# URLs may carry API keys
+NODE_BREAKER_OPEN = Gauge(
+    "subtensor_node_breaker_open",
+    "Processes whose circuit breaker for a subtensor node is open",
+    ["node"],
+    multiprocess_mode="livesum",
+)
+HEDGED_READS = Counter(
+    "subtensor_hedged_reads_total",
+    "Reads sent to a second subtensor node",
+    ["reason"],
+)
+STREAM_CONNECTIONS = Gauge(
+    "dividend_stream_connections",
+    "Open dividend stream connections",
+    multiprocess_mode="livesum",
+)
+STREAM_PAIRS = Gauge(
+    "dividend_stream_watched_pairs",
+    "Distinct (netuid, hotkey) pairs watched by each process's streams",
+    multiprocess_mode="livesum",
+)
+STREAM_UPDATES = Counter(
+    "dividend_stream_updates_total",
+    "Dividend updates queued for stream subscribers, by outcome",
+    ["outcome"],
+)
+STREAM_ROUNDS = Counter(
+    "dividend_stream_rounds_total",
+    "Per-block stream refreshes, by whether this process did the chain read",
+    ["role"],
+)
+HISTORY_QUEUE_DEPTH = Gauge(
+    "history_queue_depth",
+    "History records queued for the next write to MongoDB",
+    multiprocess_mode="livesum",
+)
+HISTORY_FLUSH_LATENCY = Histogram(
+    "history_flush_duration_seconds",
+    "Time to write one batch of queued history records",
+    buckets=FAST_BUCKETS,
+)
+# Dropped records are those MongoDB rejected; a full queue makes writers
+# wait rather than drop
+HISTORY_RECORDS = Counter(
+    "history_records_total",
+    "History records taken off the write-behind queue, by outcome",
+    ["collection", "outcome"],
+)
+PREWARM_KEYS = Counter(
+    "dividends_prewarm_keys_total",
+    "Popular keys due for a pre-warming refresh, by outcome",
+    ["outcome"],
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observe the duration of the block, labelled with its outcome."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        histogram.labels(outcome=outcome, **labels).observe(
+            time.perf_counter() - started
+        )
+
+
+# Subnets on chain, from the latest subnet listing; until one is read and
+# for netuids outside it (which clients can send at will) the label is "other"
+known_netuids: frozenset[int] = frozenset()
+
+
+def set_known_netuids(netuids):
+    global known_netuids
+    known_netuids = frozenset(netuids)
+
+
+def netuid_label(netuid: int) -> str:
+    return str(netuid) if netuid in known_netuids else "other"
+
+
+def count_cache_lookup(tier: str, result: str, netuid: int):
+    CACHE_LOOKUPS.labels(tier=tier, result=result, netuid=netuid_label(netuid)).inc()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and in-flight requests."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or not METRICS_ENABLED
+            or scope["path"] == METRICS_PATH
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # Set by the router once matched; label with the path template
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            ).observe(time.perf_counter() - started)
+
+
+class _ValueCollector:
+    def __init__(self, metric: GaugeMetricFamily):
+        self.metric = metric
+
+    def collect(self):
+        yield self.metric
+
+
+# Broker connection used to read Celery queue lengths at scrape time
+broker_client: Optional[aioredis.Redis] = None
+
+
+def init_metrics(broker_url: str):
+    global broker_client
+    if METRICS_ENABLED and broker_url.startswith(("redis://", "rediss://")):
+        broker_client = aioredis.from_url(broker_url, decode_responses=True)
+
+
+async def close_metrics():
+    global broker_client
+    if broker_client is not None:
+        await broker_client.aclose()
+        broker_client = None
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+async def celery_queue_depth() -> Optional[GaugeMetricFamily]:
+    if broker_client is None:
+        return None
+    metric = GaugeMetricFamily(
+        "celery_queue_depth", "Tasks waiting in the Celery broker", labels=["queue"]
+    )
+    pipe = broker_client.pipeline(transaction=False)
+    for queue in METRICS_CELERY_QUEUES:
+        pipe.llen(queue)
+    try:
+        lengths = await pipe.execute()
+    except Exception as e:
+        logger.warning("Failed to read Celery queue depth: %s", e)
+        return None
+    for queue, length in zip(METRICS_CELERY_QUEUES, lengths):
+        metric.add_metric([queue], length)
+    return metric
+
+
+async def render_metrics() -> tuple[bytes, str]:
+    """The exposition body for this process, or every worker's in multiprocess."""
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    body = generate_latest(registry)
+    queue_depth = await celery_queue_depth()
+    if queue_depth is not None:
+        # Read live from the broker, so it is the same from any worker
+        extra = CollectorRegistry()
+        extra.register(_ValueCollector(queue_depth))
+        body += generate_latest(extra)
+    return body, CONTENT_TYPE_LATEST
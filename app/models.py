@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class TaoDividends(BaseModel):
@@ -9,7 +9,66 @@ class TaoDividends(BaseModel):
     hotkey: str
     dividends: float
     timestamp: datetime
+    block: Optional[int] = None  # chain block the value was read at
     cached: bool = False
+    stale: bool = False  # served past soft expiry while a refresh runs
+    trade_status: Optional[str] = None  # 'enqueued' or 'reused' for trade=true
+
+
+class DividendPair(BaseModel):
+    netuid: int = Field(..., ge=0, le=65535)
+    hotkey: str = Field(..., min_length=48, max_length=64, pattern="^5[A-Za-z0-9]+$")
+
+
+class BatchDividendsRequest(BaseModel):
+    pairs: list[DividendPair] = Field(..., min_length=1, max_length=1000)
+
+
+class BatchDividendsResult(BaseModel):
+    netuid: int
+    hotkey: str
+    dividends: Optional[TaoDividends] = None
+    error: Optional[str] = None  # set instead of dividends when this item failed
+
+
+class BatchDividendsResponse(BaseModel):
+    results: list[BatchDividendsResult]
+
+
+class DividendsAtBlock(BaseModel):
+    block: int
+    dividends: Optional[float] = None  # None when the chain holds no entry
+    cached: bool = False
+
+
+class DividendRange(BaseModel):
+    netuid: int
+    hotkey: str
+    items: list[DividendsAtBlock]
+
+
+class DividendHistoryEntry(BaseModel):
+    timestamp: datetime  # sample time, or bucket start when downsampled
+    dividends: float  # last value in the bucket
+    block: Optional[int] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    count: int = 1
+
+
+class DividendHistory(BaseModel):
+    netuid: int
+    hotkey: str
+    bucket: Optional[int] = None  # bucket width in seconds
+    items: list[DividendHistoryEntry]
+    next_cursor: Optional[str] = None  # opaque, passed back as `cursor`
+
+
+class SubnetSentiment(BaseModel):
+    netuid: int
+    sentiment_score: float
+    tweet_count: int
+    timestamp: datetime  # when the tweets were analyzed
 
 
 class SentimentAnalysis(BaseModel):
@@ -20,3 +79,9 @@ class SentimentAnalysis(BaseModel):
     timestamp: datetime
     action_taken: Optional[str] = None  # 'stake' or 'unstake'
     action_amount: Optional[float] = None
+    decision_id: Optional[str] = None  # links the extrinsic result back here
+    # pending, netted, included, finalized or failed
+    extrinsic_status: Optional[str] = None
+    extrinsic_hash: Optional[str] = None
+    block_hash: Optional[str] = None
+    extrinsic_error: Optional[str] = None
@@ -0,0 +1,624 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Optional,
+    TypeVar,
+)
+
+from app.metrics import (
+    HEDGED_READS,
+    NODE_BREAKER_OPEN,
+    POOL_CONNECTIONS,
+    POOL_IN_FLIGHT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Subtensor pool configuration
+SUBTENSOR_NETWORK = os.getenv("SUBTENSOR_NETWORK", "test")
+# Comma-separated node endpoints (network names or ws:// URLs) to route
+# reads across; defaults to SUBTENSOR_NETWORK alone
+SUBTENSOR_ENDPOINTS = [
+    endpoint
+    for endpoint in os.getenv("SUBTENSOR_ENDPOINTS", SUBTENSOR_NETWORK).split(",")
+    if endpoint
+]
+# Connections per endpoint
+SUBTENSOR_POOL_SIZE = int(os.getenv("SUBTENSOR_POOL_SIZE", "4"))
+SUBTENSOR_MAX_IN_FLIGHT = int(os.getenv("SUBTENSOR_MAX_IN_FLIGHT", "32"))
+SUBTENSOR_HEALTH_CHECK_INTERVAL = float(
+    os.getenv("SUBTENSOR_HEALTH_CHECK_INTERVAL", "30")
+)
+SUBTENSOR_HEALTH_CHECK_TIMEOUT = float(
+    os.getenv("SUBTENSOR_HEALTH_CHECK_TIMEOUT", "10")
+)
+# Calls per node kept for its latency percentiles and error rate
+SUBTENSOR_LATENCY_WINDOW = int(os.getenv("SUBTENSOR_LATENCY_WINDOW", "100"))
+# A node's breaker opens once this share of its recent calls failed (with at
+# least SUBTENSOR_BREAKER_MIN_CALLS recorded), and lets a probe call through
+# after SUBTENSOR_BREAKER_RESET_TIMEOUT seconds
+SUBTENSOR_BREAKER_ERROR_RATE = float(os.getenv("SUBTENSOR_BREAKER_ERROR_RATE", "0.5"))
+SUBTENSOR_BREAKER_MIN_CALLS = int(os.getenv("SUBTENSOR_BREAKER_MIN_CALLS", "10"))
+SUBTENSOR_BREAKER_RESET_TIMEOUT = float(
+    os.getenv("SUBTENSOR_BREAKER_RESET_TIMEOUT", "30")
+)
+# Send a duplicate read to a second node when the first takes longer than
+# this latency percentile of its node (0 disables hedging)
+SUBTENSOR_HEDGE_PERCENTILE = float(os.getenv("SUBTENSOR_HEDGE_PERCENTILE", "0"))
+# Latency samples a node needs before its reads are hedged
+HEDGE_MIN_SAMPLES = 20
+# Weight of the newest sample in a node's moving average latency
+LATENCY_EWMA_WEIGHT = 0.2
+
+T = TypeVar("T")
+
+# bittensor is slow to import, so it is deferred until the first connection
+if TYPE_CHECKING:
+    from bittensor import AsyncSubtensor
+
+
+def connect_subtensor(network: str) -> "AsyncSubtensor":
+    from bittensor import AsyncSubtensor
+
+    return AsyncSubtensor(network=network)
+
+
+class PooledConnection:
+    """A single warmed subtensor websocket with its own in-flight limit."""
+
+    def __init__(
+        self,
+        index: int,
+        factory: Callable[[str], "AsyncSubtensor"],
+        max_in_flight: int,
+        endpoint: str = SUBTENSOR_NETWORK,
+    ):
+        self.index = index
+        self.endpoint = endpoint
+        self.subtensor: Optional["AsyncSubtensor"] = None
+        self._healthy = False
+        self.in_flight = 0
+        self._factory = factory
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._reconnect_lock = asyncio.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return self._healthy
+
+    @healthy.setter
+    def healthy(self, healthy: bool):
+        if healthy != self._healthy:
+            POOL_CONNECTIONS.labels(state="healthy").inc(1 if healthy else -1)
+        self._healthy = healthy
+
+    async def connect(self):
+        subtensor = self._factory(self.endpoint)
+        await subtensor.initialize()
+        self.subtensor = subtensor
+        self.healthy = True
+
+    async def ensure_connected(self) -> bool:
+        """Connect unless already connected; True if a connection was made."""
+        # Several borrowers (or a borrower and the pool's own start) may
+        # notice at once; only connect once
+        async with self._reconnect_lock:
+            if self.healthy:
+                return False
+            await self.disconnect()
+            await self.connect()
+            return True
+
+    async def reconnect(self):
+        if await self.ensure_connected():
+            logger.info("Subtensor connection %s reconnected", self.index)
+
+    async def disconnect(self):
+        self.healthy = False
+        if self.subtensor is not None:
+            try:
+                await self.subtensor.close()
+            except Exception as e:
+                logger.debug("Error closing subtensor connection %s: %s", self.index, e)
+            self.subtensor = None
+
+    async def check(self, timeout: float) -> bool:
+        if self.subtensor is None:
+            return False
+        try:
+            await asyncio.wait_for(self.subtensor.get_current_block(), timeout)
+            return True
+        except Exception as e:
+            logger.warning(
+                "Subtensor connection %s failed health check: %s", self.index, e
+            )
+            return False
+
+
+class CircuitBreaker:
+    """Stop routing to a node whose recent calls keep failing.
+
+    While closed, the outcomes of the last `window` calls are kept. Once at
+    least `min_calls` are recorded and the failed share reaches
+    `error_rate`, the breaker opens and the node gets no traffic for
+    `reset_timeout` seconds. It is then half-open: a single probe call is
+    let through, which closes the breaker on success or reopens it.
+
+    `acquire` tells a call whether it is the probe, and the call passes
+    that on to `record` or `release`, so only the probe's end lets the
+    next one through.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        error_rate: float = SUBTENSOR_BREAKER_ERROR_RATE,
+        min_calls: int = SUBTENSOR_BREAKER_MIN_CALLS,
+        window: int = SUBTENSOR_LATENCY_WINDOW,
+        reset_timeout: float = SUBTENSOR_BREAKER_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+        on_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.error_rate_threshold = error_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._clock = clock
+        self._on_change = on_change
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    def available(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN:
+            return not self._probing
+        return self._clock() - self._opened_at >= self.reset_timeout
+
+    def acquire(self) -> bool:
+        """Note a call starting; returns whether it is the probe."""
+        if self.state == self.OPEN and self.available():
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release(self, probe: bool):
+        """Note a call that ended without an outcome, such as a cancelled one."""
+        if probe:
+            self._probing = False
+
+    def record(self, failed: bool, probe: bool = False):
+        if probe:
+            self._probing = False
+            if failed:
+                self._open()
+            else:
+                self._outcomes.clear()
+                self._set_state(self.CLOSED)
+        elif self.state == self.CLOSED:
+            self._outcomes.append(failed)
+            if (
+                len(self._outcomes) >= self.min_calls
+                and self.error_rate >= self.error_rate_threshold
+            ):
+                self._open()
+        # Calls made while open or beside the probe (when every node is
+        # unavailable) tell nothing new
+
+    def _open(self):
+        self._opened_at = self._clock()
+        self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        previous, self.state = self.state, state
+        if state != previous and self._on_change is not None:
+            self._on_change(previous, state)
+
+
+class SubtensorNode:
+    """One chain endpoint with its connections, latency and breaker."""
+
+    def __init__(
+        self,
+        index: int,
+        endpoint: str,
+        connections: list[PooledConnection],
+        breaker: CircuitBreaker,
+        window: int = SUBTENSOR_LATENCY_WINDOW,
+    ):
+        self.index = index
+        self.endpoint = endpoint
+        self.connections = connections
+        self.breaker = breaker
+        self.latency: Optional[float] = None
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(connection.in_flight for connection in self.connections)
+
+    @property
+    def healthy(self) -> bool:
+        return any(connection.healthy for connection in self.connections)
+
+    def available(self) -> bool:
+        return self.healthy and self.breaker.available()
+
+    def cost(self) -> float:
+        # Peak-EWMA style: a node's expected latency grows with the calls it
+        # is already serving and with its recent error rate. Nodes without
+        # samples yet cost nothing, so each gets tried early on.
+        if self.latency is None:
+            return 0.0
+        error_rate = min(self.breaker.error_rate, 0.9)
+        return self.latency * (self.in_flight + 1) / (1 - error_rate)
+
+    def observe_latency(self, seconds: float):
+        self._latencies.append(seconds)
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_EWMA_WEIGHT * (seconds - self.latency)
+
+    def record(
+        self, seconds: Optional[float], failed: bool = False, probe: bool = False
+    ):
+        if not failed and seconds is not None:
+            self.observe_latency(seconds)
+        self.breaker.record(failed, probe)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def pick(self) -> PooledConnection:
+        healthy = [connection for connection in self.connections if connection.healthy]
+        candidates = healthy or self.connections
+        return min(candidates, key=lambda connection: connection.in_flight)
+
+    def stats(self) -> dict:
+        return {
+            "endpoint": self.endpoint,
+            "breaker": self.breaker.state,
+            "latency_ms": None if self.latency is None else self.latency * 1000,
+            "error_rate": self.breaker.error_rate,
+            "healthy": sum(connection.healthy for connection in self.connections),
+            "in_flight": self.in_flight,
+        }
+
+
+class SubtensorPool:
+    """App-lifetime pool of subtensor connections that queriers borrow from.
+
+    Connections are opened to every endpoint, and each borrow goes to the
+    node with the lowest expected latency whose circuit breaker lets calls
+    through. `read` can also hedge: when the chosen node is slower than its
+    usual `hedge_percentile` latency, the read is raced on a second node.
+    """
+
+    def __init__(
+        self,
+        network: str = SUBTENSOR_NETWORK,
+        size: int = SUBTENSOR_POOL_SIZE,
+        max_in_flight: int = SUBTENSOR_MAX_IN_FLIGHT,
+        health_check_interval: float = SUBTENSOR_HEALTH_CHECK_INTERVAL,
+        health_check_timeout: float = SUBTENSOR_HEALTH_CHECK_TIMEOUT,
+        factory: Optional[Callable[[str], "AsyncSubtensor"]] = None,
+        endpoints: Optional[list[str]] = None,
+        breaker_error_rate: float = SUBTENSOR_BREAKER_ERROR_RATE,
+        breaker_min_calls: int = SUBTENSOR_BREAKER_MIN_CALLS,
+        breaker_reset_timeout: float = SUBTENSOR_BREAKER_RESET_TIMEOUT,
+        hedge_percentile: float = SUBTENSOR_HEDGE_PERCENTILE,
+        latency_window: int = SUBTENSOR_LATENCY_WINDOW,
+    ):
+        if size < 1:
+            raise ValueError("Subtensor pool size must be at least 1")
+        if endpoints is None:
+            endpoints = (
+                SUBTENSOR_ENDPOINTS if network == SUBTENSOR_NETWORK else [network]
+            )
+        if not endpoints:
+            raise ValueError("Subtensor pool needs at least one endpoint")
+        self.network = network
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.hedge_percentile = hedge_percentile
+        factory = factory or connect_subtensor
+        self.nodes: list[SubtensorNode] = []
+        self.connections: list[PooledConnection] = []
+        for node_index, endpoint in enumerate(endpoints):
+            connections = [
+                PooledConnection(
+                    len(self.connections) + index, factory, max_in_flight, endpoint
+                )
+                for index in range(size)
+            ]
+            self.connections.extend(connections)
+            breaker = CircuitBreaker(
+                breaker_error_rate,
+                breaker_min_calls,
+                latency_window,
+                breaker_reset_timeout,
+                on_change=self._breaker_changed(node_index, endpoint),
+            )
+            self.nodes.append(
+                SubtensorNode(
+                    node_index, endpoint, connections, breaker, latency_window
+                )
+            )
+        POOL_CONNECTIONS.labels(state="total").inc(len(self.connections))
+        self._health_task: Optional[asyncio.Task] = None
+        self._background: set[asyncio.Task] = set()
+
+    async def start(self):
+        # Borrowers arriving before this finishes connect on demand instead
+        results = await asyncio.gather(
+            *(connection.ensure_connected() for connection in self.connections),
+            return_exceptions=True,
+        )
+        for connection, result in zip(self.connections, results):
+            if isinstance(result, Exception):
+                logger.warning(
+                    "Subtensor connection %s failed to warm up: %s",
+                    connection.index,
+                    result,
+                )
+        if self.health_check_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_check_loop())
+        logger.info(
+            "Subtensor pool started with %s/%s healthy connections to %s",
+            sum(connection.healthy for connection in self.connections),
+            len(self.connections),
+            ", ".join(node.endpoint for node in self.nodes),
+        )
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(
+            *(connection.disconnect() for connection in self.connections),
+            return_exceptions=True,
+        )
+        POOL_CONNECTIONS.labels(state="total").dec(len(self.connections))
+        for node in self.nodes:
+            if node.breaker.state != CircuitBreaker.CLOSED:
+                NODE_BREAKER_OPEN.labels(node=str(node.index)).dec()
+
+    def _breaker_changed(self, index: int, endpoint: str) -> Callable[[str, str], None]:
+        gauge = NODE_BREAKER_OPEN.labels(node=str(index))
+
+        def changed(previous: str, state: str):
+            # Half-open still counts as open, as traffic is held back
+            if previous == CircuitBreaker.CLOSED:
+                gauge.inc()
+                logger.warning("Circuit breaker for subtensor node %s opened", endpoint)
+            elif state == CircuitBreaker.CLOSED:
+                gauge.dec()
+                logger.info("Circuit breaker for subtensor node %s closed", endpoint)
+
+        return changed
+
+    def _pick_node(self, exclude: tuple = ()) -> Optional[SubtensorNode]:
+        candidates = [
+            node for node in self.nodes if node not in exclude and node.available()
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=SubtensorNode.cost)
+
+    def _pick(self) -> SubtensorNode:
+        # With every node unhealthy or open, still try rather than fail fast
+        return self._pick_node() or min(self.nodes, key=SubtensorNode.cost)
+
+    @asynccontextmanager
+    async def acquire(
+        self, node: Optional[SubtensorNode] = None, timed: bool = True
+    ) -> AsyncIterator["AsyncSubtensor"]:
+        """Borrow a connection; its outcome feeds the node's breaker.
+
+        With `timed`, the borrow is also a latency sample for routing and
+        hedging, so borrows spanning many calls or a slow consumer, such as
+        scans and fan-outs, pass False.
+        """
+        node = node or self._pick()
+        connection = node.pick()
+        probe = node.breaker.acquire()
+        recorded = False
+        connection.in_flight += 1
+        POOL_IN_FLIGHT.inc()
+        try:
+            async with connection._semaphore:
+                if not connection.healthy:
+                    try:
+                        await connection.reconnect()
+                    except Exception:
+                        node.record(None, failed=True, probe=probe)
+                        recorded = True
+                        raise
+                started = time.perf_counter()
+                try:
+                    yield connection.subtensor
+                except Exception:
+                    node.record(None, failed=True, probe=probe)
+                    recorded = True
+                    self._verify_later(connection)
+                    raise
+                seconds = time.perf_counter() - started if timed else None
+                node.record(seconds, probe=probe)
+                recorded = True
+        finally:
+            if not recorded:
+                node.breaker.release(probe)
+            connection.in_flight -= 1
+            POOL_IN_FLIGHT.dec()
+
+    async def _read_on(
+        self, node: SubtensorNode, query: Callable[["AsyncSubtensor"], Awaitable[T]]
+    ) -> T:
+        async with self.acquire(node) as subtensor:
+            return await query(subtensor)
+
+    async def read(self, query: Callable[["AsyncSubtensor"], Awaitable[T]]) -> T:
+        """Run an idempotent read on the best node, backed by a second one.
+
+        The read moves to a second node when the first fails. With hedging
+        on, it is also raced on the second node once the first is slower
+        than its `hedge_percentile` latency; the first result wins and the
+        other call is cancelled.
+        """
+        node = self._pick()
+        if len(self.nodes) < 2:
+            return await self._read_on(node, query)
+        delay = None
+        if self.hedge_percentile:
+            delay = node.percentile(self.hedge_percentile)
+
+        tried = (node,)
+        pending = {asyncio.create_task(self._read_on(node, query))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=delay if len(tried) < 2 else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if len(tried) < 2:
+                    other = self._pick_node(exclude=tried)
+                    if other is not None:
+                        reason = "slow" if error is None else "error"
+                        HEDGED_READS.labels(reason=reason).inc()
+                        tried += (other,)
+                        pending.add(asyncio.create_task(self._read_on(other, query)))
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _verify_later(self, connection: PooledConnection):
+        # A failed query may be a bad request rather than a dead socket, so
+        # confirm with a health check before paying for a reconnect.
+        task = asyncio.create_task(self._verify(connection))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _verify(self, connection: PooledConnection):
+        started = time.perf_counter()
+        if await connection.check(self.health_check_timeout):
+            # Keeps latency estimates fresh for nodes that get little traffic
+            self._node_of(connection).observe_latency(time.perf_counter() - started)
+            return
+        connection.healthy = False
+        try:
+            await connection.reconnect()
+        except Exception as e:
+            logger.error(
+                "Failed to reconnect subtensor connection %s: %s", connection.index, e
+            )
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await asyncio.gather(
+                *(self._verify(connection) for connection in self.connections),
+                return_exceptions=True,
+            )
+
+    async def warm_up(self, query: Callable[["AsyncSubtensor"], Awaitable]):
+        """Run `query` once on every healthy connection.
+
+        This also seeds each node's latency estimate, so routing does not
+        have to explore nodes with user requests.
+        """
+
+        async def warm(node: SubtensorNode, connection: PooledConnection):
+            started = time.perf_counter()
+            await query(connection.subtensor)
+            node.observe_latency(time.perf_counter() - started)
+
+        results = await asyncio.gather(
+            *(
+                warm(node, connection)
+                for node in self.nodes
+                for connection in node.connections
+                if connection.healthy
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("Subtensor warm-up read failed: %s", result)
+
+    def _node_of(self, connection: PooledConnection) -> "SubtensorNode":
+        return next(node for node in self.nodes if connection in node.connections)
+
+    def node_stats(self) -> list[dict]:
+        return [node.stats() for node in self.nodes]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.connections),
+            "healthy": sum(connection.healthy for connection in self.connections),
+            "in_flight": sum(connection.in_flight for connection in self.connections),
+        }
+
+
+# Shared subtensor pool
+subtensor_pool: Optional[SubtensorPool] = None
+
+
+def create_subtensor_pool() -> SubtensorPool:
+    """Create the shared pool without connecting; see SubtensorPool.start."""
+    global subtensor_pool
+    subtensor_pool = SubtensorPool()
+    return subtensor_pool
+
+
+async def init_subtensor_pool() -> SubtensorPool:
+    pool = create_subtensor_pool()
+    await pool.start()
+    return pool
+
+
+async def close_subtensor_pool():
+    global subtensor_pool
+    if subtensor_pool is not None:
+        await subtensor_pool.close()
+        subtensor_pool = None
+
+
+def get_subtensor_pool() -> Optional[SubtensorPool]:
+    return subtensor_pool
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from app.blocks import RoundScheduler, is_block_fresh
+from app.database import CACHE_TTL, CachedDividends, read_cached_entries
+from app.metrics import PREWARM_KEYS
+from app.models import TaoDividends
+
+logger = logging.getLogger(__name__)
+
+# Cache pre-warming configuration: requests are counted per key in a Redis
+# sorted set whose scores halve every PREWARM_HALF_LIFE seconds, and the
+# PREWARM_TOP_N most requested keys are re-read from the chain before their
+# cache entries go stale, at most PREWARM_BUDGET keys per round
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() in ("true", "1", "t")
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "200"))
+PREWARM_BUDGET = int(os.getenv("PREWARM_BUDGET", "200"))
+PREWARM_BATCH_SIZE = int(os.getenv("PREWARM_BATCH_SIZE", "100"))  # keys per read
+# Rounds follow new blocks, prepared up to PREWARM_LEAD seconds before the
+# next one is due; without block headers they run this often (seconds) and
+# refresh entries PREWARM_LEAD seconds before their TTL ends, so the
+# interval must be shorter than the lead
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "10"))
+PREWARM_LEAD = float(os.getenv("PREWARM_LEAD", "15"))
+PREWARM_HALF_LIFE = float(os.getenv("PREWARM_HALF_LIFE", "600"))
+# Fraction of requests counted; each counted one weighs 1 / rate
+PREWARM_SAMPLE_RATE = float(os.getenv("PREWARM_SAMPLE_RATE", "1"))
+PREWARM_FLUSH_INTERVAL = 5.0  # seconds between writes of local counts
+PREWARM_MAX_PENDING = 10000  # distinct keys counted locally between writes
+PREWARM_MAX_TRACKED = 10000  # keys kept in the sorted set
+PREWARM_MIN_SCORE = 0.5  # decayed below this, a key is forgotten
+
+POPULARITY_KEY = "dividends:popularity"
+PREWARM_ROUND_KEY = "dividends:prewarm:round:{}"
+PREWARM_DECAY_KEY = "dividends:prewarm:decayed"
+
+Pair = tuple[int, str]
+# Reads many pairs from the chain at once and caches them
+DividendsReader = Callable[[list[Pair]], Awaitable[list[Optional[TaoDividends]]]]
+
+
+def refresh_due(
+    entry: Optional[CachedDividends],
+    lead: float = PREWARM_LEAD,
+    at_block: Optional[int] = None,
+) -> bool:
+    """Whether a cache entry is stale or will be within `lead` seconds.
+
+    With block freshness, whether it is stale at `at_block` instead, by
+    default the current block.
+    """
+    if entry is None:
+        return True
+    fresh = is_block_fresh(entry.netuid, entry.block, at_block)
+    if fresh is not None:
+        return not fresh
+    age = datetime.utcnow() - entry.timestamp
+    return age >= timedelta(seconds=max(CACHE_TTL - lead, 0))
+
+
+class CachePrewarmer:
+    """Refresh the cache entries of the most requested keys ahead of misses.
+
+    `record` counts requests in memory; the counts are added to a shared
+    sorted set every few seconds with one pipelined ZINCRBY per key. Each
+    round (per block, or every PREWARM_INTERVAL without blocks) one worker
+    claims the round, takes the top keys, and re-reads those whose entries
+    are stale or about to be in batched multi-key chain reads. Block rounds
+    are claimed and their keys picked shortly before the block is due, so
+    the reads go out as soon as it arrives.
+    """
+
+    def __init__(
+        self,
+        redis,
+        read: DividendsReader,
+        top_n: int = PREWARM_TOP_N,
+        budget: int = PREWARM_BUDGET,
+        batch_size: int = PREWARM_BATCH_SIZE,
+        sample_rate: float = PREWARM_SAMPLE_RATE,
+    ):
+        self.top_n = top_n
+        self.budget = budget
+        self.batch_size = batch_size
+        self.sample_rate = sample_rate
+        self._redis = redis
+        self._read = read
+        self._pending: Counter[str] = Counter()
+        self._rounds = RoundScheduler(
+            self.refresh,
+            PREWARM_INTERVAL,
+            "Cache pre-warming",
+            prepare=self._prepare_block,
+            lead=PREWARM_LEAD,
+        )
+        self._tasks: list[asyncio.Task] = []
+
+    def record(self, netuid: int, hotkey: str):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        member = f"{netuid}:{hotkey}"
+        if member in self._pending or len(self._pending) < PREWARM_MAX_PENDING:
+            self._pending[member] += 1 / self.sample_rate
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, Counter()
+        pipe = self._redis.pipeline(transaction=False)
+        for member, count in pending.items():
+            pipe.zincrby(POPULARITY_KEY, count, member)
+        await pipe.execute()
+
+    async def start(self):
+        self._rounds.start()
+        self._tasks = [asyncio.create_task(self._flush_periodically())]
+
+    async def close(self):
+        await self._rounds.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.debug("Error writing popularity counts on close: %s", e)
+
+    async def on_block(self, block: int):
+        """Block tracker listener; the round itself runs in the background."""
+        await self._rounds.on_block(block)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(PREWARM_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning("Error writing popularity counts: %s", e)
+
+    async def refresh(self, round_id: str) -> int:
+        """Run a round unless another worker has; returns the keys refreshed."""
+        read = await self.prepare(round_id)
+        return await read() if read is not None else 0
+
+    async def _prepare_block(self, round_id: str) -> Optional[Callable]:
+        # Ahead of block n, the keys due are those that block makes stale
+        return await self.prepare(round_id, at_block=int(round_id.split(":")[1]))
+
+    async def prepare(
+        self, round_id: str, at_block: Optional[int] = None
+    ) -> Optional[Callable[[], Awaitable[int]]]:
+        """Claim a round and pick its keys; returns what reads them, or None
+        if another worker has the round."""
+        claimed = await self._redis.set(
+            PREWARM_ROUND_KEY.format(round_id),
+            1,
+            nx=True,
+            ex=max(int(PREWARM_INTERVAL * 2), 60),
+        )
+        if not claimed:
+            return None
+        await self._forget()
+
+        members = await self._redis.zrevrange(POPULARITY_KEY, 0, self.top_n - 1)
+        pairs = []
+        for member in members:
+            netuid, hotkey = member.split(":", 1)
+            pairs.append((int(netuid), hotkey))
+        entries = await read_cached_entries(pairs)
+        # Most popular first, so the budget goes to the keys read the most
+        due = [
+            pair
+            for pair, entry in zip(pairs, entries)
+            if refresh_due(entry, at_block=at_block)
+        ]
+        if len(due) > self.budget:
+            PREWARM_KEYS.labels(outcome="over_budget").inc(len(due) - self.budget)
+            due = due[: self.budget]
+        return lambda: self._read_due(due, len(pairs))
+
+    async def _read_due(self, due: list[Pair], popular: int) -> int:
+        batches = [
+            due[start : start + self.batch_size]
+            for start in range(0, len(due), self.batch_size)
+        ]
+        results = await asyncio.gather(
+            *(self._read(batch) for batch in batches), return_exceptions=True
+        )
+        refreshed = 0
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.warning(
+                    "Error pre-warming %s cache entries: %s", len(batch), result
+                )
+                PREWARM_KEYS.labels(outcome="failed").inc(len(batch))
+                continue
+            PREWARM_KEYS.labels(outcome="refreshed").inc(len(batch))
+            refreshed += len(batch)
+        if due:
+            logger.debug("Pre-warmed %s of %s popular keys", refreshed, popular)
+        return refreshed
+
+    async def _forget(self):
+        pipe = self._redis.pipeline(transaction=False)
+        # Halve every score once per half-life, by whichever worker is first
+        if await self._redis.set(
+            PREWARM_DECAY_KEY, 1, nx=True, ex=max(int(PREWARM_HALF_LIFE), 1)
+        ):
+            pipe.zunionstore(POPULARITY_KEY, {POPULARITY_KEY: 0.5})
+            pipe.zremrangebyscore(POPULARITY_KEY, "-inf", f"({PREWARM_MIN_SCORE}")
+        pipe.zremrangebyrank(POPULARITY_KEY, 0, -PREWARM_MAX_TRACKED - 1)
+        await pipe.execute()
+
+
+# Pre-warmer of this worker, None when disabled or without Redis
+prewarmer: Optional[CachePrewarmer] = None
+
+
+async def init_prewarmer(redis, read: DividendsReader) -> Optional[CachePrewarmer]:
+    global prewarmer
+    if PREWARM_ENABLED and redis is not None:
+        prewarmer = CachePrewarmer(redis, read)
+        await prewarmer.start()
+    return prewarmer
+
+
+async def close_prewarmer():
+    global prewarmer
+    if prewarmer is not None:
+        await prewarmer.close()
+        prewarmer = None
+
+
+def get_prewarmer() -> Optional[CachePrewarmer]:
+    return prewarmer
+
+
+def record_request(netuid: int, hotkey: str):
+    if prewarmer is not None:
+        prewarmer.record(netuid, hotkey)
@@ -0,0 +1,259 @@
+import hashlib
+import logging
+import math
+import os
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+# Rate limit configuration: token buckets refill at RATE requests per second
+# up to BURST. Trade requests also draw from a much smaller bucket since they
+# can end in on-chain stake operations.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in (
+    "true",
+    "1",
+    "t",
+)
+RATE_LIMIT_TOKEN_RATE = float(os.getenv("RATE_LIMIT_TOKEN_RATE", "10"))
+RATE_LIMIT_TOKEN_BURST = int(os.getenv("RATE_LIMIT_TOKEN_BURST", "20"))
+RATE_LIMIT_IP_RATE = float(os.getenv("RATE_LIMIT_IP_RATE", "20"))
+RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "40"))
+RATE_LIMIT_TRADE_RATE = float(os.getenv("RATE_LIMIT_TRADE_RATE", "0.1"))
+RATE_LIMIT_TRADE_BURST = int(os.getenv("RATE_LIMIT_TRADE_BURST", "2"))
+RATE_LIMIT_PATH_PREFIX = "/api/"
+# Clients Redis rejected are remembered locally until their retry time
+RATE_LIMIT_LOCAL_SIZE = 10000
+
+# Check and consume one token from every bucket in KEYS, all or nothing.
+# ARGV is the cost followed by a (rate, burst) pair per key. Returns
+# {allowed, index of the tightest bucket, its remaining tokens,
+#  milliseconds until a retry can succeed, milliseconds until it is full}.
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local tokens = {}
+local allowed = 1
+local retry_ms = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now_ms
+    level = math.min(burst, level + math.max(0, now_ms - ts) * rate / 1000)
+    tokens[i] = level
+    if level < cost then
+        allowed = 0
+        retry_ms = math.max(retry_ms, math.ceil((cost - level) * 1000 / rate))
+    end
+end
+local tightest = 1
+local tightest_level = nil
+local reset_ms = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local level = tokens[i]
+    if allowed == 1 then
+        level = level - cost
+    end
+    redis.call('HSET', key, 'tokens', level, 'ts', now_ms)
+    redis.call('PEXPIRE', key, math.ceil(burst * 1000 / rate) + 1000)
+    if tightest_level == nil or level < tightest_level then
+        tightest = i
+        tightest_level = level
+        reset_ms = math.ceil((burst - level) * 1000 / rate)
+    end
+end
+return {allowed, tightest, math.floor(tightest_level), retry_ms, reset_ms}
+"""
+
+
+class RateLimitResult:
+    def __init__(
+        self,
+        allowed: bool,
+        limit: int,
+        remaining: int,
+        retry_after: float,
+        reset: float,
+    ):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+        self.reset = reset
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(max(self.remaining, 0)),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class RateLimiter:
+    """Distributed token-bucket limiter, one Redis round trip per check.
+
+    Every bucket a request draws from is checked and charged by a single Lua
+    script so concurrent API instances cannot race each other. Buckets that
+    Redis has rejected are also remembered locally until their retry time, so
+    a client hammering an exhausted limit is turned away without a round trip.
+    """
+
+    def __init__(self, redis, local_size: int = RATE_LIMIT_LOCAL_SIZE):
+        self.redis = redis
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        # Bucket key -> (monotonic retry deadline, limit)
+        self._blocked = LocalCache(local_size, ttl=3600)
+        self.local_rejections = 0
+
+    def _check_local(self, buckets: list[tuple[str, float, int]]):
+        for key, rate, burst in buckets:
+            entry = self._blocked.get(key)
+            if entry is None:
+                continue
+            retry_after = entry[0] - time.monotonic()
+            if retry_after > 0:
+                self.local_rejections += 1
+                return RateLimitResult(False, burst, 0, retry_after, burst / rate)
+        return None
+
+    async def check(
+        self, buckets: list[tuple[str, float, int]], cost: int = 1
+    ) -> RateLimitResult:
+        """Charge `cost` against every (key, rate, burst) bucket or none."""
+        result = self._check_local(buckets)
+        if result is not None:
+            return result
+
+        args = [cost]
+        for _, rate, burst in buckets:
+            args.extend((rate, burst))
+        allowed, tightest, remaining, retry_ms, reset_ms = await self._script(
+            keys=[key for key, _, _ in buckets], args=args
+        )
+        key, _, burst = buckets[int(tightest) - 1]
+        result = RateLimitResult(
+            bool(allowed), burst, int(remaining), retry_ms / 1000, reset_ms / 1000
+        )
+        if not result.allowed:
+            self._blocked.set(
+                key, (time.monotonic() + result.retry_after, burst), result.retry_after
+            )
+        return result
+
+
+def _is_true(value: Optional[str]) -> bool:
+    return value is not None and value.lower() in ("true", "1", "on", "yes", "t")
+
+
+def _credential(headers: Headers) -> Optional[str]:
+    api_key = headers.get("x-api-key")
+    if api_key:
+        return api_key
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return None
+
+
+def request_buckets(scope: Scope) -> list[tuple[str, float, int]]:
+    """Token buckets a request draws from, as (key, rate, burst)."""
+    client = scope.get("client")
+    ip = client[0] if client else "unknown"
+    identities = [("ip", ip, RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST)]
+    credential = _credential(Headers(scope=scope))
+    if credential:
+        # Credentials are limited before they are verified; junk tokens still
+        # draw from the per-IP bucket
+        digest = hashlib.sha256(credential.encode()).hexdigest()[:32]
+        identities.insert(
+            0, ("token", digest, RATE_LIMIT_TOKEN_RATE, RATE_LIMIT_TOKEN_BURST)
+        )
+
+    buckets = [
+        (f"ratelimit:{kind}:{identity}", rate, burst)
+        for kind, identity, rate, burst in identities
+    ]
+    query = QueryParams(scope.get("query_string", b""))
+    if _is_true(query.get("trade")):
+        buckets.extend(
+            (
+                f"ratelimit:trade:{kind}:{identity}",
+                RATE_LIMIT_TRADE_RATE,
+                RATE_LIMIT_TRADE_BURST,
+            )
+            for kind, identity, _, _ in identities
+        )
+    return buckets
+
+
+class RateLimitMiddleware:
+    """ASGI middleware enforcing the shared rate limiter on API routes."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limiter = rate_limiter
+        if (
+            scope["type"] != "http"
+            or limiter is None
+            or not scope["path"].startswith(RATE_LIMIT_PATH_PREFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            result = await limiter.check(request_buckets(scope))
+        except Exception as e:
+            # Fail open: an unreachable Redis should not take the API down
+            logger.warning("Rate limit check failed: %s", e)
+            await self.app(scope, receive, send)
+            return
+
+        if not result.allowed:
+            response = JSONResponse(
+                {"detail": "Rate limit exceeded"},
+                status_code=429,
+                headers=result.headers(),
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for name, value in result.headers().items():
+                    headers.append(name, value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+# Shared rate limiter, None when disabled or before startup
+rate_limiter: Optional[RateLimiter] = None
+
+
+def init_rate_limiter(redis) -> Optional[RateLimiter]:
+    global rate_limiter
+    if RATE_LIMIT_ENABLED:
+        rate_limiter = RateLimiter(redis)
+    return rate_limiter
+
+
+def close_rate_limiter():
+    global rate_limiter
+    rate_limiter = None
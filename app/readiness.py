@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which steps not yet done are logged; they keep running, and
+# failed steps are retried every WARM_UP_RETRY_INTERVAL seconds, doubling up
+# to WARM_UP_RETRY_MAX, until they succeed
+WARM_UP_TIMEOUT = float(os.getenv("WARM_UP_TIMEOUT", "60"))
+WARM_UP_RETRY_INTERVAL = float(os.getenv("WARM_UP_RETRY_INTERVAL", "5"))
+WARM_UP_RETRY_MAX = float(os.getenv("WARM_UP_RETRY_MAX", "60"))
+
+WarmUpStep = Callable[[], Awaitable[None]]
+
+
+class WarmUp:
+    """Run named start-up steps concurrently and track when they are done.
+
+    Every step is required: the service is ready only once all of them have
+    succeeded. A failed step is retried in the background, so readiness
+    follows the backends coming up rather than the first attempt.
+    """
+
+    def __init__(
+        self,
+        timeout: float = WARM_UP_TIMEOUT,
+        retry_interval: float = WARM_UP_RETRY_INTERVAL,
+        retry_max: float = WARM_UP_RETRY_MAX,
+    ):
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.retry_max = retry_max
+        self.seconds: Optional[float] = None
+        self.steps: dict[str, dict] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._runner: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.steps) and not self.failing()
+
+    def failing(self) -> list[str]:
+        """Steps that have not succeeded yet, running or waiting to retry."""
+        return [name for name, step in self.steps.items() if step["status"] != "done"]
+
+    def start(self, steps: dict[str, WarmUpStep]):
+        self._runner = asyncio.create_task(self.run(steps))
+
+    async def run(self, steps: dict[str, WarmUpStep]):
+        started = time.perf_counter()
+        self.steps = {name: {"status": "running", "attempts": 0} for name in steps}
+        self._tasks = [
+            asyncio.create_task(self._run_step(name, step, started))
+            for name, step in steps.items()
+        ]
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=self.timeout)
+        failing = self.failing()
+        if failing:
+            logger.warning(
+                "Warm-up not ready after %ss, waiting for: %s",
+                self.timeout,
+                ", ".join(failing),
+            )
+
+    async def _run_step(self, name: str, step: WarmUpStep, started: float):
+        delay = self.retry_interval
+        while True:
+            self.steps[name]["attempts"] += 1
+            try:
+                await step()
+            except Exception as e:
+                logger.error(
+                    "Warm-up step %s failed, retrying in %ss: %s", name, delay, e
+                )
+                # Only the type: /readyz is public and messages may name hosts
+                self.steps[name].update(status="failed", error=type(e).__name__)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+                continue
+            break
+        self.steps[name] = {
+            "status": "done",
+            "attempts": self.steps[name]["attempts"],
+            "seconds": time.perf_counter() - started,
+        }
+        if self.ready:
+            self.seconds = time.perf_counter() - started
+            logger.info("Warm-up finished in %.2fs", self.seconds)
+
+    async def stop(self):
+        tasks = [task for task in [self._runner, *self._tasks] if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "seconds": self.seconds,
+            "failing": self.failing(),
+            "steps": self.steps,
+        }
+
+
+# Warm-up of the running app
+warm_up: Optional[WarmUp] = None
+
+
+def start_warm_up(steps: dict[str, WarmUpStep]) -> WarmUp:
+    global warm_up
+    warm_up = WarmUp()
+    warm_up.start(steps)
+    return warm_up
+
+
+async def stop_warm_up():
+    global warm_up
+    if warm_up is not None:
+        await warm_up.stop()
+        warm_up = None
+
+
+def get_warm_up() -> Optional[WarmUp]:
+    return warm_up
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Coroutine, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncRuntime:
+    """A long-lived event loop on a background thread for synchronous callers.
+
+    Celery executes tasks synchronously, so async task bodies are submitted
+    to this loop and the calling thread blocks on the result. Clients opened
+    by `on_start` live on the loop for the whole process, and any number of
+    threads can submit at once, so with a thread pool many I/O-bound tasks
+    share one loop and one set of connections.
+    """
+
+    def __init__(
+        self,
+        on_start: Optional[Callable[[], Awaitable[None]]] = None,
+        on_stop: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self._on_start = on_start
+        self._on_stop = on_stop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="async-runtime", daemon=True
+            )
+            thread.start()
+            if self._on_start is not None:
+                try:
+                    asyncio.run_coroutine_threadsafe(self._on_start(), loop).result()
+                except BaseException:
+                    loop.call_soon_threadsafe(loop.stop)
+                    thread.join()
+                    loop.close()
+                    raise
+            self._loop = loop
+            self._thread = thread
+            logger.info("Async runtime started")
+
+    def stop(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None:
+                return
+            if self._on_stop is not None:
+                try:
+                    asyncio.run_coroutine_threadsafe(self._on_stop(), loop).result()
+                except Exception as e:
+                    logger.error("Error stopping async runtime: %s", e)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            self._loop = None
+            self._thread = None
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> Future:
+        if self._loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Run `coro` on the runtime loop and wait for its result."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
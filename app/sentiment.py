@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+import httpx
+import orjson
+
+from app.database import cache_tweet_scores, get_tweet_scores
+from app.models import SubnetSentiment
+
+logger = logging.getLogger(__name__)
+
+# Tweet search (Datura) and LLM scoring (Chutes) configuration; the
+# pipeline is disabled, and sentiment neutral, without both API keys
+DATURA_API_KEY = os.getenv("DATURA_API_KEY", "")
+DATURA_API_URL = os.getenv("DATURA_API_URL", "https://apis.datura.ai/twitter")
+DATURA_TIMEOUT = float(os.getenv("DATURA_TIMEOUT", "30"))  # seconds per page
+CHUTES_API_KEY = os.getenv("CHUTES_API_KEY", "")
+CHUTES_API_URL = os.getenv(
+    "CHUTES_API_URL", "https://llm.chutes.ai/v1/chat/completions"
+)
+CHUTES_MODEL = os.getenv("CHUTES_MODEL", "unsloth/Llama-3.2-3B-Instruct")
+CHUTES_TIMEOUT = float(os.getenv("CHUTES_TIMEOUT", "60"))  # seconds per chunk
+SENTIMENT_QUERY = os.getenv("SENTIMENT_QUERY", "Bittensor netuid {netuid}")
+SENTIMENT_PAGE_SIZE = int(os.getenv("SENTIMENT_PAGE_SIZE", "100"))  # tweets
+SENTIMENT_MAX_PAGES = int(os.getenv("SENTIMENT_MAX_PAGES", "3"))
+# New tweets are sent to the LLM in chunks of at most this many tweets and
+# characters of tweet text, with at most SENTIMENT_CONCURRENCY in flight
+SENTIMENT_CHUNK_TWEETS = int(os.getenv("SENTIMENT_CHUNK_TWEETS", "20"))
+SENTIMENT_CHUNK_CHARS = int(os.getenv("SENTIMENT_CHUNK_CHARS", "6000"))
+SENTIMENT_CONCURRENCY = int(os.getenv("SENTIMENT_CONCURRENCY", "4"))
+TWEET_MAX_CHARS = 1000  # longer tweets are cut before scoring
+
+SCORING_PROMPT = (
+    "You rate the sentiment of tweets about a Bittensor subnet. Each line "
+    "of the user message is a tweet id, a colon and the tweet text. Reply "
+    "with only a JSON object mapping every tweet id to an integer score "
+    "from -100 (very negative) to 100 (very positive)."
+)
+
+Tweet = tuple[str, str]  # id and text
+
+
+def tweet_date(tweet: dict) -> Optional[str]:
+    """The day a Datura search result was posted, as YYYY-MM-DD."""
+    created_at = tweet.get("created_at")
+    if not created_at:
+        return None
+    for parse in (
+        lambda value: datetime.strptime(value, "%a %b %d %H:%M:%S %z %Y"),
+        lambda value: datetime.fromisoformat(value.replace("Z", "+00:00")),
+    ):
+        try:
+            return parse(created_at).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def chunk_tweets(
+    tweets: list[Tweet],
+    max_tweets: int = SENTIMENT_CHUNK_TWEETS,
+    max_chars: int = SENTIMENT_CHUNK_CHARS,
+) -> list[list[Tweet]]:
+    """Split tweets into chunks bounded in count and in text length."""
+    chunks: list[list[Tweet]] = []
+    chunk: list[Tweet] = []
+    chars = 0
+    for tweet_id, text in tweets:
+        text = " ".join(text.split())[:TWEET_MAX_CHARS]
+        if chunk and (len(chunk) >= max_tweets or chars + len(text) > max_chars):
+            chunks.append(chunk)
+            chunk, chars = [], 0
+        chunk.append((tweet_id, text))
+        chars += len(text)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def parse_scores(content: str, tweet_ids: list[str]) -> dict[str, float]:
+    """Scores for the given tweets from the LLM's reply, clamped to +/-100.
+
+    Tweets the reply leaves out or scores with something other than a
+    number are left out too, so they are scored again next time.
+    """
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if match is None:
+        return {}
+    try:
+        scores = orjson.loads(match.group())
+    except orjson.JSONDecodeError:
+        return {}
+    if not isinstance(scores, dict):
+        return {}
+    parsed = {}
+    for tweet_id in tweet_ids:
+        score = scores.get(tweet_id)
+        if isinstance(score, (int, float)) and not isinstance(score, bool):
+            parsed[tweet_id] = max(-100.0, min(100.0, float(score)))
+    return parsed
+
+
+class DaturaSearch:
+    """Datura's Twitter search, read newest first a page at a time.
+
+    The API has no cursor, so each further page asks for tweets up to the
+    day of the oldest one seen so far. Tweets seen on an earlier page are
+    dropped, and paging stops at the first page without new tweets.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        api_key: str = DATURA_API_KEY,
+        url: str = DATURA_API_URL,
+        page_size: int = SENTIMENT_PAGE_SIZE,
+        max_pages: int = SENTIMENT_MAX_PAGES,
+        timeout: float = DATURA_TIMEOUT,
+    ):
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._client = client
+        self._api_key = api_key
+        self._url = url
+        self._timeout = timeout
+
+    async def pages(self, query: str) -> AsyncIterator[list[Tweet]]:
+        seen: set[str] = set()
+        end_date = None
+        for page in range(self.max_pages):
+            try:
+                results = await self._search(query, end_date)
+            except httpx.HTTPError:
+                if page == 0:
+                    raise
+                logger.warning("Tweet search failed at page %s, stopping", page + 1)
+                return
+            tweets = []
+            for result in results:
+                tweet_id = str(result.get("id") or "")
+                if tweet_id and tweet_id not in seen and result.get("text"):
+                    seen.add(tweet_id)
+                    tweets.append((tweet_id, result["text"]))
+            if not tweets:
+                return
+            yield tweets
+            dates = [date for date in map(tweet_date, results) if date]
+            if len(results) < self.page_size or not dates:
+                return
+            end_date = min(dates)
+
+    async def _search(self, query: str, end_date: Optional[str]) -> list[dict]:
+        payload = {
+            "query": query,
+            "sort": "Latest",
+            "lang": "en",
+            "count": self.page_size,
+        }
+        if end_date is not None:
+            payload["end_date"] = end_date
+        response = await self._client.post(
+            self._url,
+            json=payload,
+            headers={"Authorization": self._api_key},
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        results = response.json()
+        return results if isinstance(results, list) else []
+
+
+class ChutesScorer:
+    """Score chunks of tweets with an LLM behind Chutes' chat completions."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        api_key: str = CHUTES_API_KEY,
+        url: str = CHUTES_API_URL,
+        model: str = CHUTES_MODEL,
+        timeout: float = CHUTES_TIMEOUT,
+    ):
+        self._client = client
+        self._api_key = api_key
+        self._url = url
+        self._model = model
+        self._timeout = timeout
+
+    async def score(self, tweets: list[Tweet]) -> dict[str, float]:
+        response = await self._client.post(
+            self._url,
+            json={
+                "model": self._model,
+                "messages": [
+                    {"role": "system", "content": SCORING_PROMPT},
+                    {
+                        "role": "user",
+                        "content": "\n".join(
+                            f"{tweet_id}: {text}" for tweet_id, text in tweets
+                        ),
+                    },
+                ],
+                "temperature": 0,
+                "stream": False,
+            },
+            headers={"Authorization": f"Bearer {self._api_key}"},
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"]
+        return parse_scores(content, [tweet_id for tweet_id, _ in tweets])
+
+
+class SentimentPipeline:
+    """Score a subnet from its tweets, sending only unscored ones to the LLM.
+
+    Search pages are read one after another while earlier tweets are being
+    scored. Each page's tweet ids are looked up in the per-tweet score
+    cache in one round trip, and only tweets without a stored score are
+    chunked and scored, at most `concurrency` chunks at a time. The subnet
+    score is the running mean of every scored tweet, cached or new.
+    """
+
+    def __init__(
+        self,
+        search: DaturaSearch,
+        scorer: ChutesScorer,
+        concurrency: int = SENTIMENT_CONCURRENCY,
+        chunk_tweets: int = SENTIMENT_CHUNK_TWEETS,
+        chunk_chars: int = SENTIMENT_CHUNK_CHARS,
+    ):
+        self.chunk_tweets = chunk_tweets
+        self.chunk_chars = chunk_chars
+        self._search = search
+        self._scorer = scorer
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(self, netuid: int) -> SubnetSentiment:
+        total = 0.0
+        count = 0
+        cached_count = 0
+        unscored: list[Tweet] = []
+        tasks: list[asyncio.Task] = []
+
+        def score_full_chunks(final: bool = False):
+            nonlocal unscored
+            chunks = chunk_tweets(unscored, self.chunk_tweets, self.chunk_chars)
+            if not final and chunks and len(chunks[-1]) < self.chunk_tweets:
+                # Keep filling the last chunk from the next page
+                unscored = chunks.pop()
+            else:
+                unscored = []
+            for chunk in chunks:
+                tasks.append(asyncio.create_task(self._score_chunk(netuid, chunk)))
+
+        try:
+            async for page in self._search.pages(SENTIMENT_QUERY.format(netuid=netuid)):
+                scores = await get_tweet_scores(
+                    netuid, [tweet_id for tweet_id, _ in page]
+                )
+                for tweet, score in zip(page, scores):
+                    if score is None:
+                        unscored.append(tweet)
+                    else:
+                        total += score
+                        count += 1
+                        cached_count += 1
+                score_full_chunks()
+            score_full_chunks(final=True)
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            # If the search failed, stop the LLM calls still in flight
+            for task in tasks:
+                task.cancel()
+
+        failed = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                failed += 1
+                continue
+            total += sum(result.values())
+            count += len(result)
+        logger.info(
+            "Scored %s tweets for netuid=%s (%s cached, %s of %s LLM calls failed)",
+            count,
+            netuid,
+            cached_count,
+            failed,
+            len(tasks),
+        )
+        return SubnetSentiment(
+            netuid=netuid,
+            sentiment_score=round(total / count, 2) if count else 0.0,
+            tweet_count=count,
+            timestamp=datetime.utcnow(),
+        )
+
+    async def _score_chunk(self, netuid: int, chunk: list[Tweet]) -> dict[str, float]:
+        async with self._semaphore:
+            try:
+                scores = await self._scorer.score(chunk)
+            except Exception as e:
+                # Left unscored, so they are sent again on the next analysis
+                logger.warning("Scoring %s tweets failed: %r", len(chunk), e)
+                raise
+        if scores:
+            await cache_tweet_scores(netuid, scores)
+        return scores
+
+
+# Shared HTTP client and pipeline of this worker process
+http_client: Optional[httpx.AsyncClient] = None
+sentiment_pipeline: Optional[SentimentPipeline] = None
+
+
+def init_sentiment_pipeline() -> Optional[SentimentPipeline]:
+    global http_client, sentiment_pipeline
+    if not (DATURA_API_KEY and CHUTES_API_KEY):
+        logger.warning("DATURA_API_KEY or CHUTES_API_KEY unset, sentiment is neutral")
+        return None
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=SENTIMENT_CONCURRENCY * 2)
+    )
+    sentiment_pipeline = SentimentPipeline(
+        DaturaSearch(http_client), ChutesScorer(http_client)
+    )
+    return sentiment_pipeline
+
+
+async def close_sentiment_pipeline():
+    global http_client, sentiment_pipeline
+    sentiment_pipeline = None
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+def get_sentiment_pipeline() -> Optional[SentimentPipeline]:
+    return sentiment_pipeline
@@ -0,0 +1,342 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from app.pool import SUBTENSOR_NETWORK, SubtensorPool, connect_subtensor
+
+if TYPE_CHECKING:
+    from bittensor import AsyncSubtensor
+
+logger = logging.getLogger(__name__)
+
+# Stake extrinsic configuration; trading is off unless explicitly enabled
+STAKE_ENABLED = os.getenv("STAKE_ENABLED", "false").lower() in ("true", "1", "t")
+STAKE_WALLET_NAME = os.getenv("STAKE_WALLET_NAME", "default")
+STAKE_WALLET_PATH = os.getenv("STAKE_WALLET_PATH", "~/.bittensor/wallets")
+# Amount staked (or unstaked) per point of sentiment score
+STAKE_TAO_PER_POINT = float(os.getenv("STAKE_TAO_PER_POINT", "0.01"))
+# Decisions are collected for this long (roughly one block) before submitting
+STAKE_BATCH_WINDOW = float(os.getenv("STAKE_BATCH_WINDOW", "12"))  # seconds
+STAKE_WAIT_FOR_FINALIZATION = os.getenv(
+    "STAKE_WAIT_FOR_FINALIZATION", "false"
+).lower() in ("true", "1", "t")
+# Net amounts below the chain's minimum stake are dropped
+STAKE_MIN_RAO = int(os.getenv("STAKE_MIN_RAO", "500000"))
+STAKE_ERA_PERIOD = 64  # blocks a signed extrinsic stays valid
+NONCE_TTL = 300  # seconds the shared nonce counter outlives its last use
+
+# Hand out the next nonce for an account, never below the chain's own view.
+# KEYS[1] is the counter, ARGV is the chain's next index and the TTL.
+ALLOCATE_NONCE_SCRIPT = """
+local stored = tonumber(redis.call('GET', KEYS[1]) or '-1')
+local nonce = math.max(stored, tonumber(ARGV[1]))
+redis.call('SET', KEYS[1], nonce + 1, 'EX', ARGV[2])
+return nonce
+"""
+
+ResultRecorder = Callable[[list[str], dict], Awaitable[None]]
+
+
+class NonceManager:
+    """Allocate account nonces shared by every worker signing with one key.
+
+    With Redis the counter lives in one atomic script so separate processes
+    never hand out the same nonce; without it the counter is per process.
+    """
+
+    def __init__(self, redis=None, ttl: int = NONCE_TTL):
+        self.ttl = ttl
+        self._script = redis.register_script(ALLOCATE_NONCE_SCRIPT) if redis else None
+        self._redis = redis
+        self._next: dict[str, int] = {}
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, address: str, chain_nonce: int) -> int:
+        if self._script is not None:
+            return int(
+                await self._script(
+                    keys=[f"nonce:{address}"], args=[chain_nonce, self.ttl]
+                )
+            )
+        async with self._lock:
+            nonce = max(self._next.get(address, -1), chain_nonce)
+            self._next[address] = nonce + 1
+            return nonce
+
+    async def reset(self, address: str):
+        """Forget the counter so the next allocation resyncs with the chain."""
+        if self._redis is not None:
+            await self._redis.delete(f"nonce:{address}")
+        self._next.pop(address, None)
+
+
+def net_decisions(
+    decisions: list[tuple[int, str, int, Optional[str]]],
+) -> dict[tuple[int, str], tuple[int, list[str]]]:
+    """Sum signed rao amounts per (netuid, hotkey), keeping decision ids."""
+    netted = defaultdict(lambda: (0, []))
+    for netuid, hotkey, amount_rao, decision_id in decisions:
+        total, ids = netted[(netuid, hotkey)]
+        netted[(netuid, hotkey)] = (
+            total + amount_rao,
+            ids + [decision_id] if decision_id else ids,
+        )
+    return dict(netted)
+
+
+def batch_item_outcomes(events: list, count: int) -> Optional[list[bool]]:
+    """Per-call success flags from a force_batch's Utility events."""
+    outcomes = []
+    for event in events:
+        event = event.get("event", event) if isinstance(event, dict) else event
+        if event.get("module_id") != "Utility":
+            continue
+        if event.get("event_id") == "ItemCompleted":
+            outcomes.append(True)
+        elif event.get("event_id") == "ItemFailed":
+            outcomes.append(False)
+    return outcomes if len(outcomes) == count else None
+
+
+class StakeSubmitter:
+    """Net stake/unstake decisions and submit them as one batch per window.
+
+    Decisions for the same (netuid, hotkey) cancel out before anything is
+    signed, and what is left goes out as a single `Utility.force_batch` so
+    one failing item does not revert the rest. Inclusion is awaited in a
+    background task per batch; the outcome of every item is passed to
+    `record` with the decision ids that produced it.
+
+    Batches are composed and signed on a pool connection, but submitted on
+    a dedicated one: waiting blocks for inclusion or finalization would
+    otherwise hold a pool slot and count as one slow call in the node's
+    latency and breaker stats.
+    """
+
+    def __init__(
+        self,
+        pool: SubtensorPool,
+        keypair,
+        nonces: NonceManager,
+        record: Optional[ResultRecorder] = None,
+        window: float = STAKE_BATCH_WINDOW,
+        wait_for_finalization: bool = STAKE_WAIT_FOR_FINALIZATION,
+        min_rao: int = STAKE_MIN_RAO,
+        network: str = SUBTENSOR_NETWORK,
+        factory: Optional[Callable[[], "AsyncSubtensor"]] = None,
+    ):
+        self.keypair = keypair
+        self.window = window
+        self.wait_for_finalization = wait_for_finalization
+        self.min_rao = min_rao
+        self._pool = pool
+        self._nonces = nonces
+        self._record = record
+        self._pending: list[tuple[int, str, int, Optional[str]]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._submissions: set[asyncio.Task] = set()
+        self._factory = factory or (lambda: connect_subtensor(network))
+        self._subtensor: Optional["AsyncSubtensor"] = None
+        self._connect_lock = asyncio.Lock()
+        self._submitting = 0
+        self._reconnect = False
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._submissions:
+            await asyncio.gather(*self._submissions, return_exceptions=True)
+        await self._disconnect()
+
+    def add(
+        self,
+        netuid: int,
+        hotkey: str,
+        amount_rao: int,
+        decision_id: Optional[str] = None,
+    ):
+        """Queue a decision: positive amounts stake, negative ones unstake."""
+        self._pending.append((netuid, hotkey, amount_rao, decision_id))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Failed to submit stake batch: %s", e)
+
+    async def flush(self) -> Optional[asyncio.Task]:
+        pending, self._pending = self._pending, []
+        if not pending:
+            return None
+
+        groups = []
+        netted_out = []
+        for (netuid, hotkey), (amount_rao, ids) in net_decisions(pending).items():
+            if abs(amount_rao) < self.min_rao:
+                netted_out.extend(ids)
+            else:
+                groups.append((netuid, hotkey, amount_rao, ids))
+        if netted_out:
+            await self._store(netted_out, {"extrinsic_status": "netted"})
+        if not groups:
+            return None
+
+        address = self.keypair.ss58_address
+        nonce = None
+        try:
+            async with self._pool.acquire(timed=False) as subtensor:
+                substrate = subtensor.substrate
+                calls = [
+                    await self._compose(substrate, netuid, hotkey, amount_rao)
+                    for netuid, hotkey, amount_rao, _ in groups
+                ]
+                if len(calls) == 1:
+                    call = calls[0]
+                else:
+                    call = await substrate.compose_call(
+                        "Utility", "force_batch", {"calls": calls}
+                    )
+                chain_nonce = (
+                    await substrate.rpc_request("account_nextIndex", [address])
+                )["result"]
+                nonce = await self._nonces.allocate(address, chain_nonce)
+                extrinsic = await substrate.create_signed_extrinsic(
+                    call=call,
+                    keypair=self.keypair,
+                    era={"period": STAKE_ERA_PERIOD},
+                    nonce=nonce,
+                )
+        except Exception as e:
+            if nonce is not None:
+                # Signing failed after the nonce was handed out; resync so
+                # later batches do not leave a gap the chain waits on
+                await self._nonces.reset(address)
+            await self._fail(groups, e)
+            return None
+
+        logger.info(
+            "Submitting stake batch of %s calls (%s decisions) with nonce %s",
+            len(calls),
+            len(pending),
+            nonce,
+        )
+        task = asyncio.create_task(self._submit(extrinsic, groups, address))
+        self._submissions.add(task)
+        task.add_done_callback(self._submissions.discard)
+        return task
+
+    async def _compose(self, substrate, netuid: int, hotkey: str, amount_rao: int):
+        if amount_rao > 0:
+            return await substrate.compose_call(
+                "SubtensorModule",
+                "add_stake",
+                {"hotkey": hotkey, "netuid": netuid, "amount_staked": amount_rao},
+            )
+        return await substrate.compose_call(
+            "SubtensorModule",
+            "remove_stake",
+            {"hotkey": hotkey, "netuid": netuid, "amount_unstaked": -amount_rao},
+        )
+
+    async def _connect(self) -> "AsyncSubtensor":
+        async with self._connect_lock:
+            # After a failure, reopen once no other submission is using it
+            if self._reconnect and not self._submitting:
+                await self._disconnect()
+            if self._subtensor is None:
+                subtensor = self._factory()
+                await subtensor.initialize()
+                self._subtensor = subtensor
+                self._reconnect = False
+            self._submitting += 1
+            return self._subtensor
+
+    async def _disconnect(self):
+        if self._subtensor is not None:
+            try:
+                await self._subtensor.close()
+            except Exception as e:
+                logger.debug("Error closing stake submission connection: %s", e)
+            self._subtensor = None
+
+    async def _submit(self, extrinsic, groups: list, address: str):
+        try:
+            subtensor = await self._connect()
+            try:
+                receipt = await subtensor.substrate.submit_extrinsic(
+                    extrinsic,
+                    wait_for_inclusion=True,
+                    wait_for_finalization=self.wait_for_finalization,
+                )
+                success = await receipt.is_success
+                error = None if success else await receipt.error_message
+                outcomes = None
+                if success and len(groups) > 1:
+                    outcomes = batch_item_outcomes(
+                        await receipt.triggered_events, len(groups)
+                    )
+            except Exception:
+                self._reconnect = True
+                raise
+            finally:
+                self._submitting -= 1
+        except Exception as e:
+            # Whether the nonce was used is unknown; resync with the chain
+            await self._nonces.reset(address)
+            await self._fail(groups, e)
+            return
+
+        status = "finalized" if self.wait_for_finalization else "included"
+        result = {
+            "extrinsic_hash": receipt.extrinsic_hash,
+            "block_hash": receipt.block_hash,
+        }
+        for (netuid, hotkey, amount_rao, ids), ok in zip(
+            groups, outcomes or [success] * len(groups)
+        ):
+            if not ok:
+                logger.error(
+                    "Stake of %s rao on netuid=%s, hotkey=%s failed: %s",
+                    amount_rao,
+                    netuid,
+                    hotkey,
+                    error,
+                )
+            await self._store(
+                ids,
+                {
+                    **result,
+                    "extrinsic_status": status if ok else "failed",
+                    "extrinsic_error": None
+                    if ok
+                    else str(error or "batch item failed"),
+                },
+            )
+
+    async def _fail(self, groups: list, error: Exception):
+        logger.error("Stake batch of %s calls failed: %s", len(groups), error)
+        ids = [decision_id for *_, group_ids in groups for decision_id in group_ids]
+        await self._store(
+            ids, {"extrinsic_status": "failed", "extrinsic_error": str(error)}
+        )
+
+    async def _store(self, decision_ids: list[str], fields: dict):
+        if self._record is None or not decision_ids:
+            return
+        try:
+            await self._record(decision_ids, fields)
+        except Exception as e:
+            logger.error("Failed to record stake results: %s", e)
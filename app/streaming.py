@@ -0,0 +1,509 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+import orjson
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from app.blocks import RoundScheduler
+from app.database import get_cached_dividends_many
+from app.metrics import STREAM_CONNECTIONS, STREAM_PAIRS, STREAM_ROUNDS, STREAM_UPDATES
+from app.models import DividendPair, TaoDividends
+
+logger = logging.getLogger(__name__)
+
+# Dividend stream configuration
+STREAM_MAX_PAIRS = int(os.getenv("STREAM_MAX_PAIRS", "100"))  # per connection
+STREAM_MAX_CONNECTIONS = int(os.getenv("STREAM_MAX_CONNECTIONS", "10000"))  # per worker
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))  # seconds
+# Without block headers, watched pairs are re-read this often (seconds)
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "12"))
+# A pair drops out of the shared watch list when no worker has renewed it
+# for this long (seconds), e.g. after the worker watching it died
+STREAM_WATCH_TTL = int(os.getenv("STREAM_WATCH_TTL", "60"))
+
+STREAM_CHANNEL = "dividends:stream"
+STREAM_WATCHED_KEY = "dividends:stream:watched"  # zset of pairs by expiry
+STREAM_LAST_KEY = "dividends:stream:last"  # hash of last published values
+STREAM_ROUND_KEY = "dividends:stream:round:{}"  # claimed by the reading worker
+
+Pair = tuple[int, str]
+# Reads many pairs from the chain at once; None where there is no entry
+DividendsReader = Callable[[list[Pair]], Awaitable[list[Optional[TaoDividends]]]]
+
+
+def parse_pairs(values: Iterable) -> list[Pair]:
+    """Validate a watch list given as "netuid:hotkey" strings or objects.
+
+    Raises ValueError for malformed items or an over-long list.
+    """
+    pairs = []
+    for value in values:
+        if isinstance(value, str):
+            netuid, _, hotkey = value.partition(":")
+            value = {"netuid": netuid, "hotkey": hotkey}
+        if not isinstance(value, dict):
+            raise ValueError(f"Invalid pair: {value!r}")
+        pair = DividendPair(**value)
+        pairs.append((pair.netuid, pair.hotkey))
+    pairs = list(dict.fromkeys(pairs))
+    if not pairs or len(pairs) > STREAM_MAX_PAIRS:
+        raise ValueError(f"Watch 1 to {STREAM_MAX_PAIRS} pairs")
+    return pairs
+
+
+def _member(pair: Pair) -> str:
+    return f"{pair[0]}:{pair[1]}"
+
+
+def _pair(member: str) -> Pair:
+    netuid, hotkey = member.split(":", 1)
+    return int(netuid), hotkey
+
+
+def _error(pair: Pair, detail: str) -> bytes:
+    return orjson.dumps({"netuid": pair[0], "hotkey": pair[1], "error": detail})
+
+
+class Subscription:
+    """One connection's watch list and its buffer of undelivered updates.
+
+    The buffer keeps only the newest update per pair, so it never holds more
+    entries than the watch list: a consumer that falls behind skips values
+    that were superseded before it got to them instead of queueing them.
+    """
+
+    __slots__ = ("pairs", "superseded", "_pending", "_wakeup", "_closed")
+
+    def __init__(self, pairs: list[Pair]):
+        self.pairs = pairs
+        self.superseded = 0
+        self._pending: dict[Pair, tuple[str, bytes]] = {}
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+    def push(self, pair: Pair, event: str, payload: bytes) -> bool:
+        """Queue an update; False if it replaced one not yet delivered."""
+        replaced = self._pending.pop(pair, None) is not None
+        if replaced:
+            self.superseded += 1
+        self._pending[pair] = (event, payload)
+        self._wakeup.set()
+        return not replaced
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+
+    async def next_batch(
+        self, timeout: Optional[float] = None
+    ) -> Optional[list[tuple[str, bytes]]]:
+        """Updates waiting for delivery; [] after `timeout`, None once closed."""
+        if not self._pending and not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._wakeup.clear()
+        if self._closed:
+            return None
+        batch = list(self._pending.values())
+        self._pending.clear()
+        return batch
+
+
+class DividendStream:
+    """Push dividend changes for watched pairs to stream subscribers.
+
+    Every worker keeps the subscriptions of its own connections. Once per
+    block, the watched pairs are read from the chain in one multi-key query
+    and only values that changed are pushed. With Redis, workers register
+    their pairs in a shared watch list and the first worker to claim the
+    block does the read for all of them, then publishes the changes; every
+    worker fans them out to its own subscribers from the pub/sub channel.
+    Without Redis each worker reads its own pairs.
+    """
+
+    def __init__(
+        self,
+        read: DividendsReader,
+        redis=None,
+        max_connections: int = STREAM_MAX_CONNECTIONS,
+    ):
+        self.max_connections = max_connections
+        self.connections = 0
+        self.reads = 0
+        self._read = read
+        self._redis = redis
+        self._subscribers: dict[Pair, set[Subscription]] = {}
+        self._latest: dict[Pair, bytes] = {}  # newest payload per watched pair
+        self._values: dict[Pair, float] = {}  # last read values, without Redis
+        self._snapshot_reads: dict[Pair, tuple[asyncio.Task, int]] = {}
+        self._batch: Optional[list[Pair]] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        self._rounds = RoundScheduler(
+            self._round, STREAM_POLL_INTERVAL, "Dividend stream"
+        )
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def full(self) -> bool:
+        return self.connections >= self.max_connections
+
+    async def start(self):
+        self._rounds.start()
+        if self._redis is not None:
+            self._tasks.append(asyncio.create_task(self._listen()))
+
+    async def close(self):
+        await self._rounds.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for subscription in {s for subs in self._subscribers.values() for s in subs}:
+            self.unsubscribe(subscription)
+
+    async def subscribe(self, pairs: list[Pair]) -> Subscription:
+        """Watch `pairs`; their current values are queued straight away."""
+        subscription = Subscription(pairs)
+        new_pairs = [pair for pair in pairs if pair not in self._subscribers]
+        for pair in pairs:
+            self._subscribers.setdefault(pair, set()).add(subscription)
+        self.connections += 1
+        STREAM_CONNECTIONS.inc()
+        STREAM_PAIRS.inc(len(new_pairs))
+        try:
+            if new_pairs and self._redis is not None:
+                await self._watch(new_pairs)
+            await self._snapshot(subscription)
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    async def _watch(self, pairs: list[Pair]):
+        # Join the shared watch list before the next block is read; if Redis
+        # is unreachable the next round registers them anyway
+        try:
+            await self._redis.zadd(
+                STREAM_WATCHED_KEY,
+                {_member(pair): time.time() + STREAM_WATCH_TTL for pair in pairs},
+            )
+        except Exception as e:
+            logger.warning("Error registering watched dividend pairs: %s", e)
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription._closed:
+            return
+        subscription.close()
+        self.connections -= 1
+        STREAM_CONNECTIONS.dec()
+        for pair in subscription.pairs:
+            subscribers = self._subscribers.get(pair)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                # Nobody here is told about this pair any more, so anything
+                # kept for it would go stale
+                del self._subscribers[pair]
+                self._latest.pop(pair, None)
+                self._values.pop(pair, None)
+                STREAM_PAIRS.dec()
+
+    async def _snapshot(self, subscription: Subscription):
+        errors = {}
+        missing = [pair for pair in subscription.pairs if pair not in self._latest]
+        if missing:
+            try:
+                cached = await get_cached_dividends_many(missing)
+            except Exception as e:
+                logger.warning("Error reading cached dividends for a stream: %s", e)
+                cached = [None] * len(missing)
+            found = dict(zip(missing, cached))
+            unread = [pair for pair in missing if found[pair] is None]
+            for pair, read in self._read_once(unread).items():
+                task, index = read
+                try:
+                    found[pair] = (await asyncio.shield(task))[index]
+                except Exception as e:
+                    logger.warning("Error reading dividends for a stream: %s", e)
+                    errors[pair] = "Error connecting to blockchain service"
+            filled = {}
+            for pair, dividends in found.items():
+                if dividends is None:
+                    errors.setdefault(pair, "No dividend data found")
+                elif pair in self._subscribers and pair not in self._latest:
+                    # Only fill gaps: an update published meanwhile, or
+                    # another snapshot's, is at least as new as this one
+                    self._latest[pair] = _payload(dividends)
+                    self._values[pair] = dividends.dividends
+                    filled[pair] = dividends
+            if filled and self._redis is not None:
+                await self._seed_last(filled)
+        for pair in subscription.pairs:
+            if pair in self._latest:
+                subscription.push(pair, "dividends", self._latest[pair])
+            else:
+                detail = errors.get(pair, "Error connecting to blockchain service")
+                subscription.push(pair, "error", _error(pair, detail))
+
+    async def _seed_last(self, filled: dict[Pair, TaoDividends]):
+        # Without this the next round would publish the values subscribers
+        # were just sent. HSETNX leaves values other rounds published alone.
+        pipe = self._redis.pipeline(transaction=False)
+        for pair, dividends in filled.items():
+            pipe.hsetnx(STREAM_LAST_KEY, _member(pair), repr(dividends.dividends))
+        try:
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Error recording streamed dividend values: %s", e)
+
+    def _read_once(self, pairs: list[Pair]) -> dict[Pair, tuple[asyncio.Task, int]]:
+        """Chain reads for `pairs`, shared with other snapshots.
+
+        Pairs another snapshot is already reading join that read. The rest
+        go into a batch that every snapshot taken in the same event loop
+        iteration adds to, read in one query when the loop next runs it.
+        Maps each pair to the task reading it and its index in the result.
+        """
+        for pair in pairs:
+            if pair in self._snapshot_reads:
+                continue
+            if self._batch is None:
+                batch = self._batch = []
+                task = asyncio.ensure_future(self._read_batch(batch))
+                task.add_done_callback(lambda done: self._forget_reads(batch, done))
+                self._batch_task = task
+            self._snapshot_reads[pair] = (self._batch_task, len(self._batch))
+            self._batch.append(pair)
+        return {pair: self._snapshot_reads[pair] for pair in pairs}
+
+    async def _read_batch(self, batch: list[Pair]) -> list[Optional[TaoDividends]]:
+        # Snapshots from here on start the next batch
+        self._batch = None
+        return await self._read_pairs(batch)
+
+    def _forget_reads(self, pairs: list[Pair], task: asyncio.Task):
+        for pair in pairs:
+            if self._snapshot_reads.get(pair, (None,))[0] is task:
+                del self._snapshot_reads[pair]
+        # Mark the exception as retrieved in case every subscriber went away
+        if not task.cancelled():
+            task.exception()
+
+    async def on_block(self, block: int):
+        """Block tracker listener; the read itself happens in the background."""
+        await self._rounds.on_block(block)
+
+    async def _round(self, round_id: str):
+        if self._subscribers:
+            await self.refresh(round_id)
+
+    async def refresh(self, round_id: str):
+        """Read the watched pairs once for this round and push what changed."""
+        if self._redis is None:
+            dividends = await self._read_pairs(list(self._subscribers))
+            changed = [
+                item
+                for item in dividends
+                if item is not None
+                and self._values.get((item.netuid, item.hotkey)) != item.dividends
+            ]
+            for item in changed:
+                self._values[(item.netuid, item.hotkey)] = item.dividends
+            self.dispatch(
+                ((item.netuid, item.hotkey), _payload(item)) for item in changed
+            )
+            return
+
+        now = time.time()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zadd(
+            STREAM_WATCHED_KEY,
+            {_member(pair): now + STREAM_WATCH_TTL for pair in self._subscribers},
+        )
+        pipe.set(STREAM_ROUND_KEY.format(round_id), 1, nx=True, ex=STREAM_WATCH_TTL)
+        pipe.zrangebyscore(STREAM_WATCHED_KEY, "-inf", now)
+        pipe.zrangebyscore(STREAM_WATCHED_KEY, now, "+inf")
+        _, claimed, expired, watched = await pipe.execute()
+        if not claimed:
+            STREAM_ROUNDS.labels(role="follower").inc()
+            return
+        STREAM_ROUNDS.labels(role="reader").inc()
+
+        dividends = await self._read_pairs([_pair(member) for member in watched])
+        previous = await self._redis.hmget(STREAM_LAST_KEY, watched) if watched else []
+        changed = {
+            member: item
+            for member, item, last in zip(watched, dividends, previous)
+            if item is not None and last != repr(item.dividends)
+        }
+        pipe = self._redis.pipeline(transaction=False)
+        if expired:
+            pipe.zrem(STREAM_WATCHED_KEY, *expired)
+            pipe.hdel(STREAM_LAST_KEY, *expired)
+        if changed:
+            pipe.hset(
+                STREAM_LAST_KEY,
+                mapping={
+                    member: repr(item.dividends) for member, item in changed.items()
+                },
+            )
+            # One message per round; the line prefix routes it without parsing
+            pipe.publish(
+                STREAM_CHANNEL,
+                "\n".join(
+                    f"{member} {_payload(item).decode()}"
+                    for member, item in changed.items()
+                ),
+            )
+        if expired or changed:
+            await pipe.execute()
+
+    async def _read_pairs(self, pairs: list[Pair]) -> list[Optional[TaoDividends]]:
+        if not pairs:
+            return []
+        self.reads += 1
+        return await self._read(pairs)
+
+    def dispatch(self, updates: Iterable[tuple[Pair, bytes]]):
+        """Queue each update for the local subscribers watching its pair."""
+        queued = superseded = 0
+        for pair, payload in updates:
+            subscribers = self._subscribers.get(pair)
+            if not subscribers:
+                continue
+            self._latest[pair] = payload
+            for subscription in subscribers:
+                if subscription.push(pair, "dividends", payload):
+                    queued += 1
+                else:
+                    superseded += 1
+        if queued:
+            STREAM_UPDATES.labels(outcome="queued").inc(queued)
+        if superseded:
+            STREAM_UPDATES.labels(outcome="superseded").inc(superseded)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(STREAM_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    updates = []
+                    for line in message["data"].split("\n"):
+                        member, _, payload = line.partition(" ")
+                        updates.append((_pair(member), payload.encode()))
+                    self.dispatch(updates)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Dividend stream listener failed: %s", e)
+            finally:
+                await pubsub.aclose()
+            # Updates may have been missed while disconnected
+            self._latest.clear()
+            await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "pairs": len(self._subscribers),
+            "reads": self.reads,
+        }
+
+
+def _payload(dividends: TaoDividends) -> bytes:
+    return orjson.dumps(dividends.dict(exclude={"stale", "trade_status"}))
+
+
+async def sse_events(
+    stream: DividendStream, subscription: Subscription
+) -> AsyncIterator[bytes]:
+    """Server-sent events for a subscription, with comment heartbeats."""
+    try:
+        while True:
+            batch = await subscription.next_batch(STREAM_HEARTBEAT)
+            if batch is None:
+                return
+            if not batch:
+                # Keeps proxies from timing out idle streams and notices
+                # clients that went away
+                yield b": ping\n\n"
+                continue
+            yield b"".join(
+                b"event: %s\ndata: %s\n\n" % (event.encode(), payload)
+                for event, payload in batch
+            )
+    finally:
+        stream.unsubscribe(subscription)
+
+
+async def serve_websocket(stream: DividendStream, websocket: WebSocket):
+    """Stream updates over an accepted websocket.
+
+    The client sends `{"pairs": [{"netuid": 1, "hotkey": "5..."}, ...]}` to
+    set (or replace) its watch list and receives
+    `{"event": "dividends" | "error", "data": {...}}` messages.
+    """
+    subscription: Optional[Subscription] = None
+    sender: Optional[asyncio.Task] = None
+
+    async def send_updates(subscription: Subscription):
+        while (batch := await subscription.next_batch()) is not None:
+            for event, payload in batch:
+                await websocket.send_text(
+                    '{"event":"%s","data":%s}' % (event, payload.decode())
+                )
+
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                request = orjson.loads(message)
+                pairs = parse_pairs(request["pairs"])
+            except Exception as e:
+                await websocket.send_text(
+                    orjson.dumps({"event": "error", "data": {"error": str(e)}}).decode()
+                )
+                continue
+            if sender is not None:
+                sender.cancel()
+                stream.unsubscribe(subscription)
+            subscription = await stream.subscribe(pairs)
+            sender = asyncio.create_task(send_updates(subscription))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if sender is not None:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+            stream.unsubscribe(subscription)
+
+
+# Dividend stream of this worker, None before startup
+dividend_stream: Optional[DividendStream] = None
+
+
+async def init_dividend_stream(read: DividendsReader, redis=None) -> DividendStream:
+    global dividend_stream
+    dividend_stream = DividendStream(read, redis)
+    await dividend_stream.start()
+    return dividend_stream
+
+
+async def close_dividend_stream():
+    global dividend_stream
+    if dividend_stream is not None:
+        await dividend_stream.close()
+        dividend_stream = None
+
+
+def get_dividend_stream() -> Optional[DividendStream]:
+    return dividend_stream
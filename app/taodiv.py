@@ -1,39 +1,251 @@
-from typing import Optional
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Optional, TypeVar
 
-from bittensor import AsyncSubtensor
-from bittensor.core.subtensor import ScaleObj
-from bittensor.utils.balance import Balance
+from app.metrics import CHAIN_QUERY_LATENCY, netuid_label, set_known_netuids, timed
+from app.pool import SUBTENSOR_NETWORK, SubtensorPool
+
+# bittensor takes about a second to import, so it is only imported once a
+# chain connection is made rather than with the API
+if TYPE_CHECKING:
+    from bittensor import AsyncSubtensor
+    from bittensor.utils.balance import Balance
+
+# Storage keys fetched per state_getKeysPaged round trip when scanning maps
+QUERY_MAP_PAGE_SIZE = int(os.getenv("QUERY_MAP_PAGE_SIZE", "500"))
+# Concurrent per-block queries in flight for one block range read
+BLOCK_QUERY_CONCURRENCY = int(os.getenv("BLOCK_QUERY_CONCURRENCY", "16"))
+# Account read by the warm-up query (the all-zero account, which has no entry)
+WARM_UP_HOTKEY = "5C4hrfjw9DjXZTzV3MwzrrAr9P1MJhSrvWGWqi1eSuyUpnhM"
+
+T = TypeVar("T")
+
+
+def _scale_value(obj):
+    from bittensor.core.subtensor import ScaleObj
+
+    return obj.value if isinstance(obj, ScaleObj) else obj
+
+
+def _from_rao(rao: int) -> "Balance":
+    from bittensor.utils.balance import Balance
+
+    return Balance.from_rao(rao)
+
+
+def _to_balance(result) -> Optional["Balance"]:
+    from bittensor.core.subtensor import ScaleObj
+
+    if (
+        result is not None
+        and isinstance(result, ScaleObj)
+        and isinstance(result.value, int)
+    ):
+        return _from_rao(result.value)
+    return None
+
+
+def _decode_hotkey(key) -> str:
+    from bittensor.core.chain_data.utils import decode_account_id
+
+    key = _scale_value(key)
+    return key if isinstance(key, str) else decode_account_id(key)
 
 
 class TaoDividendQuerier:
-    def __init__(self):
+    def __init__(self, pool: Optional[SubtensorPool] = None):
+        self._pool = pool
         self._connection = None
 
     async def _ensure_connection(self):
         if self._connection is None:
-            self._connection = AsyncSubtensor(network="test")
+            from bittensor import AsyncSubtensor
+
+            self._connection = AsyncSubtensor(network=SUBTENSOR_NETWORK)
         return self._connection
 
+    @asynccontextmanager
+    async def _borrow(self, timed: bool = True) -> AsyncIterator["AsyncSubtensor"]:
+        # Borrow from the shared pool when there is one, otherwise fall back
+        # to a private connection owned by this querier
+        if self._pool is not None:
+            async with self._pool.acquire(timed=timed) as subtensor:
+                yield subtensor
+        else:
+            yield await self._ensure_connection()
+
+    async def _read(self, query: Callable[["AsyncSubtensor"], Awaitable[T]]) -> T:
+        # Single reads may be hedged across the pool's nodes
+        if self._pool is not None:
+            return await self._pool.read(query)
+        return await query(await self._ensure_connection())
+
     async def get_tao_dividends_per_subnet(
-        self, netuid: int, hotkey: str
-    ) -> Optional[Balance]:
+        self,
+        netuid: int,
+        hotkey: str,
+        block: Optional[int] = None,
+        block_hash: Optional[str] = None,
+    ) -> Optional["Balance"]:
+
+        async def query(subtensor: "AsyncSubtensor"):
+            with timed(
+                CHAIN_QUERY_LATENCY,
+                method="get_tao_dividends_per_subnet",
+                netuid=netuid_label(netuid),
+            ):
+                return await subtensor.query_module(
+                    "SubtensorModule",
+                    "TaoDividendsPerSubnet",
+                    block=block,
+                    block_hash=block_hash,
+                    params=[netuid, hotkey],
+                )
+
         try:
-            self.subtensor = await self._ensure_connection()
-            result = await self.subtensor.query_module(
-                "SubtensorModule",
-                "TaoDividendsPerSubnet",
-                params=[netuid, hotkey],
-            )
-            if (
-                result is not None
-                and isinstance(result, ScaleObj)
-                and isinstance(result.value, int)
+            return _to_balance(await self._read(query))
+        except Exception as error:
+            raise Exception("Error querying TaoDividendsPerSubnet") from error
+
+    async def get_tao_dividends_at_blocks(
+        self,
+        netuid: int,
+        hotkey: str,
+        blocks: list[int],
+        concurrency: int = BLOCK_QUERY_CONCURRENCY,
+    ) -> list[Optional["Balance"]]:
+        """Read one key at many blocks, fanned out over a single connection."""
+        semaphore = asyncio.Semaphore(concurrency)
+        try:
+            async with self._borrow(timed=False) as subtensor:
+
+                async def query(block: int) -> Optional["Balance"]:
+                    async with semaphore:
+                        result = await subtensor.query_module(
+                            "SubtensorModule",
+                            "TaoDividendsPerSubnet",
+                            block=block,
+                            params=[netuid, hotkey],
+                        )
+                    return _to_balance(result)
+
+                return list(await asyncio.gather(*(query(block) for block in blocks)))
+        except Exception as error:
+            raise Exception("Error querying TaoDividendsPerSubnet") from error
+
+    async def get_finalized_block(self) -> int:
+        try:
+            async with self._borrow() as subtensor:
+                substrate = subtensor.substrate
+                return await substrate.get_block_number(
+                    await substrate.get_chain_finalised_head()
+                )
+        except Exception as error:
+            raise Exception("Error querying finalized head") from error
+
+    async def get_current_block(self) -> int:
+        try:
+            async with self._borrow() as subtensor:
+                return await subtensor.get_current_block()
+        except Exception as error:
+            raise Exception("Error querying chain head") from error
+
+    async def get_tao_dividends_multi(
+        self, pairs: list[tuple[int, str]]
+    ) -> list[Optional["Balance"]]:
+        """Read many (netuid, hotkey) entries in one state_queryStorageAt call."""
+        if not pairs:
+            return []
+
+        async def query(subtensor: "AsyncSubtensor"):
+            substrate = subtensor.substrate
+            storage_keys = [
+                await substrate.create_storage_key(
+                    "SubtensorModule",
+                    "TaoDividendsPerSubnet",
+                    [netuid, hotkey],
+                )
+                for netuid, hotkey in pairs
+            ]
+            with timed(
+                CHAIN_QUERY_LATENCY, method="get_tao_dividends_multi", netuid=""
             ):
-                return Balance.from_rao(result.value)
-            return None
+                return storage_keys, await substrate.query_multi(storage_keys)
+
+        try:
+            storage_keys, results = await self._read(query)
         except Exception as error:
             raise Exception("Error querying TaoDividendsPerSubnet") from error
 
+        values = {storage_key.to_hex(): value for storage_key, value in results}
+        balances = []
+        for storage_key in storage_keys:
+            value = _scale_value(values.get(storage_key.to_hex()))
+            balances.append(_from_rao(value) if isinstance(value, int) else None)
+        return balances
+
+    async def get_subnets(self) -> list[int]:
+        try:
+            async with self._borrow() as subtensor:
+                subnets = await subtensor.get_subnets()
+        except Exception as error:
+            raise Exception("Error querying subnets") from error
+        set_known_netuids(subnets)
+        return subnets
+
+    async def iter_tao_dividends(
+        self,
+        netuid: Optional[int] = None,
+        page_size: int = QUERY_MAP_PAGE_SIZE,
+    ) -> AsyncIterator[tuple[int, str, "Balance"]]:
+        """Scan TaoDividendsPerSubnet page by page.
+
+        With a netuid only that subnet's prefix is scanned, otherwise the
+        whole map is. Yields (netuid, hotkey, balance) without ever holding
+        more than one page in memory.
+        """
+        try:
+            async with self._borrow(timed=False) as subtensor:
+                result = await subtensor.substrate.query_map(
+                    "SubtensorModule",
+                    "TaoDividendsPerSubnet",
+                    params=[netuid] if netuid is not None else None,
+                    page_size=page_size,
+                )
+                async for key, value in result:
+                    if netuid is None:
+                        key_netuid, hotkey = _scale_value(key)
+                    else:
+                        key_netuid, hotkey = netuid, key
+                    yield (
+                        int(_scale_value(key_netuid)),
+                        _decode_hotkey(hotkey),
+                        _from_rao(_scale_value(value)),
+                    )
+        except Exception as error:
+            raise Exception("Error scanning TaoDividendsPerSubnet") from error
+
+    async def warm_up(self):
+        """Make one real read on every pooled connection.
+
+        The first storage read on a connection loads runtime metadata and
+        type registries, so the first user request no longer pays for it.
+        """
+        if self._pool is None:
+            return
+        # Also learns the subnets, so their metrics get per-netuid labels
+        await self.get_subnets()
+
+        async def query(subtensor: "AsyncSubtensor"):
+            await subtensor.query_module(
+                "SubtensorModule",
+                "TaoDividendsPerSubnet",
+                params=[0, WARM_UP_HOTKEY],
+            )
+
+        await self._pool.warm_up(query)
+
     async def close(self):
         if self._connection:
             await self._connection.close()
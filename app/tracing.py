@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth import user_from_headers
+from app.cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+# Profiling configuration: off unless enabled, and then only for the listed
+# users (any authenticated user when PROFILE_USERS is empty)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in (
+    "true",
+    "1",
+    "t",
+)
+PROFILE_USERS = {user for user in os.getenv("PROFILE_USERS", "").split(",") if user}
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # seconds
+PROFILE_MAX_SECONDS = 60
+PROFILE_STORE_SIZE = 100
+PROFILE_STORE_TTL = 600  # seconds a request profile can be fetched
+
+REQUEST_ID_HEADER = "X-Request-ID"
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id", default=None
+)
+timings_var: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar(
+    "timings", default=None
+)
+profile_var: contextvars.ContextVar[Optional[object]] = contextvars.ContextVar(
+    "profile", default=None
+)
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+@contextmanager
+def phase(name: str):
+    """Time the block as a phase of the current request, if there is one."""
+    timings = timings_var.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((name, time.perf_counter() - started))
+
+
+def detached_context() -> contextvars.Context:
+    """Context for work that outlives the request but keeps its request ID."""
+    context = contextvars.copy_context()
+    context.run(timings_var.set, None)
+    context.run(profile_var.set, None)
+    return context
+
+
+def server_timing(timings: list[tuple[str, float]], total: float) -> str:
+    durations: dict[str, float] = {}
+    for name, seconds in timings:
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()
+    )
+
+
+def install_log_request_ids():
+    """Give every log record a `request_id` attribute ("-" outside requests)."""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "adds_request_id", False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.request_id = request_id_var.get() or "-"
+        return record
+
+    record_factory.adds_request_id = True
+    logging.setLogRecordFactory(record_factory)
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+class SamplingProfiler:
+    """Sample the event loop thread's stack from a timer thread.
+
+    Stacks are counted in the folded format flame graph tools read
+    (`outer;inner;leaf count` per line). With a `token`, only samples taken
+    while the running task's context carries that token in `profile_var`
+    are kept, so one request can be profiled among many concurrent ones.
+    The timer thread needs the GIL to take a sample, so busy stretches are
+    sampled at most once per `sys.getswitchinterval()` (5ms by default).
+    """
+
+    def __init__(
+        self,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        interval: float = PROFILE_INTERVAL,
+        token: Optional[object] = None,
+    ):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._loop = loop or asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._token = token
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.folded()
+
+    def folded(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frame = sys._current_frames().get(self._thread_id)
+        if frame is None:
+            return
+        if self._token is not None:
+            task = asyncio.current_task(self._loop)
+            if task is None or task.get_context().get(profile_var) is not self._token:
+                return
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        self.samples += 1
+        self.stacks[";".join(reversed(names))] += 1
+
+
+async def profile_window(seconds: float) -> str:
+    """Profile everything the event loop does for `seconds`."""
+    profiler = SamplingProfiler().start()
+    try:
+        await asyncio.sleep(min(seconds, PROFILE_MAX_SECONDS))
+    finally:
+        folded = profiler.stop()
+    return folded
+
+
+def can_profile(username: str) -> bool:
+    return PROFILING_ENABLED and (not PROFILE_USERS or username in PROFILE_USERS)
+
+
+# Finished request profiles by request ID, as (username, folded stacks)
+request_profiles = LocalCache(PROFILE_STORE_SIZE, PROFILE_STORE_TTL)
+
+
+async def _profiling_user(headers: Headers) -> Optional[str]:
+    user = await user_from_headers(headers)
+    if user is None or not can_profile(user.username):
+        return None
+    return user.username
+
+
+class TimingMiddleware:
+    """ASGI middleware for request IDs, Server-Timing and request profiles.
+
+    Every request gets an ID (a sane incoming X-Request-ID is kept) that is
+    echoed back and attached to log records. Phases timed with `phase`
+    while handling the request are reported in a Server-Timing header. An
+    authorized user sending `X-Profile: true` also gets the request sampled;
+    the folded stacks can then be fetched from the URL in the X-Profile
+    response header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        request_id = headers.get(REQUEST_ID_HEADER, "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        timings: list[tuple[str, float]] = []
+        request_id_token = request_id_var.set(request_id)
+        timings_token = timings_var.set(timings)
+
+        profiler = None
+        profile_token = None
+        username = None
+        if PROFILING_ENABLED and headers.get("x-profile", "").lower() in (
+            "true",
+            "1",
+        ):
+            username = await _profiling_user(headers)
+        if username is not None:
+            marker = object()
+            profile_token = profile_var.set(marker)
+            profiler = SamplingProfiler(token=marker).start()
+
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                response_headers.append(REQUEST_ID_HEADER, request_id)
+                response_headers.append(
+                    "Server-Timing",
+                    server_timing(timings, time.perf_counter() - started),
+                )
+                if profiler is not None:
+                    response_headers.append("X-Profile", f"/debug/profile/{request_id}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if profiler is not None:
+                request_profiles.set(request_id, (username, profiler.stop()))
+                profile_var.reset(profile_token)
+            timings_var.reset(timings_token)
+            request_id_var.reset(request_id_token)
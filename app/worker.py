@@ -1,16 +1,65 @@
+import functools
+import logging
+import os
+import uuid
 from datetime import datetime
 from typing import Optional
 
-from celery import Celery
+from bittensor.utils.balance import Balance
+from bittensor_wallet import Wallet
+from celery import Celery, current_task
+from celery.concurrency import get_implementation
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.signals import (
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+
+from app.database import (
+    cache_sentiment,
+    close_db,
+    close_redis,
+    get_cached_sentiment,
+    init_db,
+    init_redis,
+    store_dividends,
+    store_sentiment,
+    update_sentiment_results,
+)
+from app.models import SentimentAnalysis, SubnetSentiment, TaoDividends
+from app.pool import close_subtensor_pool, get_subtensor_pool, init_subtensor_pool
+from app.runtime import AsyncRuntime
+from app.sentiment import (
+    close_sentiment_pipeline,
+    get_sentiment_pipeline,
+    init_sentiment_pipeline,
+)
+from app.singleflight import SingleFlight
+from app.stake import (
+    STAKE_ENABLED,
+    STAKE_TAO_PER_POINT,
+    STAKE_WALLET_NAME,
+    STAKE_WALLET_PATH,
+    NonceManager,
+    StakeSubmitter,
+)
+from app.taodiv import TaoDividendQuerier
+from app.tracing import install_log_request_ids, request_id_var
 
-from app.database import store_dividends, store_sentiment
-from app.models import SentimentAnalysis, TaoDividends
+logger = logging.getLogger(__name__)
 
 # Celery configuration
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+# Seconds a task may wait on the event loop before it is abandoned
+WORKER_TASK_TIMEOUT = float(os.getenv("WORKER_TASK_TIMEOUT", "300"))
+
 celery_app = Celery(
     "tao_dividends",
-    broker="redis://localhost:6379/0",
-    backend="redis://localhost:6379/0",
+    broker=CELERY_BROKER_URL,
+    backend=CELERY_RESULT_BACKEND,
 )
 
 celery_app.conf.update(
@@ -19,32 +68,164 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # The API passes its request ID along in the task headers
+    worker_log_format="[%(asctime)s: %(levelname)s/%(processName)s] "
+    "[%(request_id)s] %(message)s",
+    worker_task_log_format="[%(asctime)s: %(levelname)s/%(processName)s] "
+    "%(task_name)s[%(task_id)s] [%(request_id)s] %(message)s",
 )
+install_log_request_ids()
+
+
+# Batched stake submitter, only when trading is enabled
+stake_submitter: Optional[StakeSubmitter] = None
+
+
+async def start_clients():
+    global stake_submitter
+    await init_db()
+    redis = await init_redis()
+    pool = await init_subtensor_pool()
+    init_sentiment_pipeline()
+    if STAKE_ENABLED:
+        wallet = Wallet(name=STAKE_WALLET_NAME, path=STAKE_WALLET_PATH)
+        stake_submitter = StakeSubmitter(
+            pool,
+            wallet.coldkey,
+            NonceManager(redis),
+            record=update_sentiment_results,
+        )
+        await stake_submitter.start()
+
+
+async def stop_clients():
+    global stake_submitter
+    if stake_submitter is not None:
+        await stake_submitter.close()
+        stake_submitter = None
+    await close_sentiment_pipeline()
+    await close_subtensor_pool()
+    await close_redis()
+    await close_db()
+
+
+# One event loop and one set of clients per worker process
+runtime = AsyncRuntime(on_start=start_clients, on_stop=stop_clients)
+
+
+@worker_process_init.connect
+def start_runtime_in_child(**kwargs):
+    runtime.start()
+
+
+@worker_process_shutdown.connect
+def stop_runtime_in_child(**kwargs):
+    runtime.stop()
+
+
+@worker_init.connect
+def start_runtime_in_worker(sender=None, **kwargs):
+    # Thread and solo pools run tasks in the main process; prefork children
+    # start their own runtime after the fork instead
+    if get_implementation(sender.pool_cls) is not PreforkPool:
+        runtime.start()
+
 
+@worker_shutdown.connect
+def stop_runtime_in_worker(**kwargs):
+    runtime.stop()
+
+
+async def with_request_id(request_id: Optional[str], coro):
+    request_id_var.set(request_id)
+    return await coro
+
+
+def async_task(*args, **kwargs):
+    """Register a coroutine function as a Celery task run on the runtime loop."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def run(*task_args, **task_kwargs):
+            request_id = getattr(current_task.request, "request_id", None)
+            return runtime.run(
+                with_request_id(request_id, fn(*task_args, **task_kwargs)),
+                WORKER_TASK_TIMEOUT,
+            )
+
+        return celery_app.task(*args, **kwargs)(run)
+
+    return decorator
+
+
+@async_task()
+async def query_blockchain(netuid: int, hotkey: str) -> Optional[dict]:
+    querier = TaoDividendQuerier(get_subtensor_pool())
+    try:
+        balance = await querier.get_tao_dividends_per_subnet(netuid, hotkey)
+    finally:
+        await querier.close()
+    if balance is None:
+        return None
 
-@celery_app.task
-async def query_blockchain(netuid: int, hotkey: str) -> TaoDividends:
-    # TODO: Implement blockchain query logic
-    # This is a placeholder implementation
     dividends = TaoDividends(
-        netuid=netuid, hotkey=hotkey, dividends=0.0, timestamp=datetime.utcnow()
+        netuid=netuid,
+        hotkey=hotkey,
+        dividends=float(balance),
+        timestamp=datetime.utcnow(),
     )
     await store_dividends(dividends)
-    return dividends
+    return dividends.dict()
+
+
+# Concurrent analyses of the same subnet in this process share one pipeline run
+sentiment_flights = SingleFlight()
+
 
+async def analyze_subnet_sentiment(netuid: int) -> SubnetSentiment:
+    cached = await get_cached_sentiment(netuid)
+    if cached is not None:
+        logger.debug("Reusing sentiment score for netuid=%s", netuid)
+        return cached
 
-@celery_app.task
-async def analyze_sentiment(netuid: int, hotkey: str) -> Optional[SentimentAnalysis]:
-    # TODO: Implement the following:
-    # 1. Query Datura.ai for relevant tweets
-    # 2. Use Chutes.ai for sentiment analysis
-    # 3. Calculate stake/unstake amount based on sentiment
+    pipeline = get_sentiment_pipeline()
+    if pipeline is None:
+        # No API keys configured: neutral, so nothing is staked
+        sentiment = SubnetSentiment(
+            netuid=netuid,
+            sentiment_score=0.0,
+            tweet_count=0,
+            timestamp=datetime.utcnow(),
+        )
+    else:
+        sentiment = await pipeline.analyze(netuid)
+    await cache_sentiment(sentiment)
+    return sentiment
+
+
+@async_task()
+async def analyze_sentiment(netuid: int, hotkey: str) -> Optional[dict]:
+    subnet = await sentiment_flights.do(
+        netuid, lambda: analyze_subnet_sentiment(netuid)
+    )
     sentiment = SentimentAnalysis(
         netuid=netuid,
         hotkey=hotkey,
-        sentiment_score=0.0,
-        tweet_count=0,
+        sentiment_score=subnet.sentiment_score,
+        tweet_count=subnet.tweet_count,
         timestamp=datetime.utcnow(),
     )
+    # Stake .01 TAO per point of positive sentiment, unstake for negative
+    amount = Balance.from_tao(STAKE_TAO_PER_POINT * abs(subnet.sentiment_score))
+    submitter = stake_submitter
+    if submitter is not None and amount.rao > 0:
+        sentiment.action_taken = "stake" if subnet.sentiment_score > 0 else "unstake"
+        sentiment.action_amount = float(amount)
+        sentiment.decision_id = uuid.uuid4().hex
+        sentiment.extrinsic_status = "pending"
+    # Store first so the submitter's result update finds the record
     await store_sentiment(sentiment)
-    return sentiment
+    if sentiment.decision_id:
+        signed_rao = amount.rao if sentiment.action_taken == "stake" else -amount.rao
+        submitter.add(netuid, hotkey, signed_rao, sentiment.decision_id)
+    return sentiment.dict()
@@ -0,0 +1,120 @@
+"""Per-request CPU of the dividends response paths, before and after.
+
+"before" is what the endpoint did up to now: parse the cached JSON into a
+TaoDividends, set `cached`, and let FastAPI validate it against the
+response model and serialize it again. "after" answers hits with the stored
+bytes and misses through ORJSONResponse. Both run through a real FastAPI
+app in-process, so routing and ASGI overhead are included. Run with:
+
+    python -m benchmarks.cache_hit_path --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, Response
+
+from app.database import CachedDividends
+from app.models import TaoDividends
+
+DIVIDENDS = TaoDividends(
+    netuid=18,
+    hotkey="5FFApaS75bv5pJHfAp2FVLBj9ZaXuFDjEypsaBNc1wCfe52v",
+    dividends=123.456789,
+    timestamp=datetime.utcnow(),
+    block=4_800_000,
+)
+RAW = DIVIDENDS.json()
+ENTRY = CachedDividends.from_raw(CachedDividends.from_dividends(DIVIDENDS).raw)
+
+app = FastAPI()
+
+
+@app.get("/before/hit", response_model=TaoDividends)
+async def before_hit():
+    dividends = TaoDividends.parse_raw(RAW)
+    dividends.cached = True
+    return dividends
+
+
+@app.get("/after/hit", response_model=TaoDividends)
+async def after_hit():
+    return Response(ENTRY.body(), media_type="application/json")
+
+
+@app.get("/before/miss", response_model=TaoDividends)
+async def before_miss():
+    return DIVIDENDS
+
+
+@app.get("/after/miss", response_model=TaoDividends)
+async def after_miss():
+    return ORJSONResponse(DIVIDENDS.dict())
+
+
+def conversion_cpu(requests: int) -> dict:
+    """CPU per response spent only on turning cached data into a body."""
+
+    def before():
+        dividends = TaoDividends.parse_raw(RAW)
+        dividends.cached = True
+        return json.dumps(dividends.dict(), default=str).encode()
+
+    def after():
+        return ENTRY.body()
+
+    results = {}
+    for name, fn in (("before", before), ("after", after)):
+        started = time.process_time()
+        for _ in range(requests):
+            fn()
+        results[name] = (time.process_time() - started) / requests * 1e6
+    return results
+
+
+async def endpoint_cpu(path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for _ in range(100):
+            await client.get(path)
+        started = time.process_time()
+        for _ in range(requests):
+            response = await client.get(path)
+        elapsed = time.process_time() - started
+    assert response.json()["dividends"] == DIVIDENDS.dividends
+    return elapsed / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args()
+
+    results = {"conversion_us": conversion_cpu(args.requests * 10)}
+    for kind in ("hit", "miss"):
+        results[f"{kind}_request_us"] = {
+            name: asyncio.run(endpoint_cpu(f"/{name}/{kind}", args.requests))
+            for name in ("before", "after")
+        }
+
+    if args.json:
+        print(json.dumps({"params": vars(args), "results": results}, indent=2))
+        return
+    for name, result in results.items():
+        saved = 1 - result["after"] / result["before"]
+        print(
+            f"{name:>16}: before {result['before']:8.1f}us  "
+            f"after {result['after']:8.1f}us  ({saved:.0%} less CPU)"
+        )
+
+
+if __name__ == "__main__":
+    main()
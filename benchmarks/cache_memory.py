@@ -0,0 +1,125 @@
+"""Redis memory used by the dividends cache in each layout.
+
+Writes the same entries once as `dividends:{netuid}:{hotkey}` JSON keys
+with a TTL (CACHE_LAYOUT=keys) and once as binary records in one hash per
+subnet (CACHE_LAYOUT=hash), measuring `used_memory` after each. The
+database given by --db is flushed before every run, so point it at a
+scratch Redis. Run with:
+
+    python -m benchmarks.cache_memory --redis-url redis://localhost:6379 --db 15
+"""
+
+import argparse
+import json
+import random
+import string
+from datetime import datetime
+
+import redis
+
+from app.cache_layout import encode_record, hash_key
+from app.database import CachedDividends
+from app.models import TaoDividends
+
+TTL = 720
+BATCH = 1000
+
+
+def make_entries(hotkeys: int, subnets: int) -> list[TaoDividends]:
+    rng = random.Random(0)
+    alphabet = string.ascii_letters + string.digits
+    return [
+        TaoDividends(
+            netuid=index % subnets + 1,
+            hotkey="5" + "".join(rng.choices(alphabet, k=47)),
+            dividends=rng.randrange(10**12) / 10**9,
+            timestamp=datetime.utcnow(),
+            block=4_800_000 + index,
+        )
+        for index in range(hotkeys)
+    ]
+
+
+def write_keys(client: redis.Redis, entries: list[TaoDividends]):
+    for start in range(0, len(entries), BATCH):
+        pipe = client.pipeline(transaction=False)
+        for dividends in entries[start : start + BATCH]:
+            pipe.set(
+                f"dividends:{dividends.netuid}:{dividends.hotkey}",
+                CachedDividends.from_dividends(dividends).raw,
+                ex=TTL,
+            )
+        pipe.execute()
+
+
+def write_hashes(client: redis.Redis, entries: list[TaoDividends]):
+    for start in range(0, len(entries), BATCH):
+        records = {}
+        for dividends in entries[start : start + BATCH]:
+            records.setdefault(hash_key(dividends.netuid), {})[dividends.hotkey] = (
+                encode_record(dividends)
+            )
+        pipe = client.pipeline(transaction=False)
+        for key, mapping in records.items():
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, TTL)
+        pipe.execute()
+
+
+def measure(client: redis.Redis, write, entries: list[TaoDividends]) -> dict:
+    client.flushdb()
+    before = client.info("memory")["used_memory"]
+    write(client, entries)
+    used = client.info("memory")["used_memory"] - before
+    sample = client.randomkey()
+    result = {
+        "keys": client.dbsize(),
+        "used_memory": used,
+        "bytes_per_entry": used / len(entries),
+        "encoding": client.object("encoding", sample).decode(),
+    }
+    client.flushdb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379")
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--hotkeys", type=int, default=10000)
+    parser.add_argument("--subnets", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.redis_url, db=args.db)
+    entries = make_entries(args.hotkeys, args.subnets)
+    results = {
+        "keys": measure(client, write_keys, entries),
+        "hash": measure(client, write_hashes, entries),
+    }
+    server = client.info("server")
+    params = {
+        **vars(args),
+        "redis_version": server["redis_version"],
+        "allocator": client.info("memory").get("mem_allocator"),
+    }
+
+    if args.json:
+        print(json.dumps({"params": params, "results": results}, indent=2))
+        return
+    print(
+        f"{args.hotkeys} hotkeys over {args.subnets} subnet(s), "
+        f"Redis {params['redis_version']} ({params['allocator']})"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:>5}: {result['used_memory'] / 1024:10.1f} KiB  "
+            f"{result['bytes_per_entry']:6.1f} B/entry  "
+            f"{result['keys']:6} keys  ({result['encoding']})"
+        )
+    saved = 1 - results["hash"]["used_memory"] / results["keys"]["used_memory"]
+    print(f"hash layout uses {saved:.0%} less memory")
+
+
+if __name__ == "__main__":
+    main()
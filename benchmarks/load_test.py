@@ -0,0 +1,240 @@
+"""Offline load test of GET /api/v1/tao_dividends.
+
+Runs the FastAPI app in-process with the chain, Redis and MongoDB replaced
+by the stand-ins in `benchmarks.standins`, so no service has to be up.
+A pool of concurrent clients sends a fixed number of requests; each one
+asks for a pre-warmed "hot" key with probability --hit-ratio and for a
+never-seen hotkey (a cache miss that reaches the fake chain) otherwise.
+The report, with throughput and latency percentiles, is written as JSON
+and can be compared against an earlier run:
+
+    python -m benchmarks.load_test --concurrency 1000 --output after.json \\
+        --baseline before.json
+
+Latencies include the in-process client, which shares the event loop with
+the app, so they are comparable between runs rather than absolute.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import string
+import subprocess
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+
+from app import auth, database, pool
+from app.main import app
+from app.pool import SubtensorPool
+from benchmarks.standins import FakeSubtensor, MemoryMongoClient, MemoryRedis
+
+HOTKEY_ALPHABET = string.ascii_letters + string.digits
+ENDPOINT = "/api/v1/tao_dividends"
+USERNAME = "loadtest"
+
+
+def make_hotkey(rng: random.Random) -> str:
+    return "5" + "".join(rng.choices(HOTKEY_ALPHABET, k=47))
+
+
+@asynccontextmanager
+async def offline_services(args):
+    """Point the app's module-level clients at in-memory stand-ins."""
+    subtensors = []
+
+    def factory(endpoint):
+        subtensor = FakeSubtensor(
+            args.chain_latency_ms / 1000,
+            args.chain_error_rate,
+            seed=args.seed + len(subtensors),
+        )
+        subtensors.append(subtensor)
+        return subtensor
+
+    database.mongo_client = MemoryMongoClient(args.mongo_latency_ms / 1000)
+    database.redis_client = MemoryRedis(args.redis_latency_ms / 1000)
+    database.raw_redis_client = database.redis_client.raw()
+    database.local_cache.clear()
+    mongo = database.mongo_client[database.DATABASE_NAME]
+    await mongo["users"].insert_one(
+        {"username": USERNAME, "hashed_password": "", "disabled": False}
+    )
+    await auth.init_user_store(mongo)
+    await database.start_history_writer()
+    pool.subtensor_pool = SubtensorPool(
+        size=args.pool_size, health_check_interval=0, factory=factory
+    )
+    await pool.subtensor_pool.start()
+    try:
+        yield subtensors
+    finally:
+        await pool.close_subtensor_pool()
+        await database.stop_history_writer()
+        auth.user_store = None
+        auth.token_cache.clear()
+        database.local_cache.clear()
+        database.redis_client = None
+        database.raw_redis_client = None
+        database.mongo_client = None
+
+
+def percentiles(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        latencies = latencies * 2 or [0.0, 0.0]
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": cuts[49],
+        "p95": cuts[94],
+        "p99": cuts[98],
+        "max": max(latencies),
+        "mean": statistics.fmean(latencies),
+    }
+
+
+async def run_load(args) -> dict:
+    rng = random.Random(args.seed)
+    hot_keys = [
+        (rng.randrange(args.subnets), make_hotkey(rng)) for _ in range(args.hot_keys)
+    ]
+    async with offline_services(args) as subtensors:
+        headers = {
+            "Authorization": "Bearer " + auth.create_access_token({"sub": USERNAME})
+        }
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://loadtest", headers=headers
+        ) as client:
+
+            async def request(netuid: int, hotkey: str):
+                started = time.perf_counter()
+                response = await client.get(
+                    ENDPOINT, params={"netuid": netuid, "hotkey": hotkey}
+                )
+                return response, time.perf_counter() - started
+
+            # Warm the hot set so those requests are cache hits
+            for netuid, hotkey in hot_keys:
+                await request(netuid, hotkey)
+            queries_before = sum(subtensor.queries for subtensor in subtensors)
+
+            latencies = []
+            statuses = Counter()
+            cache = Counter()
+            remaining = args.requests
+
+            async def worker():
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    if hot_keys and rng.random() < args.hit_ratio:
+                        netuid, hotkey = rng.choice(hot_keys)
+                    else:
+                        netuid, hotkey = rng.randrange(args.subnets), make_hotkey(rng)
+                    response, elapsed = await request(netuid, hotkey)
+                    latencies.append(elapsed * 1000)
+                    statuses[response.status_code] += 1
+                    cache[response.headers.get("x-cache", "none")] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+
+        return {
+            "requests": len(latencies),
+            "elapsed_s": elapsed,
+            "throughput_rps": len(latencies) / elapsed,
+            "latency_ms": percentiles(latencies),
+            "status_counts": {str(code): count for code, count in statuses.items()},
+            "x_cache": dict(cache),
+            "chain_queries": sum(subtensor.queries for subtensor in subtensors)
+            - queries_before,
+            "chain_errors": sum(subtensor.errors for subtensor in subtensors),
+            "redis_round_trips": database.redis_client.round_trips,
+        }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: dict, baseline: dict) -> list[str]:
+    lines = [f"compared with {baseline.get('commit', 'baseline')}:"]
+    metrics = [("throughput_rps", report["results"]["throughput_rps"])]
+    metrics += [
+        (f"latency_ms.{name}", value)
+        for name, value in report["results"]["latency_ms"].items()
+    ]
+    for name, value in metrics:
+        previous = baseline["results"]
+        for part in name.split("."):
+            previous = previous[part]
+        change = value / previous - 1 if previous else 0.0
+        lines.append(f"{name:>18}: {previous:10.2f} -> {value:10.2f} ({change:+.1%})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--hit-ratio", type=float, default=0.9)
+    parser.add_argument("--hot-keys", type=int, default=200)
+    parser.add_argument("--subnets", type=int, default=64)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--chain-latency-ms", type=float, default=50)
+    parser.add_argument("--chain-error-rate", type=float, default=0.0)
+    parser.add_argument("--redis-latency-ms", type=float, default=0.2)
+    parser.add_argument("--mongo-latency-ms", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_test.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show app logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("app").setLevel(logging.CRITICAL)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "params": {
+            name: value
+            for name, value in vars(args).items()
+            if name not in ("output", "baseline", "verbose")
+        },
+        "results": asyncio.run(run_load(args)),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    results = report["results"]
+    latency = results["latency_ms"]
+    print(
+        f"{results['requests']} requests at concurrency {args.concurrency}: "
+        f"{results['throughput_rps']:.0f} req/s, p50 {latency['p50']:.1f}ms, "
+        f"p95 {latency['p95']:.1f}ms, p99 {latency['p99']:.1f}ms"
+    )
+    print(f"statuses {results['status_counts']}, X-Cache {results['x_cache']}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            print("\n".join(compare(report, json.load(f))))
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
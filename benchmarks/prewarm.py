@@ -0,0 +1,189 @@
+"""Offline benchmark of cache pre-warming under skewed traffic.
+
+Runs GET /api/v1/tao_dividends in-process against the stand-ins, as
+`benchmarks.load_test` does, with a block tracker fed a new block every
+--block-interval seconds so cache entries go stale as they do in the
+default block cache mode. Clients pick keys from a Zipf distribution over
+--keys hotkeys and wait --think-ms between requests. The same traffic is
+replayed without and with the pre-warmer, and the report gives the share
+of fresh hits, stale hits and misses, chain queries and latency for each:
+
+    python -m benchmarks.prewarm --keys 5000 --top-n 1000 --budget 1000
+
+A stale hit is answered from the cache too, but with the previous block's
+value while a refresh runs in the background.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+
+from app import auth, blocks, database, prewarm
+from app.blocks import BlockTracker
+from app.main import app, read_dividends_many
+from app.prewarm import CachePrewarmer
+from benchmarks.load_test import (
+    ENDPOINT,
+    USERNAME,
+    git_commit,
+    make_hotkey,
+    offline_services,
+    percentiles,
+)
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    return [1 / rank**exponent for rank in range(1, count + 1)]
+
+
+async def run_traffic(args, keys: list, with_prewarm: bool) -> dict:
+    rng = random.Random(args.seed)
+    weights = zipf_weights(len(keys), args.zipf)
+    async with offline_services(args) as subtensors:
+        redis = database.redis_client
+        tracker = blocks.block_tracker = BlockTracker(mode="block")
+        prewarmer = None
+        if with_prewarm:
+            # Installed as the app's, so requests are counted by it
+            prewarmer = prewarm.prewarmer = CachePrewarmer(
+                redis,
+                read_dividends_many,
+                top_n=args.top_n,
+                budget=args.budget,
+                batch_size=args.batch_size,
+                sample_rate=args.sample_rate,
+            )
+            await prewarmer.start()
+            tracker.add_listener(prewarmer.on_block)
+        block = 4_800_000
+        await tracker.on_block(block)
+
+        headers = {
+            "Authorization": "Bearer " + auth.create_access_token({"sub": USERNAME})
+        }
+        transport = httpx.ASGITransport(app=app)
+        latencies = []
+        cache = Counter()
+        counting = False
+        running = True
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://prewarm", headers=headers
+        ) as client:
+
+            async def worker():
+                while running:
+                    netuid, hotkey = rng.choices(keys, weights)[0]
+                    started = time.perf_counter()
+                    response = await client.get(
+                        ENDPOINT, params={"netuid": netuid, "hotkey": hotkey}
+                    )
+                    if counting:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        cache[response.headers.get("x-cache", "none")] += 1
+                    await asyncio.sleep(args.think_ms / 1000)
+
+            workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+            try:
+                # Popularity is learnt while the cache fills, then measured
+                for count in range(args.warm_up_blocks + args.blocks):
+                    if count == args.warm_up_blocks:
+                        counting = True
+                        queries_before = sum(s.queries for s in subtensors)
+                    await asyncio.sleep(args.block_interval)
+                    block += 1
+                    # Fresh entries from before this point are now stale
+                    for subtensor in subtensors:
+                        subtensor.block = block
+                    await tracker.on_block(block)
+            finally:
+                running = False
+                await asyncio.gather(*workers)
+                if prewarmer is not None:
+                    await prewarmer.close()
+                    prewarm.prewarmer = None
+                blocks.block_tracker = None
+
+        requests = sum(cache.values())
+        return {
+            "requests": requests,
+            "x_cache": dict(cache),
+            "hit_ratio": cache["hit"] / requests if requests else 0.0,
+            "stale_ratio": cache["stale"] / requests if requests else 0.0,
+            "miss_ratio": cache["miss"] / requests if requests else 0.0,
+            "chain_queries": sum(s.queries for s in subtensors) - queries_before,
+            "latency_ms": percentiles(latencies),
+        }
+
+
+async def run_prewarm_benchmark(args) -> dict:
+    rng = random.Random(args.seed)
+    keys = [(rng.randrange(args.subnets), make_hotkey(rng)) for _ in range(args.keys)]
+    # Counts are written to Redis once per block instead of every few seconds
+    prewarm.PREWARM_FLUSH_INTERVAL = args.block_interval
+    return {
+        "without_prewarm": await run_traffic(args, keys, with_prewarm=False),
+        "with_prewarm": await run_traffic(args, keys, with_prewarm=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=5000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--subnets", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--think-ms", type=float, default=20)
+    parser.add_argument("--blocks", type=int, default=10)
+    parser.add_argument("--warm-up-blocks", type=int, default=3)
+    parser.add_argument("--block-interval", type=float, default=3.0, help="seconds")
+    parser.add_argument("--top-n", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--sample-rate", type=float, default=1.0)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--chain-latency-ms", type=float, default=50)
+    parser.add_argument("--chain-error-rate", type=float, default=0.0)
+    parser.add_argument("--redis-latency-ms", type=float, default=0.2)
+    parser.add_argument("--mongo-latency-ms", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="prewarm.json")
+    parser.add_argument("--verbose", action="store_true", help="show app logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("app").setLevel(logging.CRITICAL)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "params": {
+            name: value
+            for name, value in vars(args).items()
+            if name not in ("output", "verbose")
+        },
+        "results": asyncio.run(run_prewarm_benchmark(args)),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, results in report["results"].items():
+        latency = results["latency_ms"]
+        print(
+            f"{name}: {results['requests']} requests, "
+            f"hit {results['hit_ratio']:.1%}, stale {results['stale_ratio']:.1%}, "
+            f"miss {results['miss_ratio']:.1%}, "
+            f"{results['chain_queries']} chain queries, "
+            f"p50 {latency['p50']:.1f}ms, p99 {latency['p99']:.1f}ms"
+        )
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
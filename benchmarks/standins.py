@@ -0,0 +1,629 @@
+"""In-memory stand-ins for the chain, Redis and MongoDB used by load tests.
+
+They implement only the calls the API's request path makes, each with an
+optional simulated round-trip latency, so the app can be driven at high
+concurrency on a laptop or in CI without any service running. The Datura
+and Chutes stand-ins are small HTTP apps, reached through httpx's ASGI
+transport.
+"""
+
+import asyncio
+import fnmatch
+import random
+import time
+import zlib
+from typing import Optional
+
+import orjson
+from async_substrate_interface.types import ScaleObj
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+TWITTER_TIME = "%a %b %d %H:%M:%S %z %Y"  # created_at format of tweets
+
+
+async def _round_trip(latency: float, rng: Optional[random.Random] = None):
+    if latency > 0:
+        # +/-50% jitter so requests do not complete in lockstep
+        await asyncio.sleep(latency * (rng or random).uniform(0.5, 1.5))
+    else:
+        await asyncio.sleep(0)
+
+
+class FakeSubtensor:
+    """An AsyncSubtensor answering TaoDividendsPerSubnet from a formula.
+
+    Each query waits `latency` seconds (with jitter) and fails with
+    probability `error_rate`, like a slow or flaky RPC node. Hotkeys whose
+    checksum is divisible by `missing_every` have no entry.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        missing_every: int = 0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.missing_every = missing_every
+        self.queries = 0
+        self.errors = 0
+        self.block = 4_800_000
+        self.substrate = FakeSubstrate(self)
+        self._rng = random.Random(seed)
+
+    async def initialize(self):
+        await _round_trip(self.latency, self._rng)
+
+    async def close(self):
+        pass
+
+    async def _call(self):
+        self.queries += 1
+        await _round_trip(self.latency, self._rng)
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise ConnectionError("simulated RPC failure")
+
+    async def get_current_block(self) -> int:
+        await self._call()
+        return self.block
+
+    async def get_subnets(self) -> list[int]:
+        await self._call()
+        return list(range(64))
+
+    async def query_module(
+        self, module, name, block=None, block_hash=None, params=None
+    ):
+        await self._call()
+        return self.dividends(*params)
+
+    def dividends(self, netuid: int, hotkey: str) -> Optional[ScaleObj]:
+        checksum = zlib.crc32(f"{netuid}:{hotkey}".encode())
+        if self.missing_every and checksum % self.missing_every == 0:
+            return None
+        return ScaleObj(checksum * 1000)
+
+
+class FakeStorageKey:
+    def __init__(self, params: tuple):
+        self.params = params
+
+    def to_hex(self) -> str:
+        return ":".join(map(str, self.params))
+
+
+class FakeSubstrate:
+    """The multi-key storage calls of a FakeSubtensor, as one query each."""
+
+    def __init__(self, subtensor: FakeSubtensor):
+        self._subtensor = subtensor
+
+    async def create_storage_key(self, module, name, params) -> FakeStorageKey:
+        return FakeStorageKey(tuple(params))
+
+    async def query_multi(self, storage_keys: list[FakeStorageKey]) -> list:
+        await self._subtensor._call()
+        return [(key, self._subtensor.dividends(*key.params)) for key in storage_keys]
+
+
+class MemoryPipeline:
+    def __init__(self, redis: "MemoryRedis"):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        if name not in MemoryRedis.COMMANDS:
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        commands, self._commands = self._commands, []
+        await self._redis.round_trip()
+        return [
+            self._redis.run(name, *args, **kwargs) for name, args, kwargs in commands
+        ]
+
+
+class MemoryRedis:
+    """The subset of redis.asyncio.Redis the cache and trade paths use.
+
+    Values are kept as bytes and decoded on the way out when
+    `decode_responses` is set; `raw()` returns a bytes view of the same
+    data, like a second client on one server. Every command, and every
+    pipeline as a whole, costs one simulated round trip. Published messages
+    reach the `pubsub()` subscribers of every client sharing the data.
+    """
+
+    COMMANDS = frozenset(
+        {
+            "get",
+            "mget",
+            "set",
+            "delete",
+            "exists",
+            "expire",
+            "ttl",
+            "rename",
+            "hset",
+            "hget",
+            "hmget",
+            "hgetall",
+            "hdel",
+            "hsetnx",
+            "zadd",
+            "zincrby",
+            "zrangebyscore",
+            "zrevrange",
+            "zrem",
+            "zremrangebyscore",
+            "zremrangebyrank",
+            "zunionstore",
+            "publish",
+        }
+    )
+
+    def __init__(self, latency: float = 0.0, decode_responses: bool = True, data=None):
+        self.latency = latency
+        self.decode_responses = decode_responses
+        self.round_trips = 0
+        self._data, self._expires, self._channels = (
+            data if data is not None else ({}, {}, {})
+        )
+
+    def raw(self) -> "MemoryRedis":
+        return MemoryRedis(
+            self.latency, False, (self._data, self._expires, self._channels)
+        )
+
+    def client(self) -> "MemoryRedis":
+        """Another client on the same data, e.g. for another worker."""
+        return MemoryRedis(
+            self.latency,
+            self.decode_responses,
+            (self._data, self._expires, self._channels),
+        )
+
+    async def round_trip(self):
+        self.round_trips += 1
+        await _round_trip(self.latency)
+
+    def run(self, name: str, *args, **kwargs):
+        return getattr(self, f"_{name}")(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name not in MemoryRedis.COMMANDS:
+            raise AttributeError(name)
+
+        async def command(*args, **kwargs):
+            await self.round_trip()
+            return self.run(name, *args, **kwargs)
+
+        return command
+
+    def pipeline(self, transaction: bool = True) -> MemoryPipeline:
+        return MemoryPipeline(self)
+
+    def pubsub(self) -> "MemoryPubSub":
+        return MemoryPubSub(self)
+
+    async def hscan_iter(self, name, match=None, count=None):
+        await self.round_trip()
+        for key, value in list((self._live(name) or {}).items()):
+            yield self._decode(key), self._decode(value)
+
+    async def scan_iter(self, match=None, count=None):
+        await self.round_trip()
+        for key in list(self._data):
+            if self._live(key) is not None and (
+                match is None or fnmatch.fnmatchcase(key, match)
+            ):
+                yield key
+
+    async def aclose(self):
+        pass
+
+    def _encode(self, value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def _decode(self, value):
+        if value is None or not self.decode_responses:
+            return value
+        return value.decode()
+
+    def _live(self, key: str):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    def _expire_in(self, key: str, seconds: Optional[float]):
+        if seconds is None:
+            self._expires.pop(key, None)
+        else:
+            self._expires[key] = time.monotonic() + seconds
+
+    def _get(self, name):
+        return self._decode(self._live(name))
+
+    def _mget(self, keys):
+        return [self._decode(self._live(key)) for key in keys]
+
+    def _set(self, name, value, ex=None, px=None, nx=False, get=False):
+        previous = self._live(name)
+        written = not (nx and previous is not None)
+        if written:
+            self._data[name] = self._encode(value)
+            self._expire_in(name, ex if ex is not None else px and px / 1000)
+        if get:
+            return self._decode(previous)
+        return True if written else None
+
+    def _delete(self, *names):
+        removed = 0
+        for name in names:
+            removed += self._live(name) is not None
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        return removed
+
+    def _exists(self, *names):
+        return sum(self._live(name) is not None for name in names)
+
+    def _expire(self, name, seconds):
+        if self._live(name) is None:
+            return False
+        self._expire_in(name, seconds)
+        return True
+
+    def _ttl(self, name):
+        if self._live(name) is None:
+            return -2
+        deadline = self._expires.get(name)
+        return -1 if deadline is None else int(deadline - time.monotonic())
+
+    def _rename(self, src, dst):
+        self._data[dst] = self._data.pop(src)
+        self._expires.pop(dst, None)
+        if src in self._expires:
+            self._expires[dst] = self._expires.pop(src)
+        return True
+
+    def _hset(self, name, key=None, value=None, mapping=None):
+        fields = self._live(name)
+        if fields is None:
+            fields = self._data[name] = {}
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        items = {self._encode(key): self._encode(value) for key, value in items.items()}
+        added = sum(key not in fields for key in items)
+        fields.update(items)
+        return added
+
+    def _hget(self, name, key):
+        return self._decode((self._live(name) or {}).get(self._encode(key)))
+
+    def _hmget(self, name, keys, *args):
+        fields = self._live(name) or {}
+        return [self._decode(fields.get(self._encode(key))) for key in [*keys, *args]]
+
+    def _hgetall(self, name):
+        fields = self._live(name) or {}
+        return {self._decode(key): self._decode(value) for key, value in fields.items()}
+
+    def _hdel(self, name, *keys):
+        fields = self._live(name) or {}
+        return sum(fields.pop(self._encode(key), None) is not None for key in keys)
+
+    def _hsetnx(self, name, key, value):
+        fields = self._live(name)
+        if fields is None:
+            fields = self._data[name] = {}
+        if self._encode(key) in fields:
+            return 0
+        fields[self._encode(key)] = self._encode(value)
+        return 1
+
+    def _zadd(self, name, mapping):
+        scores = self._live(name)
+        if scores is None:
+            scores = self._data[name] = {}
+        members = {
+            self._encode(member): float(score) for member, score in mapping.items()
+        }
+        added = sum(member not in scores for member in members)
+        scores.update(members)
+        return added
+
+    def _zincrby(self, name, amount, value):
+        scores = self._live(name)
+        if scores is None:
+            scores = self._data[name] = {}
+        member = self._encode(value)
+        scores[member] = scores.get(member, 0.0) + float(amount)
+        return scores[member]
+
+    def _zrevrange(self, name, start, end, withscores=False):
+        ranked = sorted(
+            (self._live(name) or {}).items(), key=lambda item: item[1], reverse=True
+        )
+        ranked = ranked[start : None if end == -1 else end + 1]
+        if withscores:
+            return [(self._decode(member), score) for member, score in ranked]
+        return [self._decode(member) for member, _ in ranked]
+
+    def _zremrangebyscore(self, name, min, max):
+        scores = self._live(name) or {}
+        removed = [
+            member for member, score in scores.items() if _in_range(score, min, max)
+        ]
+        for member in removed:
+            del scores[member]
+        return len(removed)
+
+    def _zremrangebyrank(self, name, start, end):
+        scores = self._live(name) or {}
+        ranked = sorted(scores, key=scores.get)
+        removed = ranked[start : None if end == -1 else end + 1]
+        for member in removed:
+            del scores[member]
+        return len(removed)
+
+    def _zunionstore(self, dest, keys, aggregate=None):
+        weights = keys if isinstance(keys, dict) else dict.fromkeys(keys, 1)
+        union: dict[bytes, float] = {}
+        for key, weight in weights.items():
+            for member, score in (self._live(key) or {}).items():
+                union[member] = union.get(member, 0.0) + score * weight
+        self._data[dest] = union
+        self._expires.pop(dest, None)
+        return len(union)
+
+    def _zrangebyscore(self, name, min, max):
+        low, high = float(min), float(max)
+        scores = self._live(name) or {}
+        return [
+            self._decode(member)
+            for member, score in sorted(scores.items(), key=lambda item: item[1])
+            if low <= score <= high
+        ]
+
+    def _zrem(self, name, *members):
+        scores = self._live(name) or {}
+        return sum(
+            scores.pop(self._encode(member), None) is not None for member in members
+        )
+
+    def _publish(self, channel, message):
+        subscribers = self._channels.get(channel, ())
+        for subscriber in subscribers:
+            subscriber.deliver(channel, self._encode(message))
+        return len(subscribers)
+
+
+class MemoryPubSub:
+    def __init__(self, redis: MemoryRedis):
+        self._redis = redis
+        self._channels: set[str] = set()
+        self._messages: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        await self._redis.round_trip()
+        for channel in channels:
+            self._redis._channels.setdefault(channel, []).append(self)
+            self._channels.add(channel)
+            self._messages.put_nowait(
+                {"type": "subscribe", "channel": channel, "data": 1}
+            )
+
+    def deliver(self, channel: str, data: bytes):
+        self._messages.put_nowait(
+            {"type": "message", "channel": channel, "data": self._redis._decode(data)}
+        )
+
+    async def listen(self):
+        while True:
+            yield await self._messages.get()
+
+    async def aclose(self):
+        for channel in self._channels:
+            self._redis._channels[channel].remove(self)
+        self._channels.clear()
+
+
+def _in_range(score: float, min, max) -> bool:
+    """Redis score range test; a bound starting with "(" is exclusive."""
+
+    def bound(value) -> tuple[float, bool]:
+        if isinstance(value, str) and value.startswith("("):
+            return float(value[1:]), True
+        return float(value), False
+
+    low, low_exclusive = bound(min)
+    high, high_exclusive = bound(max)
+    if score < low or (low_exclusive and score == low):
+        return False
+    return not (score > high or (high_exclusive and score == high))
+
+
+def _matches(document: dict, query: dict) -> bool:
+    return all(document.get(key) == value for key, value in query.items())
+
+
+class MemoryCollection:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.documents: list[dict] = []
+
+    async def find_one(self, query: dict, projection=None) -> Optional[dict]:
+        await _round_trip(self.latency)
+        for document in self.documents:
+            if _matches(document, query):
+                return dict(document)
+        return None
+
+    async def insert_one(self, document: dict):
+        await _round_trip(self.latency)
+        self.documents.append(dict(document))
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True):
+        await _round_trip(self.latency)
+        self.documents.extend(dict(document) for document in documents)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        await _round_trip(self.latency)
+        for document in self.documents:
+            if _matches(document, query):
+                document.update(update.get("$set", {}))
+                return
+        if upsert:
+            self.documents.append({**query, **update.get("$set", {})})
+
+    async def update_many(self, query: dict, update: dict):
+        await _round_trip(self.latency)
+        for document in self.documents:
+            if _matches(document, query):
+                document.update(update.get("$set", {}))
+
+    async def create_index(self, keys, **kwargs):
+        pass
+
+
+class MemoryDatabase:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.collections: dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(self.latency)
+        return self.collections[name]
+
+    async def create_collection(self, name: str, **kwargs):
+        return self[name]
+
+
+class MemoryMongoClient:
+    """The subset of AsyncIOMotorClient the API touches, kept in memory."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.databases: dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self.databases:
+            self.databases[name] = MemoryDatabase(self.latency)
+        return self.databases[name]
+
+    def close(self):
+        pass
+
+
+class FakeDatura:
+    """Datura's Twitter search over a fixed list of tweets, newest first.
+
+    Serves `POST /twitter`, honouring `count` and an inclusive `end_date`.
+    Requests after the first `fail_after` answer 500.
+    """
+
+    def __init__(
+        self,
+        tweets: list[dict],
+        latency: float = 0.0,
+        fail_after: Optional[int] = None,
+    ):
+        self.tweets = sorted(
+            tweets,
+            key=lambda tweet: time.strptime(tweet["created_at"], TWITTER_TIME),
+            reverse=True,
+        )
+        self.latency = latency
+        self.fail_after = fail_after
+        self.requests: list[dict] = []
+        self.app = Starlette(routes=[Route("/twitter", self.search, methods=["POST"])])
+
+    async def search(self, request: Request) -> Response:
+        payload = await request.json()
+        self.requests.append(payload)
+        await _round_trip(self.latency)
+        if self.fail_after is not None and len(self.requests) > self.fail_after:
+            return JSONResponse({"detail": "unavailable"}, status_code=500)
+        tweets = self.tweets
+        if "end_date" in payload:
+            tweets = [
+                tweet
+                for tweet in tweets
+                if time.strftime(
+                    "%Y-%m-%d", time.strptime(tweet["created_at"], TWITTER_TIME)
+                )
+                <= payload["end_date"]
+            ]
+        return JSONResponse(tweets[: payload.get("count", 10)])
+
+
+class FakeChutes:
+    """Chutes' chat completions, scoring tweets by the words they contain.
+
+    Each tweet scores +50 per positive and -50 per negative word. Every
+    call is recorded with the tweet ids it carried, and the most calls
+    in flight at once is kept. Calls whose number is in `fail_calls` answer
+    503; ids in `skip_ids` are left out of the reply.
+    """
+
+    POSITIVE = {"bullish", "great", "love", "up"}
+    NEGATIVE = {"bearish", "scam", "down", "dump"}
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        fail_calls: set = frozenset(),
+        skip_ids: set = frozenset(),
+    ):
+        self.latency = latency
+        self.fail_calls = fail_calls
+        self.skip_ids = skip_ids
+        self.calls: list[list[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = Starlette(
+            routes=[Route("/v1/chat/completions", self.complete, methods=["POST"])]
+        )
+
+    async def complete(self, request: Request) -> Response:
+        payload = await request.json()
+        lines = payload["messages"][-1]["content"].splitlines()
+        tweets = dict(line.split(": ", 1) for line in lines)
+        self.calls.append(list(tweets))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await _round_trip(self.latency)
+        finally:
+            self.in_flight -= 1
+        if len(self.calls) in self.fail_calls:
+            return JSONResponse({"detail": "overloaded"}, status_code=503)
+        scores = {
+            tweet_id: self.score(text)
+            for tweet_id, text in tweets.items()
+            if tweet_id not in self.skip_ids
+        }
+        content = "Scores:\n" + orjson.dumps(scores).decode()
+        return JSONResponse({"choices": [{"message": {"content": content}}]})
+
+    def score(self, text: str) -> int:
+        words = text.lower().split()
+        positive = sum(word in self.POSITIVE for word in words)
+        negative = sum(word in self.NEGATIVE for word in words)
+        return max(-100, min(100, 50 * (positive - negative)))
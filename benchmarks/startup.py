@@ -0,0 +1,179 @@
+"""Cold-start benchmark of the API.
+
+Measures, in fresh interpreter processes:
+
+- how long `import app.main` takes, next to importing bittensor, which the
+  API now defers until the chain warm-up;
+- after spawning uvicorn, the time to the first answer from /healthz and
+  the time until /readyz reports the warm-up finished;
+- optionally (with --api-key), the latency of the first dividends request
+  once ready.
+
+The server runs with the current environment, so point REDIS_URL,
+MONGO_URL and SUBTENSOR_ENDPOINTS at the services to measure against:
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+
+from benchmarks.load_test import git_commit
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def import_seconds(module: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(
+    client: httpx.Client, path: str, started: float, timeout: float, ok=(200,)
+) -> tuple[Optional[float], Optional[httpx.Response]]:
+    """Poll `path` until it answers with an `ok` status; seconds since start."""
+    while time.perf_counter() - started < timeout:
+        try:
+            response = client.get(path)
+            if response.status_code in ok:
+                return time.perf_counter() - started, response
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    return None, None
+
+
+def cold_start(args) -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        stdout=None if args.verbose else subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    result = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            result["first_response_s"], _ = wait_for(
+                client, "/healthz", started, args.timeout
+            )
+            result["ready_s"], response = wait_for(
+                client, "/readyz", started, args.timeout
+            )
+            if response is not None:
+                result["warm_up"] = response.json().get("steps")
+            if args.api_key and result["ready_s"] is not None:
+                request_started = time.perf_counter()
+                response = client.get(
+                    "/api/v1/tao_dividends",
+                    params={"netuid": args.netuid, "hotkey": args.hotkey},
+                    headers={"X-API-Key": args.api_key},
+                    timeout=args.timeout,
+                )
+                result["first_request_s"] = time.perf_counter() - request_started
+                result["first_request_status"] = response.status_code
+    finally:
+        server.terminate()
+        server.wait(10)
+    return result
+
+
+def summarize(values: list[Optional[float]]) -> Optional[dict]:
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        "median": statistics.median(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--api-key", help="X-API-Key for a first dividends request")
+    parser.add_argument("--netuid", type=int, default=1)
+    parser.add_argument(
+        "--hotkey", default="5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx"
+    )
+    parser.add_argument("--output", default="startup.json")
+    parser.add_argument("--verbose", action="store_true", help="show server logs")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # Run the server from the repository root, wherever this is started
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    imports = {
+        module: summarize([import_seconds(module) for _ in range(args.runs)])
+        for module in ("app.main", "bittensor")
+    }
+    starts = [cold_start(args) for _ in range(args.runs)]
+    results = {
+        "import_s": imports,
+        "first_response_s": summarize([run["first_response_s"] for run in starts]),
+        "ready_s": summarize([run["ready_s"] for run in starts]),
+        "first_request_s": summarize([run.get("first_request_s") for run in starts]),
+        "runs": starts,
+    }
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "params": {"runs": args.runs, "api_key": bool(args.api_key)},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    def show(summary: Optional[dict]) -> str:
+        return "n/a" if summary is None else f"{summary['median']:.2f}s"
+
+    print(
+        f"import app.main {show(imports['app.main'])} "
+        f"(bittensor alone {show(imports['bittensor'])})"
+    )
+    print(
+        f"first response {show(results['first_response_s'])}, "
+        f"ready {show(results['ready_s'])}, "
+        f"first request {show(results['first_request_s'])}"
+    )
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Offline benchmark of the dividend stream fan-out.
+
+Several `DividendStream`s stand in for uvicorn workers and share one
+in-memory Redis, pub/sub included. Subscribers are spread across them:
+idle ones watch pairs whose value never changes, active ones watch pairs
+that change on every block, and a fraction of the active ones are slow
+consumers that take --slow-delay-ms over each batch. Blocks are fed to
+every worker as the block tracker would. The report gives the chain reads
+per block, the delay from a block to its updates reaching subscribers, the
+updates superseded in slow consumers' buffers and the memory held per
+subscription:
+
+    python -m benchmarks.stream_load --idle 10000 --active 2000 --workers 4
+
+With --no-redis every worker reads its own pairs, as it does without Redis.
+Delivery is measured at the subscription buffer, so SSE/websocket framing
+and the network are not included.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import orjson
+
+from app import database
+from app.models import TaoDividends
+from app.streaming import DividendStream
+from benchmarks.load_test import git_commit, make_hotkey, percentiles
+from benchmarks.standins import MemoryRedis, _round_trip
+
+
+class SimulatedChain:
+    """Multi-key reader whose active pairs change value on every block."""
+
+    def __init__(self, latency: float, active: set):
+        self.latency = latency
+        self.active = active
+        self.block = 0
+        self.reads = 0
+        self.pairs_read = 0
+
+    async def read(self, pairs):
+        self.reads += 1
+        self.pairs_read += len(pairs)
+        block = self.block
+        await _round_trip(self.latency)
+        return [
+            TaoDividends(
+                netuid=netuid,
+                hotkey=hotkey,
+                dividends=float(block) if (netuid, hotkey) in self.active else 1.0,
+                timestamp=datetime.utcnow(),
+                block=block,
+            )
+            for netuid, hotkey in pairs
+        ]
+
+
+async def consume(subscription, delay: float, block_times: dict, latencies: list):
+    while (batch := await subscription.next_batch()) is not None:
+        received = time.perf_counter()
+        for event, payload in batch:
+            block = orjson.loads(payload).get("block")
+            if block in block_times:
+                latencies.append(received - block_times[block])
+        if delay:
+            await asyncio.sleep(delay)
+
+
+async def run_stream_load(args) -> dict:
+    rng = random.Random(args.seed)
+    idle_pairs = [(rng.randrange(64), make_hotkey(rng)) for _ in range(args.idle_pairs)]
+    active_pairs = [
+        (rng.randrange(64), make_hotkey(rng)) for _ in range(args.active_pairs)
+    ]
+    chain = SimulatedChain(args.chain_latency_ms / 1000, set(active_pairs))
+    redis = None if args.no_redis else MemoryRedis(args.redis_latency_ms / 1000)
+    streams = [
+        DividendStream(chain.read, redis and redis.client(), max_connections=10**9)
+        for _ in range(args.workers)
+    ]
+    # Snapshots fall through the (absent) cache to the simulated chain
+    database.redis_client = None
+    database.local_cache.clear()
+    for stream in streams:
+        await stream.start()
+
+    block_times: dict[int, float] = {}
+    latencies: list[float] = []
+    consumers = []
+    try:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        # Connections arrive together, as after a deploy or reconnect storm
+        watch_lists = [
+            rng.sample(active_pairs if index >= args.idle else idle_pairs, args.pairs)
+            for index in range(args.idle + args.active)
+        ]
+        subscriptions = await asyncio.gather(
+            *(
+                streams[index % args.workers].subscribe(pairs)
+                for index, pairs in enumerate(watch_lists)
+            )
+        )
+        subscribe_seconds = time.perf_counter() - started
+        for subscription in subscriptions:
+            # Drain the snapshots so the buffers hold only steady state
+            await subscription.next_batch(0)
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        snapshot_reads = chain.reads
+
+        slow = set(
+            rng.sample(range(args.active), int(args.active * args.slow_fraction))
+        )
+        for index, subscription in enumerate(subscriptions):
+            delay = args.slow_delay_ms / 1000 if index - args.idle in slow else 0
+            consumers.append(
+                asyncio.create_task(
+                    consume(subscription, delay, block_times, latencies)
+                )
+            )
+
+        for block in range(1, args.blocks + 1):
+            chain.block = block
+            block_times[block] = time.perf_counter()
+            for stream in streams:
+                await stream.on_block(block)
+            await asyncio.sleep(args.block_interval)
+    finally:
+        for stream in streams:
+            await stream.close()
+        await asyncio.gather(*consumers, return_exceptions=True)
+
+    subscribers = len(subscriptions)
+    block_reads = chain.reads - snapshot_reads
+    return {
+        "subscribers": subscribers,
+        "subscribe_s": subscribe_seconds,
+        "memory_bytes_per_subscription": held / subscribers if subscribers else 0,
+        "snapshot_chain_reads": snapshot_reads,
+        "chain_reads_per_block": block_reads / args.blocks,
+        "deliveries": len(latencies),
+        "superseded": sum(subscription.superseded for subscription in subscriptions),
+        "latency_ms": {
+            name: value * 1000 for name, value in percentiles(latencies).items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--idle", type=int, default=5000, help="idle subscribers")
+    parser.add_argument("--active", type=int, default=1000, help="active subscribers")
+    parser.add_argument("--pairs", type=int, default=5, help="pairs per subscriber")
+    parser.add_argument("--idle-pairs", type=int, default=2000)
+    parser.add_argument("--active-pairs", type=int, default=200)
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    parser.add_argument("--slow-delay-ms", type=float, default=2000)
+    parser.add_argument("--blocks", type=int, default=10)
+    parser.add_argument("--block-interval", type=float, default=0.5, help="seconds")
+    parser.add_argument("--chain-latency-ms", type=float, default=50)
+    parser.add_argument("--redis-latency-ms", type=float, default=0.2)
+    parser.add_argument("--no-redis", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="stream_load.json")
+    parser.add_argument("--verbose", action="store_true", help="show app logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("app").setLevel(logging.CRITICAL)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "params": {
+            name: value
+            for name, value in vars(args).items()
+            if name not in ("output", "verbose")
+        },
+        "results": asyncio.run(run_stream_load(args)),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    results = report["results"]
+    latency = results["latency_ms"]
+    print(
+        f"{results['subscribers']} subscribers on {args.workers} workers: "
+        f"{results['chain_reads_per_block']:.2f} chain reads per block, "
+        f"{results['memory_bytes_per_subscription']:.0f} bytes per subscription"
+    )
+    print(
+        f"{results['deliveries']} deliveries, block to buffer p50 "
+        f"{latency['p50']:.1f}ms, p99 {latency['p99']:.1f}ms, "
+        f"{results['superseded']} superseded in slow consumers"
+    )
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Compare worker execution models for I/O-bound async tasks.
+
+"prefork" is the default Celery model with async task bodies run through
+asyncio.run: every task gets a fresh event loop and fresh clients, and each
+process works on one task at a time. "asyncio" is the runtime in
+app.worker: one persistent loop per process with clients opened once, fed by
+a thread pool so many tasks are in flight together.
+
+Chain, Mongo and Redis round trips are simulated with sleeps so the numbers
+only reflect the execution model. Run with:
+
+    python -m benchmarks.worker_throughput --tasks 500 --io-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.runtime import AsyncRuntime
+
+
+async def connect(connect_ms: float):
+    await asyncio.sleep(connect_ms / 1000)
+
+
+async def task_body(io_ms: float, round_trips: int):
+    for _ in range(round_trips):
+        await asyncio.sleep(io_ms / 1000)
+
+
+def prefork_task(connect_ms: float, io_ms: float, round_trips: int):
+    async def run():
+        await connect(connect_ms)
+        await task_body(io_ms, round_trips)
+
+    asyncio.run(run())
+
+
+def bench_prefork(args) -> float:
+    with ProcessPoolExecutor(args.processes) as executor:
+        # Warm the processes so start-up is not counted
+        list(executor.map(abs, range(args.processes)))
+        started = time.perf_counter()
+        futures = [
+            executor.submit(prefork_task, args.connect_ms, args.io_ms, args.round_trips)
+            for _ in range(args.tasks)
+        ]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - started
+
+
+def bench_asyncio(args) -> float:
+    runtime = AsyncRuntime(on_start=lambda: connect(args.connect_ms))
+    runtime.start()
+    try:
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            started = time.perf_counter()
+            futures = [
+                executor.submit(runtime.run, task_body(args.io_ms, args.round_trips))
+                for _ in range(args.tasks)
+            ]
+            for future in futures:
+                future.result()
+            return time.perf_counter() - started
+    finally:
+        runtime.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--connect-ms", type=float, default=50)
+    parser.add_argument("--io-ms", type=float, default=20)
+    parser.add_argument("--round-trips", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args()
+
+    results = {}
+    for name, bench in (("prefork", bench_prefork), ("asyncio", bench_asyncio)):
+        elapsed = bench(args)
+        results[name] = {
+            "seconds": round(elapsed, 3),
+            "tasks_per_second": round(args.tasks / elapsed, 1),
+        }
+
+    if args.json:
+        print(json.dumps({"params": vars(args), "results": results}, indent=2))
+        return
+    for name, result in results.items():
+        print(
+            f"{name:>8}: {result['tasks_per_second']:>8} tasks/s "
+            f"({result['seconds']}s for {args.tasks} tasks)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,26 @@ from fastapi.testclient import TestClient
 from motor.motor_asyncio import AsyncIOMotorClient
 from redis import asyncio as aioredis
 
+from app import auth
 from app.main import app
 
 
+class FakeUserCollection:
+    def __init__(self, documents=()):
+        self.documents = {
+            document["username"]: dict(document) for document in documents
+        }
+        self.lookups = 0
+
+    async def find_one(self, query, projection=None):
+        self.lookups += 1
+        document = self.documents.get(query["username"])
+        return dict(document) if document else None
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents[query["username"]] = dict(update["$set"])
+
+
 @pytest.fixture
 def test_client():
     return TestClient(app)
@@ -34,6 +51,16 @@ async def test_redis():
 
 
 @pytest.fixture
-def test_token():
+def user_collection(monkeypatch):
+    collection = FakeUserCollection(
+        [{"username": "test", "hashed_password": "", "disabled": False}]
+    )
+    monkeypatch.setattr(auth, "user_store", auth.UserStore(collection))
+    auth.token_cache.clear()
+    return collection
+
+
+@pytest.fixture
+def test_token(user_collection):
     # Return a test token for authenticated endpoints
-    return "test_token"
+    return auth.create_access_token({"sub": "test"})
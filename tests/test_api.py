@@ -1,7 +1,15 @@
+import json
+from datetime import datetime
+
 import pytest
+from bittensor.utils.balance import Balance
 from fastapi.testclient import TestClient
 
+from app import main
+from app.database import CachedDividends
 from app.main import app
+from app.models import DividendHistoryEntry, TaoDividends
+from app.taodiv import TaoDividendQuerier
 
 
 @pytest.fixture
@@ -31,3 +39,388 @@ def test_get_tao_dividends_authorized(client, test_token):
     )
     assert response.status_code == 200
     # TODO: Add more assertions once the endpoint is fully implemented
+
+
+HOTKEY = "5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx"
+
+
+@pytest.fixture
+def chain_scan(monkeypatch):
+    async def iter_tao_dividends(self, netuid=None):
+        for hotkey in (HOTKEY, HOTKEY.replace("G", "H")):
+            yield netuid, hotkey, Balance.from_rao(1000000000)
+
+    async def get_subnets(self):
+        return [1, 2]
+
+    monkeypatch.setattr(TaoDividendQuerier, "iter_tao_dividends", iter_tao_dividends)
+    monkeypatch.setattr(TaoDividendQuerier, "get_subnets", get_subnets)
+
+
+def test_get_tao_dividends_subnet_stream(client, test_token, chain_scan):
+    response = client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["netuid"] for row in rows] == [1, 1]
+    assert rows[0]["hotkey"] == HOTKEY
+    assert rows[0]["dividends"] == 1.0
+
+
+def test_get_tao_dividends_hotkey_across_subnets_json(
+    client, test_token, chain_scan, monkeypatch
+):
+    reads = []
+
+    async def get_tao_dividends_multi(self, pairs):
+        reads.append(pairs)
+        return [Balance.from_rao(1000000000), Balance.from_rao(2000000000)]
+
+    async def iter_tao_dividends(self, netuid=None):
+        raise AssertionError("a single hotkey must not scan subnet maps")
+        yield
+
+    monkeypatch.setattr(
+        TaoDividendQuerier, "get_tao_dividends_multi", get_tao_dividends_multi
+    )
+    monkeypatch.setattr(TaoDividendQuerier, "iter_tao_dividends", iter_tao_dividends)
+    response = client.get(
+        "/api/v1/tao_dividends",
+        params={"hotkey": HOTKEY, "format": "json"},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+    assert response.status_code == 200
+    rows = response.json()
+    assert [(row["netuid"], row["hotkey"]) for row in rows] == [
+        (1, HOTKEY),
+        (2, HOTKEY),
+    ]
+    assert reads == [[(1, HOTKEY), (2, HOTKEY)]]
+
+
+def test_stale_hit_is_served_while_refreshing(client, test_token, monkeypatch):
+    stale = CachedDividends.from_dividends(
+        TaoDividends(
+            netuid=1, hotkey=HOTKEY, dividends=1.0, timestamp=datetime.utcnow()
+        )
+    )
+    refreshed = []
+
+    async def get_cached_entry(netuid, hotkey, allow_stale=False):
+        return (stale, True) if allow_stale else None
+
+    async def refresh_dividends(netuid, hotkey):
+        refreshed.append((netuid, hotkey))
+        raise RuntimeError("chain unavailable")
+
+    monkeypatch.setattr(main, "get_cached_entry", get_cached_entry)
+    monkeypatch.setattr(main, "refresh_dividends", refresh_dividends)
+
+    response = client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1, "hotkey": HOTKEY},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "stale"
+    body = response.json()
+    assert body["stale"] is True
+    assert body["cached"] is True
+    assert refreshed == [(1, HOTKEY)]
+
+
+def test_get_tao_dividends_history_page(client, test_token, monkeypatch):
+    calls = []
+
+    async def query_dividend_history(
+        netuid, hotkey, start, end, bucket, limit, after_id
+    ):
+        calls.append((start, end, bucket, limit))
+        items = [
+            DividendHistoryEntry(
+                timestamp=datetime(2026, 1, 1),
+                dividends=2.0,
+                min=1.0,
+                max=3.0,
+                count=4,
+            )
+        ]
+        return items, "2026-01-01T00:05:00"
+
+    monkeypatch.setattr(main, "query_dividend_history", query_dividend_history)
+
+    response = client.get(
+        "/api/v1/tao_dividends/history",
+        params={
+            "netuid": 1,
+            "hotkey": HOTKEY,
+            "start": "2026-01-01T00:00:00Z",
+            "end": "2026-01-02T00:00:00Z",
+            "cursor": "2026-01-01T00:00:00",
+            "bucket": 300,
+            "limit": 1,
+        },
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["items"][0]["max"] == 3.0
+    assert body["next_cursor"] == "2026-01-01T00:05:00"
+    assert calls == [(datetime(2026, 1, 1), datetime(2026, 1, 2), 300, 1)]
+
+
+def test_get_tao_dividends_history_resumes_after_cursor(
+    client, test_token, monkeypatch
+):
+    calls = []
+
+    async def query_dividend_history(
+        netuid, hotkey, start, end, bucket, limit, after_id
+    ):
+        calls.append((start, str(after_id)))
+        return [], None
+
+    monkeypatch.setattr(main, "query_dividend_history", query_dividend_history)
+    headers = {"Authorization": f"Bearer {test_token}"}
+
+    def page(cursor):
+        return client.get(
+            "/api/v1/tao_dividends/history",
+            params={
+                "netuid": 1,
+                "hotkey": HOTKEY,
+                "start": "2026-01-01T00:00:00",
+                "end": "2026-01-02T00:00:00",
+                "cursor": cursor,
+            },
+            headers=headers,
+        )
+
+    object_id = "65a1b2c3d4e5f6a7b8c9d0e1"
+    assert page(f"2026-01-01T00:05:00.001000_{object_id}").status_code == 200
+    assert calls == [(datetime(2026, 1, 1, 0, 5, 0, 1000), object_id)]
+    assert page("2026-01-01T00:05:00_nope").status_code == 400
+
+
+def test_get_tao_dividends_batch(client, test_token, monkeypatch):
+    other = HOTKEY.replace("G", "H")
+    missing = HOTKEY.replace("G", "J")
+    cached = TaoDividends(
+        netuid=1, hotkey=HOTKEY, dividends=1.0, timestamp=datetime.utcnow(), cached=True
+    )
+    queried = []
+
+    async def get_cached_dividends_many(pairs):
+        return [cached if pair == (1, HOTKEY) else None for pair in pairs]
+
+    async def get_tao_dividends_multi(self, pairs):
+        queried.append(pairs)
+        return [Balance.from_rao(2000000000), None]
+
+    monkeypatch.setattr(main, "get_cached_dividends_many", get_cached_dividends_many)
+    monkeypatch.setattr(
+        TaoDividendQuerier, "get_tao_dividends_multi", get_tao_dividends_multi
+    )
+
+    response = client.post(
+        "/api/v1/tao_dividends/batch",
+        json={
+            "pairs": [
+                {"netuid": 1, "hotkey": HOTKEY},
+                {"netuid": 2, "hotkey": other},
+                {"netuid": 3, "hotkey": missing},
+                {"netuid": 1, "hotkey": HOTKEY},
+            ]
+        },
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 3
+    assert results[0]["dividends"]["cached"] is True
+    assert results[1]["dividends"]["dividends"] == 2.0
+    assert results[2]["dividends"] is None
+    assert results[2]["error"] == "No dividend data found"
+    assert queried == [[(2, other), (3, missing)]]
+
+
+@pytest.fixture
+def block_history(monkeypatch):
+    store = {100: 5000000000}
+    queried = []
+
+    async def get_historical_dividends(netuid, hotkey, blocks):
+        return {block: store[block] for block in blocks if block in store}
+
+    async def cache_historical_dividends(netuid, hotkey, values):
+        store.update(values)
+
+    async def get_tao_dividends_at_blocks(self, netuid, hotkey, blocks):
+        queried.append(list(blocks))
+        return [Balance.from_rao(block * 1000000) for block in blocks]
+
+    async def get_finalized_block(self):
+        return 103
+
+    async def get_current_block(self):
+        return 106
+
+    monkeypatch.setattr(main, "get_historical_dividends", get_historical_dividends)
+    monkeypatch.setattr(main, "cache_historical_dividends", cache_historical_dividends)
+    monkeypatch.setattr(
+        TaoDividendQuerier, "get_tao_dividends_at_blocks", get_tao_dividends_at_blocks
+    )
+    monkeypatch.setattr(TaoDividendQuerier, "get_finalized_block", get_finalized_block)
+    monkeypatch.setattr(TaoDividendQuerier, "get_current_block", get_current_block)
+    return store, queried
+
+
+def test_get_tao_dividends_range(client, test_token, block_history):
+    store, queried = block_history
+    response = client.get(
+        "/api/v1/tao_dividends/range",
+        params={
+            "netuid": 1,
+            "hotkey": HOTKEY,
+            "start_block": 100,
+            "end_block": 106,
+            "step": 2,
+        },
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [item["block"] for item in items] == [100, 102, 104, 106]
+    assert items[0] == {"block": 100, "dividends": 5.0, "cached": True}
+    assert items[1]["dividends"] == 0.102
+    assert queried == [[102, 104, 106]]
+    # Only blocks at or below the finalized head are cached
+    assert set(store) == {100, 102}
+
+
+def test_get_tao_dividends_range_too_large(client, test_token):
+    response = client.get(
+        "/api/v1/tao_dividends/range",
+        params={"netuid": 1, "hotkey": HOTKEY, "start_block": 0, "end_block": 5000},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "start_block, end_block, status_code",
+    [(0, 10**18, 400), (10, 5, 400), (0, -1, 422)],
+)
+def test_get_tao_dividends_range_bounds(
+    client, test_token, start_block, end_block, status_code
+):
+    response = client.get(
+        "/api/v1/tao_dividends/range",
+        params={
+            "netuid": 1,
+            "hotkey": HOTKEY,
+            "start_block": start_block,
+            "end_block": end_block,
+        },
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+    assert response.status_code == status_code
+
+
+def test_get_tao_dividends_at_block(client, test_token, block_history):
+    response = client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1, "hotkey": HOTKEY, "block": 100},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["block"] == 100
+    assert body["dividends"] == 5.0
+    assert body["cached"] is True
+
+
+def test_blocks_ahead_of_the_head_are_rejected(client, test_token, block_history):
+    store, queried = block_history
+    headers = {"Authorization": f"Bearer {test_token}"}
+    response = client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1, "hotkey": HOTKEY, "block": 107},
+        headers=headers,
+    )
+    assert response.status_code == 400
+    response = client.get(
+        "/api/v1/tao_dividends/range",
+        params={"netuid": 1, "hotkey": HOTKEY, "start_block": 100, "end_block": 110},
+        headers=headers,
+    )
+    assert response.status_code == 400
+    assert queried == []
+
+
+def test_get_tao_dividends_at_block_hash(client, test_token, monkeypatch):
+    block_hash = "0x" + "ab" * 32
+    calls = []
+
+    async def get_tao_dividends_per_subnet(self, netuid, hotkey, block_hash=None):
+        calls.append((netuid, hotkey, block_hash))
+        return Balance.from_rao(2500000000)
+
+    monkeypatch.setattr(
+        TaoDividendQuerier, "get_tao_dividends_per_subnet", get_tao_dividends_per_subnet
+    )
+    response = client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1, "hotkey": HOTKEY, "block_hash": block_hash},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["dividends"] == 2.5
+    assert calls == [(1, HOTKEY, block_hash)]
+
+
+def test_trade_triggers_are_deduplicated(client, test_token, monkeypatch):
+    cached = CachedDividends.from_dividends(
+        TaoDividends(
+            netuid=1, hotkey=HOTKEY, dividends=1.0, timestamp=datetime.utcnow()
+        )
+    )
+    claims = {}
+    sent = []
+
+    async def get_cached_entry(netuid, hotkey, allow_stale=False):
+        return cached, False
+
+    async def claim_trade_trigger(netuid, hotkey, task_id):
+        return claims.setdefault((netuid, hotkey), task_id)
+
+    def send_task(name, args, task_id, **options):
+        sent.append((name, args, task_id))
+
+    monkeypatch.setattr(main, "get_cached_entry", get_cached_entry)
+    monkeypatch.setattr(main, "claim_trade_trigger", claim_trade_trigger)
+    monkeypatch.setattr(main.celery_app, "send_task", send_task)
+
+    statuses = []
+    for _ in range(3):
+        response = client.get(
+            "/api/v1/tao_dividends",
+            params={"netuid": 1, "hotkey": HOTKEY, "trade": "true"},
+            headers={"Authorization": f"Bearer {test_token}"},
+        )
+        assert response.status_code == 200
+        statuses.append(response.json()["trade_status"])
+
+    assert statuses == ["enqueued", "reused", "reused"]
+    assert sent == [("app.worker.analyze_sentiment", [1, HOTKEY], claims[(1, HOTKEY)])]
+    # The shared cached entry is left untouched
+    assert cached.dividends().trade_status is None
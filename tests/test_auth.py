@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app import auth
+
+
+async def test_token_verification_is_cached(test_token, user_collection, monkeypatch):
+    decoded = []
+    decode = auth.decode_access_token
+
+    def counting_decode(token):
+        decoded.append(token)
+        return decode(token)
+
+    monkeypatch.setattr(auth, "decode_access_token", counting_decode)
+
+    for _ in range(3):
+        user = await auth.get_current_user(token=test_token, api_key=None)
+        assert user.username == "test"
+
+    assert decoded == [test_token]
+    assert user_collection.lookups == 1
+
+
+async def test_token_cache_entry_expires_with_token(user_collection):
+    token = auth.create_access_token({"sub": "test"}, timedelta(seconds=-1))
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_user(token=token, api_key=None)
+    assert exc.value.status_code == 401
+    assert len(auth.token_cache) == 0
+
+
+async def test_unknown_user_is_rejected(user_collection):
+    token = auth.create_access_token({"sub": "nobody"})
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_user(token=token, api_key=None)
+    assert exc.value.status_code == 401
+
+
+async def test_authenticate_user(user_collection):
+    await auth.user_store.create_user("alice", "secret")
+    assert (await auth.authenticate_user("alice", "secret")).username == "alice"
+    assert await auth.authenticate_user("alice", "wrong") is None
+    assert await auth.authenticate_user("bob", "secret") is None
+
+
+async def test_unknown_username_still_verifies_a_password(user_collection, monkeypatch):
+    verified = []
+    verify = auth.verify_password
+
+    def counting_verify(password, hashed_password):
+        verified.append(hashed_password)
+        return verify(password, hashed_password)
+
+    monkeypatch.setattr(auth, "verify_password", counting_verify)
+
+    assert await auth.authenticate_user("bob", "secret") is None
+    assert verified == [auth.dummy_password_hash]
+
+
+async def test_api_key(monkeypatch):
+    monkeypatch.setattr(auth, "api_keys", auth.load_api_keys("worker:k1, bot:k2"))
+
+    user = await auth.get_current_user(token=None, api_key="k2")
+    assert user.username == "bot"
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_user(token=None, api_key="k3")
+    assert exc.value.status_code == 401
+
+
+def test_load_api_keys_rejects_malformed_entries():
+    with pytest.raises(ValueError):
+        auth.load_api_keys("no-separator")
+
+
+def test_login_endpoint(test_client, user_collection):
+    user_collection.documents["alice"] = {
+        "username": "alice",
+        "hashed_password": auth.get_password_hash("secret"),
+        "disabled": False,
+    }
+    response = test_client.post(
+        "/token", data={"username": "alice", "password": "secret"}
+    )
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+
+    response = test_client.post(
+        "/token", data={"username": "alice", "password": "nope"}
+    )
+    assert response.status_code == 401
+
+    response = test_client.get(
+        "/api/v1/tao_dividends/range",
+        params={"netuid": 1, "hotkey": "5bad", "start_block": 0, "end_block": 1},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    # Authenticated, so the request gets as far as parameter validation
+    assert response.status_code == 422
+
+
+def test_invalid_token_is_rejected(test_client, user_collection):
+    response = test_client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1, "hotkey": "test"},
+        headers={"Authorization": "Bearer not-a-token"},
+    )
+    assert response.status_code == 401
+
+
+async def test_provision_user_with_api_key(user_collection, monkeypatch):
+    store = auth.user_store
+    entry = await auth.provision_user(store, "carol", "secret", api_key=True)
+
+    assert (await auth.authenticate_user("carol", "secret")).username == "carol"
+    monkeypatch.setattr(auth, "api_keys", auth.load_api_keys(entry))
+    name, _, key = entry.partition(":")
+    assert name == "carol"
+    assert auth.verify_api_key(key).username == "carol"
+    assert await auth.provision_user(store, "dave", "secret") is None
+
+
+def test_api_key_names_cannot_break_the_spec():
+    with pytest.raises(ValueError):
+        auth.generate_api_key("a:b")
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+from app import blocks
+from app.blocks import BlockTracker, RoundScheduler, last_epoch_block
+from app.database import is_cache_fresh
+
+
+def test_last_epoch_block():
+    # netuid 1 with tempo 9 runs its epoch whenever (block + 2) % 10 == 9
+    assert last_epoch_block(1, 97, 9) == 97
+    assert last_epoch_block(1, 106, 9) == 97
+    assert last_epoch_block(1, 107, 9) == 107
+    assert last_epoch_block(0, 108, 9) == 108
+
+
+async def test_block_mode_invalidates_on_every_block():
+    tracker = BlockTracker(mode="block")
+    await tracker.on_block(100)
+    assert tracker.is_fresh(1, 100)
+    await tracker.on_block(101)
+    assert not tracker.is_fresh(1, 100)
+    assert tracker.is_fresh(1, 101)
+
+
+async def test_tempo_mode_keeps_entries_until_next_epoch():
+    tracker = BlockTracker(mode="tempo")
+    tracker._tempos_block = 0
+    tracker.set_tempo(1, 9)
+    await tracker.on_block(100)
+    assert tracker.is_fresh(1, 99)
+    await tracker.on_block(106)
+    assert tracker.is_fresh(1, 99)
+    # Read just before the epoch at 107, so stale from that block on
+    await tracker.on_block(107)
+    assert not tracker.is_fresh(1, 106)
+    assert tracker.is_fresh(1, 107)
+
+
+async def test_freshness_is_undecided_without_blocks():
+    tracker = BlockTracker(mode="block")
+    assert tracker.is_fresh(1, 100) is None
+    await tracker.on_block(100)
+    assert tracker.is_fresh(1, None) is None
+    assert BlockTracker(mode="off").is_fresh(1, 100) is None
+
+
+async def test_stalled_tracker_falls_back_to_ttl(monkeypatch):
+    tracker = BlockTracker(mode="block")
+    await tracker.on_block(100)
+    tracker.last_block_at -= blocks.BLOCK_STALL_TIMEOUT + 1
+    monkeypatch.setattr(blocks, "block_tracker", tracker)
+
+    assert blocks.current_block() is None
+    assert is_cache_fresh(1, 50, datetime.utcnow())
+    assert not is_cache_fresh(1, 100, datetime.utcnow() - timedelta(hours=1))
+
+
+async def test_listeners_and_subscription_handler():
+    tracker = BlockTracker(mode="block")
+    listener = AsyncMock()
+    tracker.add_listener(listener)
+
+    await tracker._handle_header({"header": {"number": 42}}, 0, "sub")
+    await tracker.on_block(41)
+
+    assert tracker.current_block == 42
+    listener.assert_awaited_once_with(42)
+
+
+async def test_entries_read_now_go_stale_at_the_next_block():
+    tracker = BlockTracker(mode="block")
+    await tracker.on_block(100)
+    assert tracker.is_fresh(1, 100)
+    assert not tracker.is_fresh(1, 100, at_block=101)
+
+
+class Rounds:
+    def __init__(self):
+        self.ran = []
+        self.prepared = []
+        self.finished = []
+
+    async def run(self, round_id):
+        self.ran.append(round_id)
+        await asyncio.sleep(0.02)
+
+    async def prepare(self, round_id):
+        self.prepared.append(round_id)
+
+        async def finish():
+            self.finished.append(round_id)
+
+        return finish
+
+
+async def test_scheduler_runs_a_round_per_block_and_coalesces():
+    rounds = Rounds()
+    scheduler = RoundScheduler(rounds.run, 60, "Test")
+    scheduler.start()
+    await scheduler.on_block(1)
+    await asyncio.sleep(0.01)
+    # Both arrive while round 1 runs, so only the newest one runs after it
+    await scheduler.on_block(2)
+    await scheduler.on_block(3)
+    await asyncio.sleep(0.05)
+    await scheduler.close()
+
+    assert rounds.ran == ["block:1", "block:3"]
+
+
+async def test_scheduler_falls_back_to_time_slots():
+    rounds = Rounds()
+    scheduler = RoundScheduler(rounds.run, 0.05, "Test")
+    scheduler.start()
+    await asyncio.sleep(0.08)
+    await scheduler.close()
+
+    assert len(rounds.ran) == 1
+    assert rounds.ran[0].startswith("time:")
+
+
+async def test_scheduler_prepares_the_next_block_round_ahead():
+    rounds = Rounds()
+    scheduler = RoundScheduler(
+        rounds.run, 60, "Test", prepare=rounds.prepare, lead=0.05
+    )
+    scheduler.start()
+    await scheduler.on_block(1)
+    await asyncio.sleep(0.01)
+    scheduler.block_time = 0.2
+
+    # Prepared at most half a block time before block 2 is due
+    await asyncio.sleep(0.05)
+    assert rounds.prepared == []
+    await asyncio.sleep(0.1)
+    assert rounds.prepared == ["block:2"]
+    assert rounds.finished == []
+
+    await scheduler.on_block(2)
+    await asyncio.sleep(0.01)
+    await scheduler.close()
+
+    assert rounds.ran == ["block:1"]
+    assert rounds.finished == ["block:2"]
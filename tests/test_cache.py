@@ -0,0 +1,231 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app import database, metrics
+from app.cache import LocalCache
+from app.models import TaoDividends
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_local_cache_expires_and_validates_entries(monkeypatch):
+    cache = LocalCache(maxsize=10, ttl=5)
+    now = 1000.0
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    assert cache.get("b", valid=lambda value: value > 2) is None
+    now += 5
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_disabled_local_cache_stores_nothing():
+    cache = LocalCache(maxsize=0, ttl=5)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = MagicMock()
+    redis.get = AsyncMock(return_value=None)
+    pipe = MagicMock(execute=AsyncMock())
+    redis.pipeline.return_value = pipe
+    monkeypatch.setattr(database, "redis_client", redis)
+    monkeypatch.setattr(database, "local_cache", LocalCache(maxsize=10, ttl=60))
+    monkeypatch.setattr(metrics, "known_netuids", frozenset({1}))
+    return redis
+
+
+def lookups(tier, result):
+    labels = {"tier": tier, "result": result, "netuid": "1"}
+    return REGISTRY.get_sample_value("dividends_cache_lookups_total", labels) or 0
+
+
+def lookup_counts():
+    return {
+        (tier, result): lookups(tier, result)
+        for tier, result in [
+            ("local", "hit"),
+            ("local", "miss"),
+            ("redis", "hit"),
+            ("redis", "stale"),
+            ("redis", "miss"),
+        ]
+    }
+
+
+def counted_since(before):
+    return {
+        key: count - before[key]
+        for key, count in lookup_counts().items()
+        if count != before[key]
+    }
+
+
+def make_dividends():
+    return TaoDividends(
+        netuid=1, hotkey="hotkey", dividends=1.0, timestamp=datetime.utcnow()
+    )
+
+
+async def test_redis_hit_populates_local_cache(fake_redis):
+    fake_redis.get.return_value = make_dividends().json()
+    before = lookup_counts()
+
+    first = await database.get_cached_dividends(1, "hotkey")
+    second = await database.get_cached_dividends(1, "hotkey")
+
+    assert first.cached and second is first
+    fake_redis.get.assert_awaited_once_with("dividends:1:hotkey")
+    assert counted_since(before) == {
+        ("local", "miss"): 1,
+        ("redis", "hit"): 1,
+        ("local", "hit"): 1,
+    }
+
+
+async def test_stale_entries_are_only_served_when_allowed(fake_redis):
+    dividends = make_dividends()
+    dividends.timestamp -= timedelta(seconds=database.CACHE_TTL + 1)
+    fake_redis.get.return_value = dividends.json()
+    before = lookup_counts()
+
+    assert await database.get_cached_dividends(1, "hotkey") is None
+    stale = await database.get_cached_dividends(1, "hotkey", allow_stale=True)
+
+    assert stale.cached and stale.stale
+    assert len(database.local_cache) == 0
+    assert counted_since(before) == {
+        ("local", "miss"): 2,
+        ("redis", "stale"): 1,
+        ("redis", "miss"): 1,
+    }
+
+
+async def test_stale_entries_are_served_for_a_bounded_time(fake_redis, monkeypatch):
+    # Block mode keeps entries in Redis longer, but not the stale window
+    monkeypatch.setattr(database, "block_cache_enabled", lambda: True)
+    dividends = make_dividends()
+    dividends.timestamp -= timedelta(
+        seconds=database.CACHE_TTL + database.CACHE_STALE_TTL + 1
+    )
+    fake_redis.get.return_value = dividends.json()
+
+    assert await database.get_cached_dividends(1, "hotkey", allow_stale=True) is None
+
+
+async def test_entries_outlive_soft_expiry_in_redis(fake_redis):
+    await database.cache_dividends(make_dividends())
+
+    pipe = fake_redis.pipeline.return_value
+    assert pipe.set.call_args.kwargs["ex"] == (
+        database.CACHE_TTL + database.CACHE_STALE_TTL
+    )
+
+
+async def test_cache_dividends_publishes_invalidation(fake_redis):
+    await database.cache_dividends(make_dividends())
+
+    pipe = fake_redis.pipeline.return_value
+    pipe.publish.assert_called_once_with(
+        database.CACHE_INVALIDATION_CHANNEL,
+        f"{database.CACHE_INSTANCE_ID} dividends:1:hotkey",
+    )
+    cached = await database.get_cached_dividends(1, "hotkey")
+    assert cached.cached
+    fake_redis.get.assert_not_awaited()
+
+
+async def test_invalidation_listener_evicts_other_workers_keys(fake_redis):
+    database.local_cache.set("dividends:1:a", "a")
+    database.local_cache.set("dividends:1:b", "b")
+
+    async def listen():
+        yield {"type": "subscribe", "data": 1}
+        yield {"type": "message", "data": "other-worker dividends:1:a"}
+        yield {"type": "message", "data": f"{database.CACHE_INSTANCE_ID} dividends:1:b"}
+        raise asyncio.CancelledError
+
+    pubsub = MagicMock(subscribe=AsyncMock(), aclose=AsyncMock(), listen=listen)
+    fake_redis.pubsub.return_value = pubsub
+
+    with pytest.raises(asyncio.CancelledError):
+        await database.listen_for_invalidations()
+
+    assert database.local_cache.get("dividends:1:a") is None
+    assert database.local_cache.get("dividends:1:b") == "b"
+    pubsub.aclose.assert_awaited_once()
+
+
+async def test_get_cached_dividends_many_uses_one_mget(fake_redis):
+    local = database.CachedDividends.from_dividends(make_dividends())
+    database.local_cache.set("dividends:1:a", local)
+    fake_redis.mget = AsyncMock(return_value=[make_dividends().json(), None])
+
+    results = await database.get_cached_dividends_many(
+        [(1, "a"), (1, "hotkey"), (1, "missing")]
+    )
+
+    assert results[0] is local.dividends()
+    assert results[1].cached
+    assert results[2] is None
+    fake_redis.mget.assert_awaited_once_with(
+        ["dividends:1:hotkey", "dividends:1:missing"]
+    )
+
+
+async def test_claim_trade_trigger_is_one_atomic_set(fake_redis):
+    fake_redis.set = AsyncMock(side_effect=[None, "first"])
+
+    assert await database.claim_trade_trigger(1, "hotkey", "first") == "first"
+    assert await database.claim_trade_trigger(1, "hotkey", "second") == "first"
+    fake_redis.set.assert_awaited_with(
+        "trade:trigger:1:hotkey",
+        "second",
+        nx=True,
+        ex=database.TRADE_TRIGGER_WINDOW,
+        get=True,
+    )
+
+
+def test_cached_body_matches_model_serialization():
+    dividends = make_dividends()
+    entry = database.CachedDividends.from_dividends(dividends)
+    expected = dividends.copy(
+        update={"cached": True, "stale": True, "trade_status": "reused"}
+    )
+
+    assert json.loads(entry.body(stale=True, trade_status="reused")) == json.loads(
+        expected.json()
+    )
+    assert entry.dividends() == expected.copy(
+        update={"stale": False, "trade_status": None}
+    )
+
+
+def test_cached_entry_reads_legacy_values():
+    dividends = make_dividends()
+    entry = database.CachedDividends.from_raw(dividends.json())
+
+    assert entry.fresh()
+    assert json.loads(entry.body())["cached"] is True
+    assert entry.dividends().timestamp == dividends.timestamp
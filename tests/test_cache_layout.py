@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app import database
+from app.cache import LocalCache
+from app.cache_layout import (
+    RECORD,
+    decode_record,
+    encode_record,
+    migrate_legacy_keys,
+)
+from app.models import TaoDividends
+
+
+def make_dividends(netuid=1, hotkey="5hotkey", **kwargs):
+    return TaoDividends(
+        netuid=netuid,
+        hotkey=hotkey,
+        dividends=kwargs.pop("dividends", 0.123456789),
+        timestamp=kwargs.pop("timestamp", datetime(2025, 1, 1, 12, 0, 0, 250000)),
+        **kwargs,
+    )
+
+
+def test_records_round_trip_rao_and_block():
+    dividends = make_dividends(block=4500000)
+    record = encode_record(dividends)
+
+    assert len(record) == RECORD.size == 20
+    decoded = decode_record(1, "5hotkey", record)
+    assert decoded.dividends == dividends.dividends
+    assert decoded.block == 4500000
+    assert decoded.timestamp == dividends.timestamp
+    assert decoded.cached
+
+
+def test_records_keep_missing_block():
+    assert decode_record(1, "5hotkey", encode_record(make_dividends())).block is None
+
+
+@pytest.fixture
+def hash_redis(monkeypatch):
+    redis = MagicMock()
+    pipe = MagicMock(execute=AsyncMock())
+    redis.pipeline.return_value = pipe
+    monkeypatch.setattr(database, "CACHE_LAYOUT", "hash")
+    monkeypatch.setattr(database, "CACHE_LAYOUT_MIGRATE", True)
+    monkeypatch.setattr(database, "redis_client", redis)
+    monkeypatch.setattr(database, "raw_redis_client", redis)
+    monkeypatch.setattr(database, "local_cache", LocalCache(maxsize=10, ttl=60))
+    return redis
+
+
+async def test_writes_go_to_one_hash_per_subnet(hash_redis):
+    pipe = hash_redis.pipeline.return_value
+    first = make_dividends(hotkey="5a")
+    second = make_dividends(hotkey="5b")
+    other = make_dividends(netuid=2, hotkey="5a")
+
+    await database.cache_dividends_many([first, second, other])
+
+    pipe.set.assert_not_called()
+    assert pipe.hset.call_count == 2
+    pipe.hset.assert_any_call(
+        "dividends:h:1",
+        mapping={"5a": encode_record(first), "5b": encode_record(second)},
+    )
+    pipe.hset.assert_any_call("dividends:h:2", mapping={"5a": encode_record(other)})
+    assert {call.args[0] for call in pipe.expire.call_args_list} == {
+        "dividends:h:1",
+        "dividends:h:2",
+    }
+
+
+async def test_reads_use_one_hmget_per_subnet_and_legacy_fallback(hash_redis):
+    now = datetime.utcnow()
+    fresh = make_dividends(hotkey="5a", timestamp=now)
+    expired = make_dividends(hotkey="5b", timestamp=now - timedelta(days=1))
+    legacy = make_dividends(netuid=2, hotkey="5c", timestamp=now, dividends=2.0)
+    pipe = hash_redis.pipeline.return_value
+    pipe.execute.return_value = [
+        [encode_record(fresh), encode_record(expired)],
+        [None],
+        [None, None, legacy.json().encode()],
+    ]
+
+    results = await database.get_cached_dividends_many(
+        [(1, "5a"), (1, "5b"), (2, "5c")]
+    )
+
+    pipe.hmget.assert_any_call("dividends:h:1", ["5a", "5b"])
+    pipe.hmget.assert_any_call("dividends:h:2", ["5c"])
+    pipe.mget.assert_called_once_with(
+        ["dividends:1:5a", "dividends:1:5b", "dividends:2:5c"]
+    )
+    assert pipe.execute.await_count == 1
+    assert results[0].dividends == fresh.dividends and results[0].cached
+    assert results[1] is None
+    assert results[2].dividends == 2.0
+
+
+async def test_single_lookups_skip_legacy_keys_once_migrated(hash_redis, monkeypatch):
+    monkeypatch.setattr(database, "CACHE_LAYOUT_MIGRATE", False)
+    dividends = make_dividends(timestamp=datetime.utcnow())
+    pipe = hash_redis.pipeline.return_value
+    pipe.execute.return_value = [[encode_record(dividends)]]
+
+    cached = await database.get_cached_dividends(1, "5hotkey")
+
+    pipe.mget.assert_not_called()
+    assert cached.dividends == dividends.dividends
+    assert await database.get_cached_dividends(1, "5hotkey") is cached
+
+
+async def test_migration_moves_legacy_keys_into_hashes():
+    first = make_dividends(hotkey="5a")
+    second = make_dividends(netuid=3, hotkey="5b")
+    keys = ["dividends:1:5a", "dividends:h:1", "dividends:3:5b", "dividends:subnet:3"]
+
+    async def scan_iter(**kwargs):
+        for key in keys:
+            yield key
+
+    redis = MagicMock(scan_iter=scan_iter)
+    read_pipe = MagicMock(
+        execute=AsyncMock(return_value=[first.json(), 100, second.json(), 50])
+    )
+    redis.pipeline.return_value = read_pipe
+    raw_redis = MagicMock()
+    write_pipe = MagicMock(execute=AsyncMock())
+    raw_redis.pipeline.return_value = write_pipe
+
+    moved = await migrate_legacy_keys(redis, raw_redis)
+
+    assert moved == 2
+    read_pipe.get.assert_any_call("dividends:1:5a")
+    write_pipe.hset.assert_any_call(
+        "dividends:h:1", mapping={"5a": encode_record(first)}
+    )
+    write_pipe.hset.assert_any_call(
+        "dividends:h:3", mapping={"5b": encode_record(second)}
+    )
+    write_pipe.expire.assert_any_call("dividends:h:1", 100)
+    write_pipe.delete.assert_called_once_with("dividends:1:5a", "dividends:3:5b")
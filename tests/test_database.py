@@ -0,0 +1,226 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app import database
+from app.database import (
+    decode_history_cursor,
+    dividend_history_pipeline,
+    dividends_document,
+    init_history_collections,
+    migrate_dividend_history,
+    query_dividend_history,
+)
+from app.models import TaoDividends
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+def matches(document, query):
+    return all(document.get(key) == value for key, value in query.items())
+
+
+class FakeCollection:
+    def __init__(self, database, name, documents=()):
+        self.database = database
+        self.name = name
+        self.documents = [dict(document) for document in documents]
+
+    async def find_one(self, query):
+        return next((d for d in self.documents if matches(d, query)), None)
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(d) for d in self.documents if matches(d, query)])
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents.extend(dict(document) for document in documents)
+
+    async def delete_many(self, query):
+        self.documents = [d for d in self.documents if not matches(d, query)]
+
+    async def rename(self, name):
+        self.database.collections[name] = self.database.collections.pop(self.name)
+        self.database.types[name] = self.database.types.pop(self.name)
+        self.name = name
+
+    async def create_index(self, keys, **kwargs):
+        pass
+
+
+class FakeDatabase:
+    """Collections with a type, as listCollections reports them."""
+
+    def __init__(self):
+        self.collections = {}
+        self.types = {}
+
+    def add(self, name, documents=(), type="collection"):
+        self.collections[name] = FakeCollection(self, name, documents)
+        self.types[name] = type
+        return self.collections[name]
+
+    def __getitem__(self, name):
+        return self.collections.get(name) or self.add(name)
+
+    async def list_collections(self, filter):
+        return FakeCursor(
+            [
+                {"name": name, "type": self.types[name]}
+                for name in self.collections
+                if name == filter["name"]
+            ]
+        )
+
+    async def create_collection(self, name, timeseries=None):
+        return self.add(name, type="timeseries" if timeseries else "collection")
+
+
+LEGACY = {
+    "netuid": 1,
+    "hotkey": "hotkey",
+    "dividends": 1.5,
+    "timestamp": datetime(2026, 1, 1),
+    "cached": False,
+}
+CONVERTED = {
+    "timestamp": datetime(2026, 1, 1),
+    "meta": {"netuid": 1, "hotkey": "hotkey"},
+    "dividends": 1.5,
+    "block": None,
+}
+
+
+@pytest.fixture
+def history_db(monkeypatch):
+    history_db = FakeDatabase()
+    monkeypatch.setattr(database, "mongo_client", {database.DATABASE_NAME: history_db})
+    return history_db
+
+
+def test_dividends_document_uses_time_series_layout():
+    dividends = TaoDividends(
+        netuid=1,
+        hotkey="hotkey",
+        dividends=1.5,
+        timestamp=datetime(2026, 1, 1),
+        block=10,
+        cached=True,
+    )
+    assert dividends_document(dividends) == {
+        "timestamp": datetime(2026, 1, 1),
+        "meta": {"netuid": 1, "hotkey": "hotkey"},
+        "dividends": 1.5,
+        "block": 10,
+    }
+
+
+def test_history_pipeline_raw_samples():
+    pipeline = dividend_history_pipeline(
+        1, "hotkey", datetime(2026, 1, 1), datetime(2026, 1, 2), None, 10
+    )
+    assert pipeline[0]["$match"] == {
+        "meta.netuid": 1,
+        "meta.hotkey": "hotkey",
+        "timestamp": {"$gte": datetime(2026, 1, 1), "$lt": datetime(2026, 1, 2)},
+    }
+    assert [next(iter(stage)) for stage in pipeline] == [
+        "$match",
+        "$sort",
+        "$limit",
+        "$project",
+    ]
+    assert pipeline[1] == {"$sort": {"timestamp": 1, "_id": 1}}
+
+
+def test_history_pipeline_resumes_after_timestamp_and_id():
+    after_id = ObjectId()
+    pipeline = dividend_history_pipeline(
+        1, "hotkey", datetime(2026, 1, 1), datetime(2026, 1, 2), None, 10, after_id
+    )
+    assert pipeline[0]["$match"]["$or"] == [
+        {"timestamp": {"$gt": datetime(2026, 1, 1)}},
+        {"_id": {"$gt": after_id}},
+    ]
+
+
+async def test_history_cursor_keeps_samples_sharing_a_timestamp(monkeypatch):
+    stamp = datetime(2026, 1, 1, 0, 0, 0, 1000)
+    ids = [ObjectId() for _ in range(3)]
+    pipelines = []
+
+    class Collection:
+        def aggregate(self, pipeline):
+            pipelines.append(pipeline)
+            return FakeCursor(
+                [
+                    {"_id": object_id, "timestamp": stamp, "dividends": 1.0}
+                    for object_id in ids[:2]
+                ]
+            )
+
+    monkeypatch.setattr(
+        database, "mongo_client", {database.DATABASE_NAME: {"dividends": Collection()}}
+    )
+    items, cursor = await query_dividend_history(
+        1, "hotkey", datetime(2026, 1, 1), datetime(2026, 1, 2), limit=2
+    )
+
+    assert [item.timestamp for item in items] == [stamp, stamp]
+    assert decode_history_cursor(cursor) == (stamp, ids[1])
+
+
+def test_history_pipeline_downsamples_into_buckets():
+    pipeline = dividend_history_pipeline(
+        1, "hotkey", datetime(2026, 1, 1), datetime(2026, 1, 2), 300, 10
+    )
+    group = next(stage["$group"] for stage in pipeline if "$group" in stage)
+    assert group["_id"]["$dateTrunc"]["binSize"] == 300
+    assert group["dividends"] == {"$last": "$dividends"}
+    assert group["min"] == {"$min": "$dividends"}
+    assert group["max"] == {"$max": "$dividends"}
+    # $last is only meaningful on input sorted by time
+    assert pipeline.index({"$sort": {"timestamp": 1}}) < pipeline.index(
+        next(stage for stage in pipeline if "$group" in stage)
+    )
+
+
+async def test_history_collection_is_created_as_time_series(history_db):
+    await init_history_collections()
+    assert history_db.types["dividends"] == "timeseries"
+    # A second worker starting finds it ready
+    await init_history_collections()
+
+
+async def test_regular_history_collection_fails_until_migrated(history_db):
+    history_db.add("dividends", [LEGACY])
+
+    with pytest.raises(RuntimeError, match="app.history migrate"):
+        await init_history_collections()
+
+    assert await migrate_dividend_history(history_db, batch_size=1) == 1
+    assert history_db.types["dividends"] == "timeseries"
+    assert history_db["dividends"].documents == [CONVERTED]
+    assert history_db[database.LEGACY_HISTORY_COLLECTION].documents == [LEGACY]
+    await init_history_collections()
+
+
+async def test_old_documents_in_time_series_collection_are_rewritten(history_db):
+    history_db.add("dividends", [CONVERTED, LEGACY], type="timeseries")
+
+    with pytest.raises(RuntimeError):
+        await init_history_collections()
+
+    assert await migrate_dividend_history(history_db) == 1
+    assert history_db["dividends"].documents == [CONVERTED, CONVERTED]
+    assert await migrate_dividend_history(history_db) == 0
@@ -0,0 +1,106 @@
+import asyncio
+from collections import defaultdict
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+from pymongo.errors import BulkWriteError
+
+from app.history import HistoryWriter
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def records(collection, outcome):
+    return sample("history_records_total", collection=collection, outcome=outcome)
+
+
+@pytest.fixture
+def database():
+    collections = defaultdict(lambda: MagicMock(insert_many=AsyncMock()))
+    database = MagicMock()
+    database.__getitem__.side_effect = collections.__getitem__
+    return database
+
+
+async def test_flushes_full_batches_without_waiting(database):
+    writer = HistoryWriter(database, batch_size=3, flush_interval=60)
+    await writer.start()
+    for value in range(3):
+        await writer.put("dividends", {"value": value})
+    await asyncio.sleep(0.01)
+
+    database["dividends"].insert_many.assert_awaited_once_with(
+        [{"value": 0}, {"value": 1}, {"value": 2}], ordered=False
+    )
+    await writer.close()
+
+
+async def test_flushes_partial_batches_after_interval(database):
+    writer = HistoryWriter(database, batch_size=100, flush_interval=0.01)
+    written = records("dividends", "written") + records("sentiment", "written")
+    await writer.start()
+    await writer.put("dividends", {"value": 1})
+    await writer.put("sentiment", {"value": 2})
+    await asyncio.sleep(0.05)
+
+    database["dividends"].insert_many.assert_awaited_once()
+    database["sentiment"].insert_many.assert_awaited_once()
+    assert (
+        records("dividends", "written") + records("sentiment", "written") == written + 2
+    )
+    await writer.close()
+
+
+async def test_close_drains_the_queue(database):
+    writer = HistoryWriter(database, batch_size=2, flush_interval=60)
+    depth = sample("history_queue_depth")
+    await writer.start()
+    for value in range(5):
+        await writer.put("dividends", {"value": value})
+    await writer.close()
+
+    written = [
+        doc
+        for call in database["dividends"].insert_many.await_args_list
+        for doc in call.args[0]
+    ]
+    assert written == [{"value": value} for value in range(5)]
+    assert sample("history_queue_depth") == depth
+
+
+async def test_full_queue_applies_backpressure(database):
+    writer = HistoryWriter(database, queue_size=1)
+    await writer.put("dividends", {"value": 1})
+    blocked = asyncio.create_task(writer.put("dividends", {"value": 2}))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    await writer.start()
+    await asyncio.wait_for(blocked, 1)
+    await writer.close()
+
+
+async def test_partial_bulk_failures_are_counted(database):
+    database["dividends"].insert_many.side_effect = BulkWriteError(
+        {"nInserted": 1, "writeErrors": [{}]}
+    )
+    writer = HistoryWriter(database, batch_size=2, flush_interval=60)
+    before = (
+        records("dividends", "written"),
+        records("dividends", "dropped"),
+        sample("history_flush_duration_seconds_count"),
+    )
+    await writer.start()
+    await writer.put("dividends", {"value": 1})
+    await writer.put("dividends", {"value": 2})
+    await writer.close()
+
+    after = (
+        records("dividends", "written"),
+        records("dividends", "dropped"),
+        sample("history_flush_duration_seconds_count"),
+    )
+    assert [b - a for a, b in zip(before, after)] == [1, 1, 1]
@@ -0,0 +1,55 @@
+import argparse
+
+from app import database
+from benchmarks.load_test import compare, run_load
+
+
+def load_args(**overrides):
+    args = dict(
+        requests=60,
+        concurrency=10,
+        hit_ratio=0.5,
+        hot_keys=5,
+        subnets=4,
+        pool_size=2,
+        chain_latency_ms=1,
+        chain_error_rate=0.0,
+        redis_latency_ms=0,
+        mongo_latency_ms=0,
+        seed=0,
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+async def test_offline_load_run_reports_latency_and_cache_mix():
+    results = await run_load(load_args())
+
+    assert results["requests"] == 60
+    assert results["status_counts"] == {"200": 60}
+    assert results["x_cache"]["hit"] + results["x_cache"]["miss"] == 60
+    assert results["chain_queries"] == results["x_cache"]["miss"]
+    latency = results["latency_ms"]
+    assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    # Stand-ins are removed again afterwards
+    assert database.redis_client is None and database.mongo_client is None
+
+
+async def test_chain_errors_surface_as_503():
+    results = await run_load(load_args(hit_ratio=0.0, chain_error_rate=1.0))
+
+    assert results["status_counts"] == {"503": 60}
+    assert results["chain_errors"] >= 60
+
+
+def test_compare_reports_relative_change():
+    baseline = {
+        "commit": "abc123",
+        "results": {"throughput_rps": 100.0, "latency_ms": {"p50": 10.0}},
+    }
+    report = {"results": {"throughput_rps": 150.0, "latency_ms": {"p50": 5.0}}}
+
+    lines = compare(report, baseline)
+
+    assert lines[0] == "compared with abc123:"
+    assert "+50.0%" in lines[1] and "-50.0%" in lines[2]
@@ -0,0 +1,146 @@
+import subprocess
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app import database, metrics
+from app.cache import LocalCache
+from app.metrics import CHAIN_QUERY_LATENCY, timed
+from app.pool import SubtensorPool
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_requests_are_labelled_with_route_template(test_client):
+    labels = {"method": "GET", "route": "/", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    test_client.get("/")
+    response = test_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+    assert "http_requests_in_flight" in response.text
+
+
+def test_unknown_paths_share_one_label(test_client):
+    labels = {"method": "GET", "route": "unmatched", "status": "404"}
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    test_client.get("/no/such/path/5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx")
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+
+
+def test_timed_records_failures_as_errors():
+    labels = {"method": "test", "netuid": "9", "outcome": "error"}
+    before = sample("chain_query_duration_seconds_count", **labels)
+
+    with pytest.raises(ValueError):
+        with timed(CHAIN_QUERY_LATENCY, method="test", netuid="9"):
+            raise ValueError
+
+    assert sample("chain_query_duration_seconds_count", **labels) == before + 1
+
+
+async def test_cache_lookups_are_counted_per_tier_and_netuid(monkeypatch):
+    redis = MagicMock(get=AsyncMock(return_value=None))
+    monkeypatch.setattr(database, "redis_client", redis)
+    monkeypatch.setattr(database, "local_cache", LocalCache(maxsize=10, ttl=60))
+    monkeypatch.setattr(metrics, "known_netuids", frozenset({77}))
+    labels = {"tier": "redis", "result": "miss", "netuid": "77"}
+    before = sample("dividends_cache_lookups_total", **labels)
+
+    await database.get_cached_entry(77, "5hotkey")
+
+    assert sample("dividends_cache_lookups_total", **labels) == before + 1
+    assert sample("redis_command_duration_seconds_count", operation="get", outcome="ok")
+
+
+async def test_unknown_netuids_share_one_label(monkeypatch):
+    monkeypatch.setattr(database, "redis_client", None)
+    monkeypatch.setattr(database, "local_cache", LocalCache(maxsize=10, ttl=60))
+    metrics.set_known_netuids([1, 2])
+    labels = {"tier": "local", "result": "miss"}
+    before = sample("dividends_cache_lookups_total", netuid="other", **labels)
+
+    for netuid in (60000, 60001):
+        await database.get_cached_entry(netuid, "5hotkey")
+    metrics.set_known_netuids([])
+
+    assert sample("dividends_cache_lookups_total", netuid="other", **labels) == (
+        before + 2
+    )
+    assert not sample("dividends_cache_lookups_total", netuid="60000", **labels)
+
+
+def test_netuids_are_bounded(test_client, test_token):
+    response = test_client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 65536, "hotkey": "5" + "a" * 47},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+    assert response.status_code == 422
+
+
+async def test_pool_gauges_follow_borrowed_connections():
+    pool = SubtensorPool(
+        size=1,
+        health_check_interval=0,
+        factory=lambda endpoint: AsyncMock(get_current_block=AsyncMock(return_value=1)),
+    )
+    healthy = sample("subtensor_pool_connections", state="healthy")
+    await pool.start()
+    try:
+        assert sample("subtensor_pool_connections", state="healthy") == healthy + 1
+        async with pool.acquire():
+            assert sample("subtensor_pool_in_flight") == 1
+        assert sample("subtensor_pool_in_flight") == 0
+    finally:
+        await pool.close()
+    assert sample("subtensor_pool_connections", state="healthy") == healthy
+
+
+async def test_celery_queue_depth_is_read_from_broker(monkeypatch):
+    pipe = MagicMock(execute=AsyncMock(return_value=[42]))
+    monkeypatch.setattr(
+        metrics, "broker_client", MagicMock(pipeline=MagicMock(return_value=pipe))
+    )
+
+    body, _ = await metrics.render_metrics()
+
+    pipe.llen.assert_called_once_with("celery")
+    assert b'celery_queue_depth{queue="celery"} 42.0' in body
+
+
+def test_multiprocess_mode_aggregates_every_worker(tmp_path):
+    env = {"PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "PATH": ""}
+    record = (
+        "from app.metrics import count_cache_lookup, set_known_netuids, "
+        "REQUESTS_IN_FLIGHT; set_known_netuids([3]); "
+        "count_cache_lookup('local', 'hit', 3); REQUESTS_IN_FLIGHT.inc()"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", record], env=env, check=True)
+    render = (
+        "import asyncio; from app.metrics import render_metrics; "
+        "print(asyncio.run(render_metrics())[0].decode())"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", render],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    assert (
+        'dividends_cache_lookups_total{netuid="3",result="hit",tier="local"} 2.0'
+        in output
+    )
+    # Gauges of exited workers are dropped once they are marked dead
+    assert "http_requests_in_flight 2.0" in output
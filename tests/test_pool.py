@@ -0,0 +1,248 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.pool import CircuitBreaker, SubtensorPool
+from app.taodiv import WARM_UP_HOTKEY, TaoDividendQuerier
+from benchmarks.standins import FakeSubtensor
+
+
+def make_subtensor(endpoint):
+    return AsyncMock(get_current_block=AsyncMock(return_value=100))
+
+
+@pytest.fixture
+async def pool():
+    pool = SubtensorPool(
+        size=2, max_in_flight=1, health_check_interval=0, factory=make_subtensor
+    )
+    await pool.start()
+    try:
+        yield pool
+    finally:
+        await pool.close()
+
+
+async def test_start_warms_all_connections(pool):
+    assert pool.stats() == {"size": 2, "healthy": 2, "in_flight": 0}
+    for connection in pool.connections:
+        connection.subtensor.initialize.assert_awaited_once()
+
+
+async def test_acquire_spreads_load_across_connections(pool):
+    async with pool.acquire() as first, pool.acquire() as second:
+        assert first is not second
+        assert pool.stats()["in_flight"] == 2
+    assert pool.stats()["in_flight"] == 0
+
+
+async def test_only_timed_borrows_are_latency_samples(pool):
+    node = pool.nodes[0]
+    latency = node.latency
+    async with pool.acquire(node, timed=False):
+        await asyncio.sleep(0.05)
+    assert node.latency == latency
+    async with pool.acquire(node):
+        await asyncio.sleep(0.05)
+    assert node.latency != latency
+
+
+async def test_in_flight_limit_blocks_extra_borrowers(pool):
+    async with pool.acquire(), pool.acquire():
+        third = asyncio.create_task(pool.acquire().__aenter__())
+        await asyncio.sleep(0)
+        assert not third.done()
+    await asyncio.wait_for(third, 1)
+
+
+async def test_failed_query_reconnects_dead_connection(pool):
+    connection = pool.connections[0]
+    dead = connection.subtensor
+    dead.get_current_block = AsyncMock(side_effect=ConnectionError("closed"))
+    with pytest.raises(ConnectionError):
+        async with pool.acquire() as subtensor:
+            assert subtensor is dead
+            raise ConnectionError("closed")
+    await asyncio.gather(*pool._background)
+    dead.close.assert_awaited_once()
+    assert connection.healthy
+    assert connection.subtensor is not dead
+
+
+async def test_querier_borrows_from_pool(pool):
+    querier = TaoDividendQuerier(pool)
+    for connection in pool.connections:
+        connection.subtensor.query_module = AsyncMock(return_value=None)
+    assert await querier.get_tao_dividends_per_subnet(1, "test_hotkey") is None
+    await querier.close()
+    for connection in pool.connections:
+        connection.subtensor.close.assert_not_awaited()
+
+
+@pytest.fixture
+async def nodes():
+    fakes = {}
+    pools = []
+
+    async def start(hedge_percentile=0, **settings):
+        fakes.update(
+            {
+                endpoint: FakeSubtensor(latency, error_rate, seed=index)
+                for index, (endpoint, (latency, error_rate)) in enumerate(
+                    settings.items()
+                )
+            }
+        )
+        pool = SubtensorPool(
+            size=1,
+            health_check_interval=0,
+            factory=fakes.__getitem__,
+            endpoints=list(settings),
+            breaker_min_calls=4,
+            hedge_percentile=hedge_percentile,
+        )
+        pools.append(pool)
+        await pool.start()
+        return pool, fakes
+
+    yield start
+    for pool in pools:
+        await pool.close()
+
+
+def spy_reads(fake):
+    fake.query_module = AsyncMock(wraps=fake.query_module)
+    return fake.query_module
+
+
+async def read(pool, hotkey="5hotkey"):
+    querier = TaoDividendQuerier(pool)
+    return await querier.get_tao_dividends_per_subnet(1, hotkey)
+
+
+async def test_reads_are_routed_to_the_fastest_node(nodes):
+    pool, fakes = await nodes(slow=(0.03, 0), fast=(0.001, 0))
+
+    for _ in range(20):
+        await read(pool)
+
+    # Each node is tried once before latency decides
+    assert fakes["slow"].queries == 1
+    assert fakes["fast"].queries == 19
+    assert pool.nodes[1].latency < pool.nodes[0].latency
+
+
+async def test_failing_node_is_cut_off_by_its_breaker(nodes):
+    pool, fakes = await nodes(broken=(0, 1), good=(0.001, 0))
+    broken_reads = spy_reads(fakes["broken"])
+
+    for _ in range(20):
+        # Reads that hit the broken node are retried on the good one
+        assert await read(pool) is not None
+
+    assert pool.nodes[0].breaker.state == CircuitBreaker.OPEN
+    assert broken_reads.await_count == 4
+    assert [node["breaker"] for node in pool.node_stats()] == ["open", "closed"]
+
+
+def test_breaker_probes_once_after_reset_timeout():
+    now = [0.0]
+    breaker = CircuitBreaker(
+        error_rate=0.5, min_calls=2, window=10, reset_timeout=30, clock=lambda: now[0]
+    )
+    breaker.record(failed=False)
+    breaker.record(failed=True)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.available()
+
+    now[0] = 30
+    assert breaker.available()
+    assert breaker.acquire()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time; a failed probe reopens the breaker
+    assert not breaker.available()
+    breaker.record(failed=True, probe=True)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.available()
+
+    now[0] = 60
+    breaker.release(breaker.acquire())
+    assert breaker.available()
+    assert breaker.acquire()
+    breaker.record(failed=False, probe=True)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.error_rate == 0
+
+
+def test_only_the_probe_ending_lets_another_through():
+    breaker = CircuitBreaker(
+        error_rate=0.5, min_calls=1, window=10, reset_timeout=0, clock=lambda: 0.0
+    )
+    breaker.record(failed=True)
+    probe = breaker.acquire()
+    # Calls forced through beside the probe neither free nor decide it
+    other = breaker.acquire()
+    assert probe and not other
+    breaker.release(other)
+    breaker.record(failed=False, probe=other)
+    assert breaker.state == CircuitBreaker.HALF_OPEN and not breaker.available()
+
+    breaker.release(probe)
+    assert breaker.available()
+
+
+async def test_slow_read_is_hedged_on_another_node(nodes):
+    pool, fakes = await nodes(hedge_percentile=90, first=(0.002, 0), second=(0, 0))
+    for _ in range(20):
+        pool.nodes[0].observe_latency(0.002)
+        pool.nodes[1].observe_latency(0.004)
+    fakes["first"].latency = 1.0
+    first, second = spy_reads(fakes["first"]), spy_reads(fakes["second"])
+
+    started = time.perf_counter()
+    balance = await read(pool)
+
+    assert balance is not None
+    assert time.perf_counter() - started < 0.5
+    assert first.await_count == second.await_count == 1
+    # The losing read was cancelled and left the pool
+    await asyncio.sleep(0)
+    assert pool.stats()["in_flight"] == 0
+
+
+async def test_failed_read_falls_over_to_another_node(nodes):
+    pool, fakes = await nodes(first=(0, 1), second=(0, 0))
+    pool.nodes[0].observe_latency(0.002)
+    pool.nodes[1].observe_latency(0.004)
+    first, second = spy_reads(fakes["first"]), spy_reads(fakes["second"])
+
+    assert await read(pool) is not None
+    assert first.await_count == second.await_count == 1
+
+
+async def test_borrowers_during_start_share_its_connection():
+    made = []
+
+    def factory(endpoint):
+        made.append(endpoint)
+        return make_subtensor(endpoint)
+
+    pool = SubtensorPool(size=1, health_check_interval=0, factory=factory)
+    try:
+        starting = asyncio.create_task(pool.start())
+        async with pool.acquire() as subtensor:
+            assert subtensor is not None
+        await starting
+        assert len(made) == 1
+    finally:
+        await pool.close()
+
+
+async def test_warm_up_reads_on_every_node(nodes):
+    pool, fakes = await nodes(first=(0.001, 0), second=(0.002, 0))
+    reads = [spy_reads(fake) for fake in fakes.values()]
+
+    await TaoDividendQuerier(pool).warm_up()
+
+    for spy in reads:
+        assert spy.call_args.kwargs["params"] == [0, WARM_UP_HOTKEY]
+    assert all(node.latency is not None for node in pool.nodes)
@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import blocks, database, main, prewarm
+from app.cache import LocalCache
+from app.database import CachedDividends
+from app.models import TaoDividends
+from app.prewarm import POPULARITY_KEY, CachePrewarmer
+from benchmarks.standins import MemoryRedis
+
+HOTKEY = "5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx"
+
+
+def make_dividends(netuid, age=0.0):
+    return TaoDividends(
+        netuid=netuid,
+        hotkey=HOTKEY,
+        dividends=1.0,
+        timestamp=datetime.utcnow() - timedelta(seconds=age),
+    )
+
+
+class Reader:
+    """Multi-key reader that caches what it reads, as the app's does."""
+
+    def __init__(self):
+        self.reads = []
+
+    async def __call__(self, pairs):
+        self.reads.append(list(pairs))
+        results = [make_dividends(netuid) for netuid, _ in pairs]
+        await database.cache_dividends_many(results)
+        return results
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    redis = MemoryRedis()
+    monkeypatch.setattr(database, "redis_client", redis)
+    monkeypatch.setattr(database, "CACHE_LAYOUT", "keys")
+    monkeypatch.setattr(database, "local_cache", LocalCache(maxsize=10, ttl=60))
+    # Wall-clock TTLs, since no block headers are followed here
+    monkeypatch.setattr(blocks, "block_tracker", None)
+    return redis
+
+
+async def test_requests_are_counted_and_flushed(redis):
+    prewarmer = CachePrewarmer(redis, Reader(), sample_rate=1)
+    for _ in range(3):
+        prewarmer.record(1, HOTKEY)
+    prewarmer.record(2, HOTKEY)
+    await prewarmer.flush()
+    await prewarmer.flush()
+
+    assert await redis.zrevrange(POPULARITY_KEY, 0, -1, withscores=True) == [
+        (f"1:{HOTKEY}", 3.0),
+        (f"2:{HOTKEY}", 1.0),
+    ]
+
+
+def test_sampled_requests_weigh_the_inverse_rate(monkeypatch):
+    prewarmer = CachePrewarmer(None, Reader(), sample_rate=0.25)
+    draws = iter([0.1, 0.9, 0.2])
+    monkeypatch.setattr(prewarm.random, "random", lambda: next(draws))
+    for _ in range(3):
+        prewarmer.record(1, HOTKEY)
+    assert prewarmer._pending == {f"1:{HOTKEY}": 8.0}
+
+
+async def test_popular_keys_due_are_refreshed_within_budget(redis):
+    # Fresh, about to expire, missing and missing, in order of popularity
+    await database.cache_dividends_many(
+        [make_dividends(1), make_dividends(2, age=database.CACHE_TTL)]
+    )
+    await redis.zadd(
+        POPULARITY_KEY,
+        {f"{netuid}:{HOTKEY}": 10 - netuid for netuid in (1, 2, 3, 4)},
+    )
+    reader = Reader()
+    prewarmer = CachePrewarmer(redis, reader, budget=2, batch_size=1)
+
+    assert await prewarmer.refresh("block:1") == 2
+    assert reader.reads == [[(2, HOTKEY)], [(3, HOTKEY)]]
+    entries = await database.read_cached_entries([(2, HOTKEY), (3, HOTKEY)])
+    assert all(entry.fresh() for entry in entries)
+
+
+async def test_block_rounds_are_prepared_for_the_next_block(redis, monkeypatch):
+    tracker = blocks.BlockTracker(mode="block")
+    await tracker.on_block(100)
+    monkeypatch.setattr(blocks, "block_tracker", tracker)
+    await database.cache_dividends_many([make_dividends(1).copy(update={"block": 100})])
+    await redis.zadd(POPULARITY_KEY, {f"1:{HOTKEY}": 1})
+    reader = Reader()
+    prewarmer = CachePrewarmer(redis, reader)
+
+    # Fresh at block 100, but stale once block 101 comes
+    assert await prewarmer.refresh("block:100") == 0
+    read = await prewarmer.prepare("block:101", at_block=101)
+    assert reader.reads == []
+    assert await read() == 1
+    assert reader.reads == [[(1, HOTKEY)]]
+
+
+def test_refresh_due_looks_ahead_by_the_lead(redis):
+    fresh = CachedDividends.from_dividends(make_dividends(1))
+    ending = CachedDividends.from_dividends(make_dividends(1, age=database.CACHE_TTL))
+    assert prewarm.refresh_due(None)
+    assert not prewarm.refresh_due(fresh, lead=0)
+    assert prewarm.refresh_due(fresh, lead=database.CACHE_TTL)
+    assert prewarm.refresh_due(ending, lead=0)
+
+
+async def test_one_worker_refreshes_each_round(redis):
+    await redis.zadd(POPULARITY_KEY, {f"1:{HOTKEY}": 1})
+    readers = [Reader(), Reader()]
+    prewarmers = [CachePrewarmer(redis.client(), reader) for reader in readers]
+
+    refreshed = await asyncio.gather(
+        *(prewarmer.refresh("block:5") for prewarmer in prewarmers)
+    )
+
+    assert sorted(refreshed) == [0, 1]
+    assert sum(len(reader.reads) for reader in readers) == 1
+    assert await prewarmers[0].refresh("block:5") == 0
+
+
+async def test_scores_decay_once_per_half_life(redis):
+    await redis.zadd(POPULARITY_KEY, {f"1:{HOTKEY}": 4, f"2:{HOTKEY}": 0.6})
+    prewarmer = CachePrewarmer(redis, Reader())
+
+    await prewarmer.refresh("block:1")
+    await prewarmer.refresh("block:2")
+
+    assert await redis.zrevrange(POPULARITY_KEY, 0, -1, withscores=True) == [
+        (f"1:{HOTKEY}", 2.0)
+    ]
+
+
+def test_endpoint_records_single_key_requests(test_client, test_token, monkeypatch):
+    prewarmer = CachePrewarmer(None, Reader())
+    monkeypatch.setattr(prewarm, "prewarmer", prewarmer)
+
+    async def get_cached_entry(netuid, hotkey, allow_stale=False):
+        return CachedDividends.from_dividends(make_dividends(netuid)), False
+
+    monkeypatch.setattr(main, "get_cached_entry", get_cached_entry)
+    response = test_client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1, "hotkey": HOTKEY},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+
+    assert response.status_code == 200
+    assert prewarmer._pending == {f"1:{HOTKEY}": 1}
@@ -0,0 +1,97 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app import ratelimit
+from app.ratelimit import RateLimiter, request_buckets
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    redis = MagicMock()
+    script = AsyncMock(return_value=[1, 1, 19, 0, 100])
+    redis.register_script.return_value = script
+    limiter = RateLimiter(redis)
+    monkeypatch.setattr(ratelimit, "rate_limiter", limiter)
+    return limiter
+
+
+def make_scope(query_string=b"", headers=()):
+    return {
+        "type": "http",
+        "path": "/api/v1/tao_dividends",
+        "query_string": query_string,
+        "headers": list(headers),
+        "client": ("10.0.0.1", 1234),
+    }
+
+
+def test_request_buckets():
+    anonymous = request_buckets(make_scope())
+    assert [key for key, _, _ in anonymous] == ["ratelimit:ip:10.0.0.1"]
+
+    trade = request_buckets(
+        make_scope(b"netuid=1&trade=true", [(b"authorization", b"Bearer abc")])
+    )
+    keys = [key for key, _, _ in trade]
+    assert keys[0].startswith("ratelimit:token:")
+    assert keys[1] == "ratelimit:ip:10.0.0.1"
+    assert keys[2].startswith("ratelimit:trade:token:")
+    assert keys[3] == "ratelimit:trade:ip:10.0.0.1"
+    assert trade[2][1:] == (
+        ratelimit.RATE_LIMIT_TRADE_RATE,
+        ratelimit.RATE_LIMIT_TRADE_BURST,
+    )
+
+
+async def test_check_is_one_script_call(limiter):
+    buckets = [("ratelimit:token:a", 10.0, 20), ("ratelimit:ip:b", 20.0, 40)]
+    result = await limiter.check(buckets)
+
+    assert result.allowed
+    assert result.headers() == {
+        "RateLimit-Limit": "20",
+        "RateLimit-Remaining": "19",
+        "RateLimit-Reset": "1",
+    }
+    limiter._script.assert_awaited_once_with(
+        keys=["ratelimit:token:a", "ratelimit:ip:b"], args=[1, 10.0, 20, 20.0, 40]
+    )
+
+
+async def test_rejected_buckets_are_rejected_locally(limiter):
+    limiter._script.return_value = [0, 2, 0, 5000, 10000]
+    buckets = [("ratelimit:token:a", 10.0, 20), ("ratelimit:trade:token:a", 0.1, 2)]
+
+    first = await limiter.check(buckets)
+    second = await limiter.check(buckets)
+    # Requests that do not touch the exhausted bucket still go to Redis
+    limiter._script.return_value = [1, 1, 18, 0, 200]
+    third = await limiter.check(buckets[:1])
+
+    assert not first.allowed and not second.allowed
+    assert first.headers()["Retry-After"] == "5"
+    assert first.limit == 2
+    assert limiter.local_rejections == 1
+    assert limiter._script.await_count == 2
+    assert third.allowed
+
+
+def test_middleware_returns_429(test_client, limiter):
+    limiter._script.return_value = [0, 1, 0, 1500, 2000]
+    response = test_client.get("/api/v1/tao_dividends", params={"netuid": 1})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert response.headers["RateLimit-Remaining"] == "0"
+
+
+def test_middleware_adds_headers_and_fails_open(test_client, limiter):
+    response = test_client.get("/api/v1/tao_dividends", params={"netuid": 1})
+    assert response.status_code == 401
+    # Anonymous requests only draw from the per-IP bucket
+    assert response.headers["RateLimit-Limit"] == "40"
+
+    limiter._script.side_effect = ConnectionError("redis down")
+    response = test_client.get("/api/v1/tao_dividends", params={"netuid": 1})
+    assert response.status_code == 401
+    assert "RateLimit-Limit" not in response.headers
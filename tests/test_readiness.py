@@ -0,0 +1,103 @@
+import asyncio
+import subprocess
+import sys
+
+from app import readiness
+from app.readiness import WarmUp
+
+
+async def test_steps_run_concurrently_and_are_reported():
+    async def slow():
+        await asyncio.sleep(0.05)
+
+    warm_up = WarmUp()
+    await warm_up.run({"a": slow, "b": slow})
+
+    assert warm_up.ready
+    assert warm_up.seconds < 0.09
+    report = warm_up.report()
+    assert report["failing"] == []
+    assert [step["status"] for step in report["steps"].values()] == ["done", "done"]
+
+
+async def test_failed_step_keeps_the_service_unready_until_a_retry_succeeds():
+    attempts = []
+
+    async def broken():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("mongodb://user:secret@db unreachable")
+
+    async def fine():
+        pass
+
+    warm_up = WarmUp(timeout=0.001, retry_interval=0.01)
+    await warm_up.run({"mongo": broken, "redis": fine})
+
+    assert not warm_up.ready
+    report = warm_up.report()
+    assert report["failing"] == ["mongo"]
+    # Error messages stay in the logs, out of the public report
+    assert report["steps"]["mongo"]["error"] == "RuntimeError"
+
+    await asyncio.wait_for(asyncio.gather(*warm_up._tasks), 1)
+    assert warm_up.ready
+    assert warm_up.steps["mongo"] == {
+        "status": "done",
+        "attempts": 3,
+        "seconds": warm_up.steps["mongo"]["seconds"],
+    }
+    await warm_up.stop()
+
+
+async def test_slow_step_holds_back_readiness():
+    finished = asyncio.Event()
+
+    async def stuck():
+        await asyncio.sleep(10)
+        finished.set()
+
+    warm_up = WarmUp(timeout=0.01)
+    await warm_up.run({"stuck": stuck})
+
+    assert not warm_up.ready
+    assert warm_up.steps["stuck"]["status"] == "running"
+    await warm_up.stop()
+    assert not finished.is_set()
+
+
+def test_healthz_answers_before_warm_up(test_client, monkeypatch):
+    monkeypatch.setattr(readiness, "warm_up", None)
+
+    assert test_client.get("/healthz").json() == {"status": "ok"}
+    assert test_client.get("/readyz").status_code == 503
+
+
+def test_readyz_reports_finished_warm_up(test_client, monkeypatch):
+    warm_up = WarmUp()
+    warm_up.steps = {"chain": {"status": "done", "attempts": 1, "seconds": 1.5}}
+    monkeypatch.setattr(readiness, "warm_up", warm_up)
+
+    response = test_client.get("/readyz")
+
+    assert response.status_code == 200
+    assert response.json()["steps"]["chain"]["status"] == "done"
+
+
+def test_readyz_lists_failing_steps(test_client, monkeypatch):
+    warm_up = WarmUp()
+    warm_up.steps = {
+        "mongo": {"status": "done", "attempts": 1, "seconds": 0.1},
+        "chain": {"status": "failed", "attempts": 2, "error": "ConnectionError"},
+    }
+    monkeypatch.setattr(readiness, "warm_up", warm_up)
+
+    response = test_client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.json()["failing"] == ["chain"]
+
+
+def test_importing_the_api_does_not_import_bittensor():
+    check = "import sys, app.main; sys.exit('bittensor' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", check]).returncode == 0
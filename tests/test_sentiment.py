@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from app import database
+from app.sentiment import (
+    ChutesScorer,
+    DaturaSearch,
+    SentimentPipeline,
+    chunk_tweets,
+    parse_scores,
+    tweet_date,
+)
+from benchmarks.standins import TWITTER_TIME, FakeChutes, FakeDatura, MemoryRedis
+
+TEXTS = ["bullish on this subnet", "total scam", "shipping an update", "love it"]
+
+
+def make_tweets(count, per_day=15, start=0):
+    newest = datetime(2026, 3, 10, 12, tzinfo=timezone.utc)
+    return [
+        {
+            "id": str(1000 + index),
+            "text": TEXTS[index % len(TEXTS)],
+            "created_at": (
+                newest - timedelta(days=index // per_day, minutes=index)
+            ).strftime(TWITTER_TIME),
+        }
+        for index in range(start, start + count)
+    ]
+
+
+def mean_score(chutes, tweets):
+    return round(sum(chutes.score(tweet["text"]) for tweet in tweets) / len(tweets), 2)
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch):
+    redis = MemoryRedis()
+    monkeypatch.setattr(database, "redis_client", redis)
+    return redis
+
+
+def make_pipeline(datura, chutes, page_size=20, concurrency=2, chunk=8):
+    search = DaturaSearch(
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=datura.app)),
+        api_key="datura-key",
+        url="http://datura/twitter",
+        page_size=page_size,
+        max_pages=5,
+    )
+    scorer = ChutesScorer(
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=chutes.app)),
+        api_key="chutes-key",
+        url="http://chutes/v1/chat/completions",
+    )
+    return SentimentPipeline(
+        search, scorer, concurrency=concurrency, chunk_tweets=chunk
+    )
+
+
+def test_chunks_are_bounded_in_tweets_and_characters():
+    tweets = [(str(index), "word " * 10) for index in range(5)]
+    assert [len(chunk) for chunk in chunk_tweets(tweets, 2, 1000)] == [2, 2, 1]
+    assert [len(chunk) for chunk in chunk_tweets(tweets, 10, 100)] == [2, 2, 1]
+    assert chunk_tweets([("1", "a\n  b ")], 10, 100) == [[("1", "a b")]]
+
+
+def test_scores_are_parsed_from_the_reply():
+    content = 'Here you go:\n{"1": 40, "2": 250, "3": "high", "4": true, "9": 5}'
+    assert parse_scores(content, ["1", "2", "3", "4", "5"]) == {"1": 40.0, "2": 100.0}
+    assert parse_scores("no idea", ["1"]) == {}
+    assert parse_scores("{not json}", ["1"]) == {}
+
+
+def test_tweet_dates():
+    assert tweet_date({"created_at": "Tue Mar 10 12:00:00 +0000 2026"}) == "2026-03-10"
+    assert tweet_date({"created_at": "2026-03-10T12:00:00Z"}) == "2026-03-10"
+    assert tweet_date({"created_at": "yesterday"}) is None
+
+
+async def test_tweets_are_paged_and_each_scored_once():
+    tweets = make_tweets(45)
+    datura, chutes = FakeDatura(tweets), FakeChutes(latency=0.01)
+    pipeline = make_pipeline(datura, chutes)
+
+    first = await pipeline.analyze(4)
+
+    assert first.tweet_count == 45
+    assert first.sentiment_score == mean_score(chutes, tweets)
+    # Each page goes back to the day of the oldest tweet seen
+    assert [request.get("end_date") for request in datura.requests] == [
+        None,
+        "2026-03-09",
+        "2026-03-08",
+    ]
+    assert sorted(sum(chutes.calls, [])) == [tweet["id"] for tweet in tweets]
+    assert max(len(call) for call in chutes.calls) <= 8
+    assert chutes.max_in_flight <= 2
+
+    # Every score is stored, so a second analysis makes no LLM call
+    calls = len(chutes.calls)
+    second = await pipeline.analyze(4)
+    assert len(chutes.calls) == calls
+    assert (second.sentiment_score, second.tweet_count) == (
+        first.sentiment_score,
+        45,
+    )
+
+
+async def test_only_new_tweets_are_sent_to_the_llm():
+    datura, chutes = FakeDatura(make_tweets(10)), FakeChutes()
+    pipeline = make_pipeline(datura, chutes)
+    await pipeline.analyze(4)
+
+    datura.tweets = make_tweets(3, start=-3) + datura.tweets
+    calls = len(chutes.calls)
+    sentiment = await pipeline.analyze(4)
+
+    assert chutes.calls[calls:] == [["997", "998", "999"]]
+    assert sentiment.tweet_count == 13
+    # Scores are kept per subnet
+    await make_pipeline(datura, chutes).analyze(5)
+    assert sorted(sum(chutes.calls[calls + 1 :], [])) == sorted(
+        tweet["id"] for tweet in datura.tweets
+    )
+
+
+async def test_unscored_tweets_are_retried_next_time():
+    tweets = make_tweets(12)
+    datura = FakeDatura(tweets)
+    chutes = FakeChutes(fail_calls={1}, skip_ids={"1011"})
+    pipeline = make_pipeline(datura, chutes, concurrency=1, chunk=4)
+
+    first = await pipeline.analyze(4)
+
+    assert first.tweet_count == 12 - 4 - 1
+    failed = chutes.calls[0] + ["1011"]
+    chutes.fail_calls, chutes.skip_ids = set(), set()
+    calls = len(chutes.calls)
+    second = await pipeline.analyze(4)
+
+    assert sorted(sum(chutes.calls[calls:], [])) == sorted(failed)
+    assert second.tweet_count == 12
+    assert second.sentiment_score == mean_score(chutes, tweets)
+
+
+async def test_search_errors():
+    datura = FakeDatura(make_tweets(45), fail_after=0)
+    with pytest.raises(httpx.HTTPStatusError):
+        await make_pipeline(datura, FakeChutes()).analyze(4)
+
+    # A later page failing keeps what was found so far
+    datura = FakeDatura(make_tweets(45), fail_after=1)
+    assert (await make_pipeline(datura, FakeChutes()).analyze(4)).tweet_count == 20
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def query():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "dividends"
+
+    waiters = [
+        asyncio.create_task(flights.do((1, "hotkey"), query)) for _ in range(100)
+    ]
+    await asyncio.sleep(0)
+    assert flights.in_flight((1, "hotkey"))
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["dividends"] * 100
+    assert calls == 1
+    assert not flights.in_flight((1, "hotkey"))
+
+
+async def test_different_keys_run_independently():
+    flights = SingleFlight()
+
+    async def query(value):
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(
+        flights.do((1, "a"), lambda: query("a")),
+        flights.do((1, "b"), lambda: query("b")),
+    )
+    assert results == ["a", "b"]
+
+
+async def test_errors_are_shared_and_not_cached():
+    flights = SingleFlight()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        raise RuntimeError("chain unavailable")
+
+    results = await asyncio.gather(
+        flights.do("key", failing), flights.do("key", failing), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert calls == 1
+
+    with pytest.raises(RuntimeError):
+        await flights.do("key", failing)
+    assert calls == 2
+
+
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def query():
+        await release.wait()
+        return 42
+
+    first = asyncio.create_task(flights.do("key", query))
+    second = asyncio.create_task(flights.do("key", query))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == 42
+    with pytest.raises(asyncio.CancelledError):
+        await first
@@ -0,0 +1,246 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.stake import NonceManager, StakeSubmitter, batch_item_outcomes, net_decisions
+
+
+class FakeReceipt:
+    def __init__(self, extrinsic, events, success=True):
+        self.extrinsic_hash = f"0x{extrinsic['nonce']:064x}"
+        self.block_hash = "0xblock"
+        self._events = events
+        self._success = success
+
+    @property
+    async def is_success(self):
+        return self._success
+
+    @property
+    async def error_message(self):
+        return None if self._success else {"name": "NotEnoughStake"}
+
+    @property
+    async def triggered_events(self):
+        return self._events
+
+
+class FakeSubstrate:
+    """Just enough of a substrate node to sign and include extrinsics."""
+
+    def __init__(self, failing_hotkeys=(), next_index=7):
+        self.failing_hotkeys = set(failing_hotkeys)
+        self.next_index = next_index
+        self.submitted = []
+
+    async def compose_call(self, call_module, call_function, call_params):
+        return {"module": call_module, "function": call_function, "params": call_params}
+
+    async def rpc_request(self, method, params):
+        assert method == "account_nextIndex"
+        return {"result": self.next_index}
+
+    async def create_signed_extrinsic(self, call, keypair, era, nonce):
+        return {"call": call, "signer": keypair.ss58_address, "nonce": nonce}
+
+    async def submit_extrinsic(
+        self, extrinsic, wait_for_inclusion, wait_for_finalization
+    ):
+        await asyncio.sleep(0)
+        self.submitted.append(extrinsic)
+        call = extrinsic["call"]
+        calls = call["params"]["calls"] if call["function"] == "force_batch" else [call]
+        outcomes = [c["params"]["hotkey"] not in self.failing_hotkeys for c in calls]
+        if call["function"] != "force_batch":
+            return FakeReceipt(extrinsic, [], success=outcomes[0])
+        events = [
+            {
+                "event": {
+                    "module_id": "Utility",
+                    "event_id": "ItemCompleted" if ok else "ItemFailed",
+                }
+            }
+            for ok in outcomes
+        ]
+        events.append(
+            {"event": {"module_id": "System", "event_id": "ExtrinsicSuccess"}}
+        )
+        return FakeReceipt(extrinsic, events)
+
+
+class FakeSubtensor:
+    def __init__(self, substrate):
+        self.substrate = substrate
+        self.closed = False
+
+    async def initialize(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePool:
+    def __init__(self, substrate):
+        self.subtensor = FakeSubtensor(substrate)
+        self.borrowed = 0
+
+    @asynccontextmanager
+    async def acquire(self, timed=True):
+        self.borrowed += 1
+        yield self.subtensor
+
+
+KEYPAIR = SimpleNamespace(ss58_address="5Coldkey")
+
+
+@pytest.fixture
+def recorded():
+    return {}
+
+
+@pytest.fixture
+def make_submitter(recorded):
+    async def record(decision_ids, fields):
+        for decision_id in decision_ids:
+            recorded[decision_id] = fields
+
+    def make(substrate, nonces=None, connections=None):
+        def connect():
+            subtensor = FakeSubtensor(substrate)
+            if connections is not None:
+                connections.append(subtensor)
+            return subtensor
+
+        return StakeSubmitter(
+            FakePool(substrate),
+            KEYPAIR,
+            nonces or NonceManager(),
+            record=record,
+            min_rao=1000,
+            factory=connect,
+        )
+
+    return make
+
+
+def test_net_decisions():
+    netted = net_decisions(
+        [(1, "a", 5000, "d1"), (1, "a", -2000, "d2"), (2, "b", -3000, "d3")]
+    )
+    assert netted == {(1, "a"): (3000, ["d1", "d2"]), (2, "b"): (-3000, ["d3"])}
+
+
+def test_batch_item_outcomes_needs_one_event_per_call():
+    events = [{"event": {"module_id": "Utility", "event_id": "ItemCompleted"}}]
+    assert batch_item_outcomes(events, 1) == [True]
+    assert batch_item_outcomes(events, 2) is None
+
+
+async def test_flush_submits_one_netted_batch(make_submitter, recorded):
+    substrate = FakeSubstrate()
+    submitter = make_submitter(substrate)
+    submitter.add(1, "a", 5000, "d1")
+    submitter.add(1, "a", -2000, "d2")
+    submitter.add(2, "b", -3000, "d3")
+    submitter.add(3, "c", 4000, "d4")
+    submitter.add(3, "c", -4000, "d5")
+
+    await (await submitter.flush())
+
+    assert len(substrate.submitted) == 1
+    call = substrate.submitted[0]["call"]
+    assert call["function"] == "force_batch"
+    assert [(c["function"], c["params"]) for c in call["params"]["calls"]] == [
+        ("add_stake", {"hotkey": "a", "netuid": 1, "amount_staked": 3000}),
+        ("remove_stake", {"hotkey": "b", "netuid": 2, "amount_unstaked": 3000}),
+    ]
+    assert recorded["d1"]["extrinsic_status"] == "included"
+    assert recorded["d3"]["block_hash"] == "0xblock"
+    assert recorded["d4"] == {"extrinsic_status": "netted"}
+
+
+async def test_failed_batch_items_are_recorded(make_submitter, recorded):
+    submitter = make_submitter(FakeSubstrate(failing_hotkeys={"b"}))
+    submitter.add(1, "a", 5000, "d1")
+    submitter.add(2, "b", 5000, "d2")
+
+    await (await submitter.flush())
+
+    assert recorded["d1"]["extrinsic_status"] == "included"
+    assert recorded["d2"]["extrinsic_status"] == "failed"
+
+
+async def test_concurrent_submitters_share_nonces(make_submitter):
+    substrate = FakeSubstrate(next_index=7)
+    nonces = NonceManager()
+    submitters = [make_submitter(substrate, nonces) for _ in range(3)]
+    for index, submitter in enumerate(submitters):
+        submitter.add(1, f"hotkey{index}", 5000, f"d{index}")
+
+    tasks = await asyncio.gather(*(submitter.flush() for submitter in submitters))
+    await asyncio.gather(*tasks)
+
+    assert sorted(e["nonce"] for e in substrate.submitted) == [7, 8, 9]
+
+
+async def test_submission_error_resets_nonce(make_submitter, recorded):
+    substrate = FakeSubstrate(next_index=3)
+
+    async def submit_extrinsic(extrinsic, **kwargs):
+        raise ConnectionError("dropped")
+
+    substrate.submit_extrinsic = submit_extrinsic
+    nonces = NonceManager()
+    submitter = make_submitter(substrate, nonces)
+    submitter.add(1, "a", 5000, "d1")
+
+    await (await submitter.flush())
+
+    assert recorded["d1"]["extrinsic_status"] == "failed"
+    assert await nonces.allocate(KEYPAIR.ss58_address, 3) == 3
+
+
+async def test_signing_error_resets_nonce(make_submitter, recorded):
+    substrate = FakeSubstrate(next_index=3)
+
+    async def create_signed_extrinsic(**kwargs):
+        raise ValueError("bad keypair")
+
+    substrate.create_signed_extrinsic = create_signed_extrinsic
+    nonces = NonceManager()
+    submitter = make_submitter(substrate, nonces)
+    submitter.add(1, "a", 5000, "d1")
+
+    assert await submitter.flush() is None
+    assert recorded["d1"]["extrinsic_status"] == "failed"
+    assert await nonces.allocate(KEYPAIR.ss58_address, 3) == 3
+
+
+async def test_submission_waits_on_its_own_connection(make_submitter, recorded):
+    substrate = FakeSubstrate()
+    submit = substrate.submit_extrinsic
+    failures = [ConnectionError("dropped")]
+
+    async def submit_extrinsic(extrinsic, **kwargs):
+        if failures:
+            raise failures.pop()
+        return await submit(extrinsic, **kwargs)
+
+    substrate.submit_extrinsic = submit_extrinsic
+    connections = []
+    submitter = make_submitter(substrate, connections=connections)
+    for decision_id in ("d1", "d2"):
+        submitter.add(1, "a", 5000, decision_id)
+        await (await submitter.flush())
+
+    # Only composing and signing borrowed from the pool
+    assert submitter._pool.borrowed == 2
+    # The connection that failed was replaced for the next batch
+    assert [subtensor.closed for subtensor in connections] == [True, False]
+    assert recorded["d1"]["extrinsic_status"] == "failed"
+    assert recorded["d2"]["extrinsic_status"] == "included"
+    await submitter.close()
+    assert connections[1].closed
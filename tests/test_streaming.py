@@ -0,0 +1,219 @@
+import asyncio
+import time
+from datetime import datetime
+
+import orjson
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app import streaming
+from app.models import TaoDividends
+from app.streaming import (
+    STREAM_WATCHED_KEY,
+    DividendStream,
+    Subscription,
+    parse_pairs,
+    sse_events,
+)
+from benchmarks.standins import MemoryRedis
+
+HOTKEY = "5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx"
+OTHER = "5C4hrfjw9DjXZTzV3MwzrrAr9P1MJhSrvWGWqi1eSuyUpnhM"
+
+
+class FakeChain:
+    """Reader returning settable values and recording every read."""
+
+    def __init__(self, values):
+        self.values = dict(values)
+        self.reads = []
+
+    async def __call__(self, pairs):
+        self.reads.append(sorted(pairs))
+        return [
+            TaoDividends(
+                netuid=netuid,
+                hotkey=hotkey,
+                dividends=self.values[(netuid, hotkey)],
+                timestamp=datetime.utcnow(),
+            )
+            if (netuid, hotkey) in self.values
+            else None
+            for netuid, hotkey in pairs
+        ]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    async def get_cached_dividends_many(pairs):
+        return [None] * len(pairs)
+
+    monkeypatch.setattr(
+        streaming, "get_cached_dividends_many", get_cached_dividends_many
+    )
+
+
+async def take(pubsub, count):
+    messages = pubsub.listen()
+    for _ in range(count):
+        yield await anext(messages)
+
+
+def values(batch):
+    return [(event, orjson.loads(payload).get("dividends")) for event, payload in batch]
+
+
+def test_subscription_keeps_only_the_newest_update_per_pair():
+    subscription = Subscription([(1, HOTKEY), (2, HOTKEY)])
+    for value in (b"1", b"2", b"3"):
+        subscription.push((1, HOTKEY), "dividends", value)
+    subscription.push((2, HOTKEY), "dividends", b"4")
+
+    batch = asyncio.run(subscription.next_batch(0))
+
+    assert batch == [("dividends", b"3"), ("dividends", b"4")]
+    assert subscription.superseded == 2
+
+
+def test_parse_pairs():
+    assert parse_pairs([f"1:{HOTKEY}", {"netuid": 1, "hotkey": HOTKEY}]) == [
+        (1, HOTKEY)
+    ]
+    for bad in ([], ["1"], [f"x:{HOTKEY}"], [f"{n}:{HOTKEY}" for n in range(101)]):
+        with pytest.raises(ValueError):
+            parse_pairs(bad)
+
+
+async def test_subscribers_share_one_read_and_get_only_changes():
+    chain = FakeChain({(1, HOTKEY): 1.0, (2, HOTKEY): 2.0})
+    stream = DividendStream(chain)
+    first = await stream.subscribe([(1, HOTKEY), (2, HOTKEY)])
+    second = await stream.subscribe([(1, HOTKEY), (3, OTHER)])
+
+    assert values(await first.next_batch(0)) == [
+        ("dividends", 1.0),
+        ("dividends", 2.0),
+    ]
+    # The first pair's value is reused, the missing one is reported
+    assert values(await second.next_batch(0)) == [("dividends", 1.0), ("error", None)]
+    assert chain.reads == [[(1, HOTKEY), (2, HOTKEY)], [(3, OTHER)]]
+
+    chain.values[(1, HOTKEY)] = 1.5
+    await stream.refresh("block:100")
+
+    assert chain.reads[-1] == [(1, HOTKEY), (2, HOTKEY), (3, OTHER)]
+    assert values(await first.next_batch(0)) == [("dividends", 1.5)]
+    assert values(await second.next_batch(0)) == [("dividends", 1.5)]
+
+    stream.unsubscribe(first)
+    stream.unsubscribe(second)
+    assert stream.stats()["connections"] == 0 and stream.stats()["pairs"] == 0
+
+
+async def test_concurrent_snapshots_share_one_read():
+    chain = FakeChain({(1, HOTKEY): 1.0, (2, HOTKEY): 2.0})
+    stream = DividendStream(chain, MemoryRedis())
+
+    await asyncio.gather(
+        stream.subscribe([(1, HOTKEY)]),
+        stream.subscribe([(1, HOTKEY), (2, HOTKEY)]),
+        stream.subscribe([(2, HOTKEY)]),
+    )
+    assert chain.reads == [[(1, HOTKEY), (2, HOTKEY)]]
+
+    # Values subscribers were just sent are not published again
+    published = stream._redis.pubsub()
+    await published.subscribe(streaming.STREAM_CHANNEL)
+    await stream.refresh("block:1")
+    assert len(chain.reads) == 2
+    assert await stream._redis.hgetall(streaming.STREAM_LAST_KEY) == {
+        f"1:{HOTKEY}": "1.0",
+        f"2:{HOTKEY}": "2.0",
+    }
+    assert [message["type"] async for message in take(published, 1)] == ["subscribe"]
+    assert published._messages.empty()
+
+
+async def test_workers_share_the_read_through_redis():
+    redis = MemoryRedis()
+    chains = [FakeChain({(1, HOTKEY): 1.0}), FakeChain({(1, HOTKEY): 1.0})]
+    streams = [DividendStream(chain, redis.client()) for chain in chains]
+    for stream in streams:
+        await stream.start()
+    try:
+        subscriptions = [await stream.subscribe([(1, HOTKEY)]) for stream in streams]
+        for subscription in subscriptions:
+            await subscription.next_batch(0)
+        # A pair nobody renewed has left the watch list
+        await redis.zadd(STREAM_WATCHED_KEY, {f"2:{OTHER}": time.time() - 1})
+
+        for chain in chains:
+            chain.values[(1, HOTKEY)] = 2.0
+        reads = sum(stream.reads for stream in streams)
+        await asyncio.gather(*(stream.refresh("block:7") for stream in streams))
+
+        assert sum(stream.reads for stream in streams) == reads + 1
+        assert [chain.reads[-1] for chain in chains if len(chain.reads) > 1] == [
+            [(1, HOTKEY)]
+        ]
+        for subscription in subscriptions:
+            assert values(await subscription.next_batch(1)) == [("dividends", 2.0)]
+        assert await redis.zrangebyscore(STREAM_WATCHED_KEY, "-inf", "+inf") == [
+            f"1:{HOTKEY}"
+        ]
+    finally:
+        for stream in streams:
+            await stream.close()
+
+
+async def test_sse_events_and_heartbeat(monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_HEARTBEAT", 0.01)
+    stream = DividendStream(FakeChain({(1, HOTKEY): 1.0}))
+    events = sse_events(stream, await stream.subscribe([(1, HOTKEY)]))
+
+    event, data = (await anext(events)).decode().split("\n")[:2]
+    assert event == "event: dividends"
+    assert orjson.loads(data[len("data: ") :])["dividends"] == 1.0
+    assert await anext(events) == b": ping\n\n"
+
+    await events.aclose()
+    assert stream.connections == 0
+
+
+def test_stream_endpoint_validates_pairs(test_client, test_token, monkeypatch):
+    monkeypatch.setattr(streaming, "dividend_stream", None)
+    auth = {"Authorization": f"Bearer {test_token}"}
+
+    response = test_client.get(
+        "/api/v1/tao_dividends/stream", params={"pair": "1:bad"}, headers=auth
+    )
+    assert response.status_code == 400
+    response = test_client.get(
+        "/api/v1/tao_dividends/stream", params={"pair": f"1:{HOTKEY}"}, headers=auth
+    )
+    assert response.status_code == 503
+
+
+def test_websocket_replaces_watch_list(test_client, test_token, monkeypatch):
+    stream = DividendStream(FakeChain({(1, HOTKEY): 1.0, (2, HOTKEY): 2.0}))
+    monkeypatch.setattr(streaming, "dividend_stream", stream)
+
+    with pytest.raises(WebSocketDisconnect):
+        with test_client.websocket_connect("/api/v1/tao_dividends/ws") as websocket:
+            websocket.receive_text()
+
+    with test_client.websocket_connect(
+        "/api/v1/tao_dividends/ws",
+        headers={"Authorization": f"Bearer {test_token}"},
+    ) as websocket:
+        websocket.send_text('{"pairs": "nope"}')
+        assert websocket.receive_json()["event"] == "error"
+        websocket.send_text(orjson.dumps({"pairs": [f"1:{HOTKEY}"]}).decode())
+        assert websocket.receive_json()["data"]["dividends"] == 1.0
+        websocket.send_text(
+            orjson.dumps({"pairs": [{"netuid": 2, "hotkey": HOTKEY}]}).decode()
+        )
+        assert websocket.receive_json()["data"]["dividends"] == 2.0
+        assert stream.stats()["pairs"] == 1
+
+    assert stream.connections == 0
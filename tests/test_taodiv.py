@@ -1,9 +1,11 @@
-from unittest.mock import AsyncMock
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from bittensor.core.subtensor import ScaleObj
 from bittensor.utils.balance import Balance
 
+from app import metrics
 from app.taodiv import TaoDividendQuerier
 
 
@@ -29,9 +31,11 @@ async def test_get_tao_dividends_success(querier):
     assert str(result) == "τ1.000000000"
 
     # Verif query was called with correct parameters
-    querier.subtensor.query_module.assert_called_once_with(
+    querier._connection.query_module.assert_called_once_with(
         "SubtensorModule",
         "TaoDividendsPerSubnet",
+        block=None,
+        block_hash=None,
         params=[1, "test_hotkey"],
     )
 
@@ -39,7 +43,7 @@ async def test_get_tao_dividends_success(querier):
 async def test_get_tao_dividends_no_result(querier):
     querier._connection.query_module = AsyncMock(return_value=None)
     result = await querier.get_tao_dividends_per_subnet(netuid=1, hotkey="test_hotkey")
-    querier.subtensor.query_module.assert_called_once()
+    querier._connection.query_module.assert_called_once()
     assert result is None
 
 
@@ -47,7 +51,7 @@ async def test_get_tao_dividends_error(querier):
     querier._connection.query_module = AsyncMock(side_effect=Exception("Test error"))
     with pytest.raises(Exception, match="Error querying TaoDividendsPerSubnet"):
         await querier.get_tao_dividends_per_subnet(netuid=1, hotkey="test_hotkey")
-    querier.subtensor.query_module.assert_called_once()
+    querier._connection.query_module.assert_called_once()
 
 
 async def test_close_connection(querier):
@@ -56,3 +60,115 @@ async def test_close_connection(querier):
     await querier.close()
     close_mock.assert_called_once()
     assert querier._connection is None
+
+
+class FakeQueryMapResult:
+    def __init__(self, records):
+        self._records = iter(records)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._records)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+HOTKEY = "5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx"
+
+
+async def test_iter_tao_dividends_for_subnet(querier):
+    querier._connection.substrate.query_map = AsyncMock(
+        return_value=FakeQueryMapResult([(HOTKEY, ScaleObj(2000000000))])
+    )
+
+    results = [item async for item in querier.iter_tao_dividends(netuid=4)]
+
+    assert results == [(4, HOTKEY, Balance.from_rao(2000000000))]
+    querier._connection.substrate.query_map.assert_called_once_with(
+        "SubtensorModule",
+        "TaoDividendsPerSubnet",
+        params=[4],
+        page_size=500,
+    )
+
+
+async def test_iter_tao_dividends_full_map(querier):
+    querier._connection.substrate.query_map = AsyncMock(
+        return_value=FakeQueryMapResult(
+            [((1, HOTKEY), ScaleObj(1)), ((2, HOTKEY), ScaleObj(2))]
+        )
+    )
+
+    results = [item async for item in querier.iter_tao_dividends()]
+
+    assert [(netuid, rao.rao) for netuid, _, rao in results] == [(1, 1), (2, 2)]
+    assert querier._connection.substrate.query_map.call_args.kwargs["params"] is None
+
+
+async def test_iter_tao_dividends_error(querier):
+    querier._connection.substrate.query_map = AsyncMock(
+        side_effect=Exception("Test error")
+    )
+    with pytest.raises(Exception, match="Error scanning TaoDividendsPerSubnet"):
+        async for _ in querier.iter_tao_dividends(netuid=4):
+            pass
+
+
+async def test_get_tao_dividends_multi(querier):
+    storage_keys = [
+        MagicMock(to_hex=MagicMock(return_value=f"0x0{i}")) for i in range(2)
+    ]
+    querier._connection.substrate.create_storage_key = AsyncMock(
+        side_effect=storage_keys
+    )
+    querier._connection.substrate.query_multi = AsyncMock(
+        return_value=[(storage_keys[1], None), (storage_keys[0], 1000000000)]
+    )
+
+    results = await querier.get_tao_dividends_multi([(1, HOTKEY), (2, HOTKEY)])
+
+    assert results == [Balance.from_rao(1000000000), None]
+    querier._connection.substrate.query_multi.assert_called_once_with(storage_keys)
+    querier._connection.substrate.create_storage_key.assert_any_call(
+        "SubtensorModule", "TaoDividendsPerSubnet", [2, HOTKEY]
+    )
+
+
+async def test_get_tao_dividends_at_blocks(querier):
+    async def query_module(module, name, block, params):
+        await asyncio.sleep(0)
+        return ScaleObj(block) if block % 2 else None
+
+    querier._connection.query_module = AsyncMock(side_effect=query_module)
+
+    results = await querier.get_tao_dividends_at_blocks(
+        1, "test_hotkey", [10, 11, 13], concurrency=2
+    )
+
+    assert results == [None, Balance.from_rao(11), Balance.from_rao(13)]
+    assert querier._connection.query_module.await_count == 3
+
+
+async def test_get_finalized_block(querier):
+    substrate = querier._connection.substrate
+    substrate.get_chain_finalised_head = AsyncMock(return_value="0xabc")
+    substrate.get_block_number = AsyncMock(return_value=1234)
+
+    assert await querier.get_finalized_block() == 1234
+    substrate.get_block_number.assert_awaited_once_with("0xabc")
+
+
+async def test_get_current_block(querier):
+    querier._connection.get_current_block = AsyncMock(return_value=4321)
+    assert await querier.get_current_block() == 4321
+
+
+async def test_get_subnets_sets_the_known_netuids(querier, monkeypatch):
+    monkeypatch.setattr(metrics, "known_netuids", frozenset())
+    querier._connection.get_subnets = AsyncMock(return_value=[0, 1, 4])
+    assert await querier.get_subnets() == [0, 1, 4]
+    assert metrics.netuid_label(4) == "4"
+    assert metrics.netuid_label(5) == "other"
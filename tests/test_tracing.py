@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import pytest
+
+from app import main, tracing, worker
+from app.database import CachedDividends
+from app.models import TaoDividends
+from app.tracing import SamplingProfiler, phase, profile_var, request_id_var
+
+HOTKEY = "5GpzQgpiAKHMWNSH3RN4GLf96GVTDct9QxYEFAY7LWcVzTbx"
+
+
+@pytest.fixture
+def cached_dividends(monkeypatch):
+    cached = CachedDividends.from_dividends(
+        TaoDividends(
+            netuid=1, hotkey=HOTKEY, dividends=1.0, timestamp=datetime.utcnow()
+        )
+    )
+    sent = []
+
+    async def get_cached_entry(netuid, hotkey, allow_stale=False):
+        with phase("redis"):
+            return cached, False
+
+    async def claim_trade_trigger(netuid, hotkey, task_id):
+        return task_id
+
+    def send_task(name, args, task_id, headers=None):
+        sent.append(headers)
+
+    monkeypatch.setattr(main, "get_cached_entry", get_cached_entry)
+    monkeypatch.setattr(main, "claim_trade_trigger", claim_trade_trigger)
+    monkeypatch.setattr(main.celery_app, "send_task", send_task)
+    return sent
+
+
+def test_request_id_is_kept_or_generated(test_client):
+    response = test_client.get("/", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["X-Request-ID"] == "abc-123"
+
+    response = test_client.get("/", headers={"X-Request-ID": "bad id\x7f"})
+    generated = response.headers["X-Request-ID"]
+    assert generated != "bad id\x7f" and len(generated) == 32
+
+
+def test_server_timing_reports_phases(test_client, test_token, cached_dividends):
+    response = test_client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1, "hotkey": HOTKEY, "trade": "true"},
+        headers={"Authorization": f"Bearer {test_token}", "X-Request-ID": "req-1"},
+    )
+
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    names = [entry.split(";")[0] for entry in timing.split(", ")]
+    assert names == ["redis", "cache", "enqueue", "total"]
+    # The request ID travels to the worker in the task headers
+    assert cached_dividends == [{"request_id": "req-1"}]
+
+
+def test_log_records_carry_request_id(caplog):
+    tracing.install_log_request_ids()
+    token = request_id_var.set("req-2")
+    try:
+        with caplog.at_level(logging.INFO):
+            logging.getLogger("app.test").info("inside")
+    finally:
+        request_id_var.reset(token)
+    logging.getLogger("app.test").info("outside")
+
+    assert [record.request_id for record in caplog.records] == ["req-2", "-"]
+
+
+async def test_worker_tasks_run_with_request_id():
+    async def task():
+        return request_id_var.get()
+
+    assert await worker.with_request_id("req-3", task()) == "req-3"
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def profiled_work():
+    for _ in range(3):
+        spin(0.03)
+        await asyncio.sleep(0)
+
+
+async def other_work():
+    for _ in range(3):
+        spin(0.03)
+        await asyncio.sleep(0)
+
+
+async def test_profiler_only_samples_the_marked_task():
+    marker = object()
+    profiler = SamplingProfiler(interval=0.001, token=marker).start()
+
+    async def marked():
+        profile_var.set(marker)
+        await profiled_work()
+
+    await asyncio.gather(marked(), other_work())
+    folded = profiler.stop()
+
+    assert profiler.samples > 0
+    lines = folded.splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("test_tracing:profiled_work;" in line for line in lines)
+    assert not any("other_work" in line for line in lines)
+
+
+def test_profile_is_only_served_to_its_requester(
+    test_client, test_token, cached_dividends, monkeypatch
+):
+    monkeypatch.setattr(tracing, "PROFILING_ENABLED", True)
+    tracing.request_profiles.clear()
+    auth = {"Authorization": f"Bearer {test_token}"}
+
+    response = test_client.get(
+        "/api/v1/tao_dividends",
+        params={"netuid": 1, "hotkey": HOTKEY},
+        headers={**auth, "X-Profile": "true", "X-Request-ID": "req-4"},
+    )
+    assert response.headers["X-Profile"] == "/debug/profile/req-4"
+
+    assert test_client.get("/debug/profile/req-4", headers=auth).status_code == 200
+    assert test_client.get("/debug/profile/req-4").status_code == 401
+    tracing.request_profiles.set("req-5", ("someone-else", "a;b 1\n"))
+    assert test_client.get("/debug/profile/req-5", headers=auth).status_code == 404
+
+
+def test_profiling_is_off_by_default(test_client, test_token):
+    response = test_client.get(
+        "/debug/profile",
+        params={"seconds": 0.01},
+        headers={"Authorization": f"Bearer {test_token}"},
+    )
+    assert response.status_code == 403
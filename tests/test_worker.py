@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from bittensor.utils.balance import Balance
+
+from app import worker
+from app.models import SubnetSentiment
+from app.runtime import AsyncRuntime
+from app.taodiv import TaoDividendQuerier
+
+
+def test_runtime_keeps_one_loop_and_starts_clients_once():
+    events = []
+
+    async def on_start():
+        events.append("start")
+
+    async def on_stop():
+        events.append("stop")
+
+    runtime = AsyncRuntime(on_start=on_start, on_stop=on_stop)
+
+    async def current_loop():
+        await asyncio.sleep(0.05)
+        return asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(8) as executor:
+        loops = list(executor.map(lambda _: runtime.run(current_loop()), range(16)))
+    runtime.stop()
+
+    assert len(set(map(id, loops))) == 1
+    assert events == ["start", "stop"]
+    assert not runtime.running
+
+
+def test_runtime_runs_submissions_concurrently():
+    runtime = AsyncRuntime()
+    started = threading.Barrier(4, timeout=2)
+
+    async def wait_for_others():
+        # Only completes if all four coroutines are in flight together
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        return True
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda _: runtime.run(wait_for_others()), range(4)))
+    runtime.stop()
+
+    assert results == [True] * 4
+
+
+def test_runtime_propagates_errors():
+    runtime = AsyncRuntime()
+
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        runtime.run(fail())
+    runtime.stop()
+
+
+def test_query_blockchain_task(monkeypatch):
+    stored = []
+
+    async def get_tao_dividends_per_subnet(self, netuid, hotkey):
+        return Balance.from_rao(1500000000)
+
+    async def store_dividends(dividends):
+        stored.append(dividends)
+
+    monkeypatch.setattr(
+        TaoDividendQuerier, "get_tao_dividends_per_subnet", get_tao_dividends_per_subnet
+    )
+    monkeypatch.setattr(worker, "store_dividends", store_dividends)
+    monkeypatch.setattr(worker, "runtime", AsyncRuntime())
+
+    result = worker.query_blockchain.apply(args=[1, "hotkey"]).get()
+    worker.runtime.stop()
+
+    assert result["dividends"] == 1.5
+    assert stored[0].netuid == 1
+
+
+def test_analyze_sentiment_reuses_cached_subnet_score(monkeypatch):
+    stored = []
+    analyzed = []
+
+    async def get_cached_sentiment(netuid):
+        return SubnetSentiment(
+            netuid=netuid,
+            sentiment_score=42.0,
+            tweet_count=7,
+            timestamp=datetime(2026, 1, 1),
+        )
+
+    async def cache_sentiment(sentiment):
+        analyzed.append(sentiment)
+
+    async def store_sentiment(sentiment):
+        stored.append(sentiment)
+
+    monkeypatch.setattr(worker, "get_cached_sentiment", get_cached_sentiment)
+    monkeypatch.setattr(worker, "cache_sentiment", cache_sentiment)
+    monkeypatch.setattr(worker, "store_sentiment", store_sentiment)
+    monkeypatch.setattr(worker, "runtime", AsyncRuntime())
+
+    result = worker.analyze_sentiment.apply(args=[3, "hotkey"]).get()
+    worker.runtime.stop()
+
+    assert result["sentiment_score"] == 42.0
+    assert stored[0].hotkey == "hotkey"
+    assert analyzed == []
+
+
+def test_analyze_sentiment_queues_stake_decision(monkeypatch):
+    decisions = []
+    stored = []
+
+    async def get_cached_sentiment(netuid):
+        return SubnetSentiment(
+            netuid=netuid,
+            sentiment_score=-50.0,
+            tweet_count=3,
+            timestamp=datetime(2026, 1, 1),
+        )
+
+    async def store_sentiment(sentiment):
+        stored.append(sentiment)
+
+    submitter = MagicMock()
+    submitter.add.side_effect = lambda *args: decisions.append(args)
+    monkeypatch.setattr(worker, "get_cached_sentiment", get_cached_sentiment)
+    monkeypatch.setattr(worker, "store_sentiment", store_sentiment)
+    monkeypatch.setattr(worker, "stake_submitter", submitter)
+    monkeypatch.setattr(worker, "runtime", AsyncRuntime())
+
+    result = worker.analyze_sentiment.apply(args=[3, "hotkey"]).get()
+    worker.runtime.stop()
+
+    assert result["action_taken"] == "unstake"
+    assert result["action_amount"] == 0.5
+    assert result["extrinsic_status"] == "pending"
+    assert decisions == [(3, "hotkey", -500000000, result["decision_id"])]
+    assert stored[0].decision_id == result["decision_id"]
+
+
+def test_analyze_subnet_sentiment_runs_the_pipeline(monkeypatch):
+    analyzed = []
+
+    class Pipeline:
+        async def analyze(self, netuid):
+            return SubnetSentiment(
+                netuid=netuid,
+                sentiment_score=12.5,
+                tweet_count=40,
+                timestamp=datetime(2026, 1, 1),
+            )
+
+    async def get_cached_sentiment(netuid):
+        return None
+
+    async def cache_sentiment(sentiment):
+        analyzed.append(sentiment)
+
+    monkeypatch.setattr(worker, "get_sentiment_pipeline", lambda: Pipeline())
+    monkeypatch.setattr(worker, "get_cached_sentiment", get_cached_sentiment)
+    monkeypatch.setattr(worker, "cache_sentiment", cache_sentiment)
+
+    sentiment = asyncio.run(worker.analyze_subnet_sentiment(7))
+
+    assert (sentiment.sentiment_score, sentiment.tweet_count) == (12.5, 40)
+    assert analyzed == [sentiment]